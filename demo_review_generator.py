@@ -8,8 +8,8 @@ from rich.panel import Panel
 from rich.prompt import IntPrompt, Prompt
 from rich.table import Table
 
+from src.review_analyzer import config
 from src.review_analyzer.analyzer import ReviewStyleAnalyzer
-from src.review_analyzer.config import embeddings
 from src.review_analyzer.generator import ReviewGenerator
 from src.review_analyzer.schemas import MovieContext
 from src.review_analyzer.vector_store import VectorStore
@@ -32,7 +32,8 @@ async def demo_review_generation(movie: MovieContext):
 
     # 2. Initialize components
     console.print('\n[yellow]Initializing components...[/yellow]')
-    analyzer = ReviewStyleAnalyzer()
+    vector_store = VectorStore(**config.vector_store_settings())
+    analyzer = ReviewStyleAnalyzer(vector_store=vector_store)
     style_profile = await analyzer.learn_style(
         reviews_path='data/letterboxd/reviews.csv', watched_path='data/letterboxd/watched.csv'
     )
@@ -49,11 +50,9 @@ async def demo_review_generation(movie: MovieContext):
 
     # 4. Show similar movies
     console.print('\n[yellow]Finding similar movies you have watched...[/yellow]\n')
-    vector_store = VectorStore()
-    movie_query = f"{movie.title} {' '.join(movie.genres)}"
-    query_embedding = await embeddings.aembed_query(movie_query)
-
-    similar_movies = await vector_store.find_similar_movies(query_embedding=query_embedding, n_results=5)
+    generator = ReviewGenerator(style_profile, vector_store=vector_store)
+    retrieval = await generator.retrieve(movie)
+    similar_movies = retrieval.similar_movies
 
     similar_table = Table(title='Most Similar Movies You Have Watched', show_header=True)
     similar_table.add_column('Title', style='cyan')
@@ -68,8 +67,7 @@ async def demo_review_generation(movie: MovieContext):
 
     # 5. Generate review
     console.print('\n[yellow]Generating personalized review...[/yellow]')
-    generator = ReviewGenerator(style_profile)
-    review = await generator.generate_review(movie)
+    review = await generator.compose(retrieval)
 
     # 6. Show final review
     review_panel = Panel(
@@ -0,0 +1,145 @@
+"""Compare recall and query latency of reduced-dimension movie embeddings.
+
+Fits and compares the provider's native `dimensions` parameter against a locally fitted
+PCA projection, using the full-dimension embeddings of watched.csv as ground truth.
+
+Usage:
+    poetry run python -m scripts.embedding_benchmark compare --watched data/letterboxd/watched.csv --dims 256 512
+    poetry run python -m scripts.embedding_benchmark fit --watched data/letterboxd/watched.csv --dims 256
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from typing import List, Set
+
+import chromadb
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from langchain_openai import OpenAIEmbeddings
+from rich.console import Console
+from rich.table import Table
+from slugify import slugify
+
+from src.review_analyzer import config
+from src.review_analyzer.projection import PCAProjection
+from src.review_analyzer.schemas import Movie
+
+console = Console()
+
+
+def load_contexts(watched_path: str, limit: int) -> List[str]:
+    watched_df = pd.read_csv(watched_path).head(limit)
+    return [
+        Movie.from_row(row, slugify(f"{row.get('Name', '')}-{row.get('Year', '')}")).context
+        for _, row in watched_df.iterrows()
+    ]
+
+
+def exact_neighbours(vectors: np.ndarray, k: int) -> List[Set[int]]:
+    """Exact cosine top-k for every vector against all others, excluding itself"""
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    similarity = normalized @ normalized.T
+    np.fill_diagonal(similarity, -np.inf)
+    return [set(row) for row in np.argsort(-similarity, axis=1)[:, :k]]
+
+
+def measure(vectors: np.ndarray, truth: List[Set[int]], k: int) -> dict:
+    """Index vectors in an in-memory collection and measure recall@k and single-query latency"""
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection(name=f'bench-{uuid.uuid4().hex[:8]}', metadata={'hnsw:space': 'cosine'})
+    ids = [str(i) for i in range(len(vectors))]
+    for start in range(0, len(ids), 1000):
+        collection.add(ids=ids[start : start + 1000], embeddings=vectors[start : start + 1000].tolist())
+
+    latencies, hits = [], 0
+    for i, vector in enumerate(vectors):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[vector.tolist()], n_results=k + 1)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = [int(movie_id) for movie_id in result['ids'][0] if movie_id != str(i)][:k]
+        hits += len(truth[i].intersection(found))
+
+    client.delete_collection(collection.name)
+    return {
+        'dimensions': vectors.shape[1],
+        'recall': hits / (k * len(vectors)),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'storage_mb': vectors.size * 4 / 1e6,
+    }
+
+
+async def compare(args: argparse.Namespace) -> None:
+    contexts = load_contexts(args.watched, args.limit)
+    console.print(f'Embedding {len(contexts)} movie contexts with {args.model}...')
+    full = np.asarray(await OpenAIEmbeddings(model=args.model).aembed_documents(contexts), dtype=np.float32)
+    truth = exact_neighbours(full, args.k)
+
+    variants = [('full', full)]
+    for dims in args.dims:
+        if not config.supports_native_dimensions(args.model):
+            console.print(f'[yellow]Skipping native-{dims}: {args.model} does not support native dimensions[/yellow]')
+        else:
+            try:
+                native = await OpenAIEmbeddings(model=args.model, dimensions=dims).aembed_documents(contexts)
+                variants.append((f'native-{dims}', np.asarray(native, dtype=np.float32)))
+            except Exception as e:
+                console.print(f'[yellow]Skipping native-{dims}: {e}[/yellow]')
+
+        if dims <= min(full.shape):
+            # Fitted and evaluated on the same films, matching how the projection is used in practice
+            projection = PCAProjection.fit(full, dims, source_model=args.model)
+            variants.append((f'pca-{dims}', np.asarray(projection.transform(full), dtype=np.float32)))
+
+    table = Table(title=f'Recall@{args.k} vs full {full.shape[1]}-dim embeddings ({len(contexts)} films)')
+    for column in ('Variant', 'Dims', 'Recall', 'p50 ms', 'p99 ms', 'Storage MB'):
+        table.add_column(column)
+
+    for name, vectors in variants:
+        stats = measure(vectors, truth, args.k)
+        table.add_row(
+            name,
+            str(stats['dimensions']),
+            f"{stats['recall']:.3f}",
+            f"{stats['p50_ms']:.2f}",
+            f"{stats['p99_ms']:.2f}",
+            f"{stats['storage_mb']:.2f}",
+        )
+    console.print(table)
+
+
+async def fit(args: argparse.Namespace) -> None:
+    contexts = load_contexts(args.watched, args.limit)
+    console.print(f'Embedding {len(contexts)} movie contexts with {args.model}...')
+    full = await OpenAIEmbeddings(model=args.model).aembed_documents(contexts)
+
+    projection = PCAProjection.fit(full, args.dims[0], source_model=args.model)
+    projection.save(args.out)
+    console.print(
+        f'Saved {projection.input_dimensions} -> {projection.output_dimensions} projection '
+        f'({projection.fingerprint}) to {args.out}'
+    )
+
+
+def main() -> None:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['compare', 'fit'])
+    parser.add_argument('--watched', default='data/letterboxd/watched.csv')
+    # Matches the configured model, so a fitted projection passes config's source model check
+    parser.add_argument('--model', default=config.embedding_model)
+    parser.add_argument('--dims', type=int, nargs='+', default=[256])
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=2000)
+    parser.add_argument('--out', default=config.embedding_projection_path)
+    args = parser.parse_args()
+
+    asyncio.run(compare(args) if args.command == 'compare' else fit(args))
+
+
+if __name__ == '__main__':
+    main()
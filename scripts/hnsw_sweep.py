@@ -0,0 +1,130 @@
+"""Sweep HNSW parameters and report recall versus p99 query latency.
+
+Uses the embeddings of an existing watched_movies collection, resampled with small noise up to each
+requested collection size, or random vectors when no collection is available.
+
+Usage:
+    poetry run python -m scripts.hnsw_sweep --sizes 1000 10000 --search-ef 10 50 100 --m 16 32
+    poetry run python -m scripts.hnsw_sweep --synthetic --dims 256 --sizes 5000
+"""
+
+import argparse
+import itertools
+import time
+import uuid
+from typing import List
+
+import chromadb
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from src.review_analyzer import config
+from src.review_analyzer.vector_store import HNSWConfig, VectorStore
+
+console = Console()
+
+
+def load_vectors(args: argparse.Namespace) -> np.ndarray:
+    if not args.synthetic:
+        shard_config = config.vector_store_settings()['shard_config']
+        store = VectorStore(persist_dir=args.persist_dir, user_id=args.user_id, shard_config=shard_config)
+        # A sharded store keeps its movies in the shards, not in the base collection
+        stored = [
+            embedding
+            for collection in store.movie_collections()
+            for embedding in collection.get(include=['embeddings'])['embeddings']
+        ]
+        if len(stored):
+            return np.asarray(stored, dtype=np.float32)
+        console.print('[yellow]No stored embeddings found, falling back to synthetic vectors[/yellow]')
+
+    return np.random.default_rng(0).normal(size=(1000, args.dims)).astype(np.float32)
+
+
+def resample(base: np.ndarray, size: int, rng: np.random.Generator) -> np.ndarray:
+    """Grow or shrink a set of vectors to the requested size, jittering repeated vectors"""
+    if size <= len(base):
+        return base[rng.choice(len(base), size, replace=False)]
+    picks = base[rng.integers(0, len(base), size)]
+    return picks + rng.normal(scale=0.01 * float(np.std(base)), size=picks.shape).astype(np.float32)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    corpus_norm = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries_norm = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    similarity = queries_norm @ corpus_norm.T
+    return [set(row) for row in np.argpartition(-similarity, k, axis=1)[:, :k]]
+
+
+def run(corpus: np.ndarray, queries: np.ndarray, truth: List[set], hnsw_config: HNSWConfig, k: int) -> dict:
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection(name=f'sweep-{uuid.uuid4().hex[:8]}', metadata=hnsw_config.to_metadata())
+
+    start = time.perf_counter()
+    ids = [str(i) for i in range(len(corpus))]
+    for offset in range(0, len(ids), 5000):
+        collection.add(ids=ids[offset : offset + 5000], embeddings=corpus[offset : offset + 5000].tolist())
+    build_seconds = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(expected.intersection(int(movie_id) for movie_id in result['ids'][0]))
+
+    client.delete_collection(collection.name)
+    return {
+        'recall': hits / (k * len(queries)),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'build_s': build_seconds,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--persist-dir', default='./.vectordb')
+    parser.add_argument('--user-id', default=None)
+    parser.add_argument('--synthetic', action='store_true', help='Use random vectors instead of stored embeddings')
+    parser.add_argument('--dims', type=int, default=1536, help='Dimensions of synthetic vectors')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--m', type=int, nargs='+', default=[16])
+    parser.add_argument('--construction-ef', type=int, nargs='+', default=[100])
+    parser.add_argument('--search-ef', type=int, nargs='+', default=[10, 50, 100])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    base = load_vectors(args)
+
+    table = Table(title=f'HNSW recall@{args.k} vs latency ({args.queries} queries per run)')
+    for column in ('Size', 'M', 'construction_ef', 'search_ef', 'Recall', 'p50 ms', 'p99 ms', 'Build s'):
+        table.add_column(column)
+
+    for size in args.sizes:
+        corpus = resample(base, size, rng)
+        queries = resample(base, args.queries, rng)
+        truth = exact_top_k(corpus, queries, args.k)
+
+        for m, construction_ef, search_ef in itertools.product(args.m, args.construction_ef, args.search_ef):
+            hnsw_config = HNSWConfig(construction_ef=construction_ef, search_ef=search_ef, M=m)
+            stats = run(corpus, queries, truth, hnsw_config, args.k)
+            table.add_row(
+                str(size),
+                str(m),
+                str(construction_ef),
+                str(search_ef),
+                f"{stats['recall']:.3f}",
+                f"{stats['p50_ms']:.2f}",
+                f"{stats['p99_ms']:.2f}",
+                f"{stats['build_s']:.1f}",
+            )
+
+    console.print(table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Export a vector store to a Parquet snapshot or bootstrap a fresh store from one.
+
+Importing a snapshot loads the stored embeddings directly, so provisioning a new machine or replica
+does not re-embed the watched history through the API. publish writes the memory-mapped index that
+service workers started with --shared-index read from.
+
+Usage:
+    poetry run python -m scripts.snapshot export --out snapshots/2024-12-01
+    poetry run python -m scripts.snapshot import --snapshot snapshots/2024-12-01 --persist-dir ./.vectordb
+    poetry run python -m scripts.snapshot publish --index-dir ./.vectordb/shared
+"""
+
+import argparse
+import asyncio
+import time
+
+from rich.console import Console
+
+from src.review_analyzer import config
+from src.review_analyzer.shared_index import publish_index
+from src.review_analyzer.vector_store import VectorStoreCache
+
+console = Console()
+
+
+async def run(args: argparse.Namespace) -> None:
+    # Opened through the cache so a store migrated to another embedding model uses its current generation
+    stores = VectorStoreCache(persist_dir=args.persist_dir, **config.vector_store_settings())
+    store = stores.get(args.user_id)
+
+    start = time.perf_counter()
+    if args.command == 'publish':
+        snapshot_dir = publish_index(store, args.index_dir)
+        console.print(f'Published {await store.get_movie_count()} movies to {snapshot_dir}')
+        return
+    if args.command == 'export':
+        counts = await store.export_snapshot(args.out)
+    else:
+        # Holds off learn_style and a migration's cutover in any service on the same persist directory
+        async with stores.generations.lock(args.user_id):
+            counts = await store.import_snapshot(args.snapshot)
+
+    summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+    console.print(f'{args.command.capitalize()}ed {summary} in {time.perf_counter() - start:.1f}s')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['export', 'import', 'publish'])
+    parser.add_argument('--persist-dir', default='./.vectordb')
+    parser.add_argument('--user-id', default=None)
+    parser.add_argument('--out', default='./snapshot', help='Directory to export the snapshot to')
+    parser.add_argument('--snapshot', default='./snapshot', help='Snapshot directory to import')
+    parser.add_argument('--index-dir', default='./.vectordb/shared', help='Shared index directory to publish to')
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
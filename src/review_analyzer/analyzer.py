@@ -1,29 +1,119 @@
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
 import asyncio
-from typing import Dict, List
+import hashlib
+import inspect
+import logging
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar, Union
 
 import pandas as pd
-from slugify import slugify
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential_jitter
 
-from src.review_analyzer.config import embeddings, llm
+from src.review_analyzer import config
 from src.review_analyzer.llm import LLMService
-from src.review_analyzer.schemas import Movie, PersonalReviewStyle
+from src.review_analyzer.matcher import ReferenceMatcher
+from src.review_analyzer.patterns import format_pattern_candidates, mine_sentence_patterns, patterns_from_candidates
+from src.review_analyzer.schemas import IngestStats, Movie, PersonalReviewStyle, ProgressEvent, make_movie_id
 from src.review_analyzer.vector_store import VectorStore
 
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+ProgressCallback = Callable[[ProgressEvent], Union[None, Awaitable[None]]]
+
+
+def log_progress(event: ProgressEvent) -> None:
+    """Default progress callback, logging one line per batch at INFO rather than writing to stdout"""
+    for error in event.errors:
+        logger.warning(error)
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    if event.stage in ('movies', 'reviews'):
+        eta = f', ETA {event.eta_seconds:.0f}s' if event.eta_seconds is not None else ''
+        logger.info(
+            f'Processed {event.stage} batch {event.batch}/{event.total_batches}: {event.new} new, '
+            f'{event.skipped} skipped, {event.embeddings_per_second:.1f} embeddings/s{eta}'
+        )
+    elif event.stage == 'analysis':
+        logger.info(f'Stored {event.stored} items, {event.failed} failed, analysing review style...')
+
+
+class _ProgressPublisher:
+    """Turns the running IngestStats into ProgressEvents for a learn_style callback"""
+
+    def __init__(self, stats: IngestStats, total_rows: int, callback: ProgressCallback):
+        self.stats = stats
+        self.total_rows = total_rows
+        self.callback = callback
+        self.started = time.perf_counter()
+        self._errors_reported = 0
+
+    def event(self, stage: str, batch: int = 0, total_batches: int = 0, **fields) -> ProgressEvent:
+        stats = self.stats
+        elapsed = time.perf_counter() - self.started
+        eta = None
+        if stats.processed and stage in ('movies', 'reviews'):
+            eta = elapsed / stats.processed * max(self.total_rows - stats.processed, 0)
+        errors = stats.errors[self._errors_reported :]
+        self._errors_reported = len(stats.errors)
+
+        return ProgressEvent(
+            stage=stage,
+            batch=batch,
+            total_batches=total_batches,
+            rows_processed=stats.processed,
+            total_rows=self.total_rows,
+            new=stats.processed - stats.skipped,
+            skipped=stats.skipped,
+            stored=stats.stored,
+            failed=stats.failed,
+            embeddings_per_second=stats.embedding_calls / elapsed if elapsed else 0.0,
+            write_latency_ms=1000 * stats.write_seconds / stats.write_calls if stats.write_calls else 0.0,
+            elapsed_seconds=elapsed,
+            eta_seconds=eta,
+            errors=errors,
+            **fields,
+        )
+
+    async def publish(self, stage: str, batch: int = 0, total_batches: int = 0, **fields) -> None:
+        event = self.event(stage, batch, total_batches, **fields)
+        try:
+            result = self.callback(event)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            # A failing progress consumer must not abort ingestion
+            logger.warning(f'Progress callback failed: {e}')
+
 
 class ReviewStyleAnalyzer:
-    def __init__(self):
-        self.llm = llm
-        self.embeddings = embeddings
+    def __init__(
+        self,
+        vector_store: Optional[VectorStore] = None,
+        max_attempts: int = 3,
+        retry_initial_wait: float = 1.0,
+        pattern_mode: Optional[str] = None,
+        embeddings: Optional['Embeddings'] = None,
+    ):
+        self.max_attempts = max_attempts
+        self.retry_initial_wait = retry_initial_wait
+        self.pattern_mode = pattern_mode or config.pattern_mining_mode
+        self.ingest_stats = IngestStats()
+        self.embeddings = embeddings or config.get_embeddings()
         self.llm_service = LLMService()
-        self.vector_store = VectorStore()
+        self.vector_store = vector_store or VectorStore(**config.vector_store_settings())
 
-    async def learn_style(self, reviews_path: str, watched_path: str) -> PersonalReviewStyle:
+    async def learn_style(
+        self, reviews_path: str, watched_path: str, on_progress: Optional[ProgressCallback] = None
+    ) -> PersonalReviewStyle:
+        """Ingest the watched movies and reviews, then analyse the reviews into a style profile.
+
+        on_progress receives a ProgressEvent after every batch and stage, and may be a coroutine function.
+        Without one, progress is logged once per batch at INFO (see log_progress).
+        """
         reviews_df = pd.read_csv(reviews_path)
         watched_df = pd.read_csv(watched_path)
 
@@ -33,58 +123,181 @@ class ReviewStyleAnalyzer:
         if watched_df.empty:
             raise ValueError(f'No data found in the provided watched movies CSV file: {watched_path}')
 
-        print('Processing watched movies...')
+        self.ingest_stats = IngestStats()
+        total_rows = len(watched_df) + len(reviews_df)
+        progress = _ProgressPublisher(self.ingest_stats, total_rows, on_progress or log_progress)
         batch_size = 50
-        total_movies = len(watched_df)
 
-        for start_idx in range(0, total_movies, batch_size):
-            batch = watched_df.iloc[start_idx : min(start_idx + batch_size, total_movies)]
-            print(f'Processing batch {start_idx//batch_size + 1}/{(total_movies + batch_size - 1)//batch_size}')
+        for stage, df, process in (
+            ('movies', watched_df, self._process_batch),
+            ('reviews', reviews_df, self._process_review_batch),
+        ):
+            total_batches = (len(df) + batch_size - 1) // batch_size
+            for batch_number, start_idx in enumerate(range(0, len(df), batch_size), start=1):
+                batch = df.iloc[start_idx : min(start_idx + batch_size, len(df))]
 
-            try:
-                await self._process_batch(batch)
-            except Exception as e:
-                print(f'Error processing batch: {e}')
-                continue
+                try:
+                    await process(batch, self.ingest_stats)
+                except Exception as e:
+                    self.ingest_stats.errors.append(f'{stage} batch {batch_number}: {e}')
+                await progress.publish(stage, batch_number, total_batches)
 
+        await progress.publish('analysis')
         style_components = await asyncio.gather(
             self._analyze_vocabulary(reviews_df),
             self._analyze_sentences(reviews_df),
         )
 
-        return self._compile_style_profile(style_components)
+        style_profile = self._compile_style_profile(style_components)
+        await progress.publish('done', style=style_profile)
+        return style_profile
+
+    async def stream_learn_style(self, reviews_path: str, watched_path: str) -> AsyncIterator[ProgressEvent]:
+        """Run learn_style, yielding its progress events as they happen. The last one carries the style profile."""
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.ensure_future(self.learn_style(reviews_path, watched_path, on_progress=queue.put_nowait))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+            # Re-raise anything that stopped learn_style early
+            task.result()
+        finally:
+            task.cancel()
+
+    async def _with_retries(self, operation: Callable[[], Awaitable[T]], stats: IngestStats) -> T:
+        """Run a single embedding request or write, retrying only that call with backoff and jitter"""
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_exponential_jitter(initial=self.retry_initial_wait, max=10, jitter=self.retry_initial_wait),
+            reraise=True,
+        ):
+            with attempt:
+                if attempt.retry_state.attempt_number > 1:
+                    stats.retries += 1
+                try:
+                    return await operation()
+                except Exception:
+                    stats.wasted_calls += 1
+                    raise
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(min=1, max=10),
-    )
-    async def _process_batch(self, batch: pd.DataFrame):
-        """Process a batch of movies with rate limiting"""
+    async def _embed(self, text: str, stats: IngestStats) -> List[float]:
+        async def embed():
+            stats.embedding_calls += 1
+            return await self.embeddings.aembed_query(text)
 
-        # Create Movie objects for new movies
-        new_movies = [
-            Movie.from_row(row, slugify(f"{row.get('Name', '')}-{row.get('Year', '')}"))
-            for _, row in batch.iterrows()
-            if not await self.vector_store.get_movie_by_id(slugify(f"{row.get('Name', '')}-{row.get('Year', '')}"))
-        ]
+        return await self._with_retries(embed, stats)
+
+    async def _write(self, store: Callable[[], Awaitable[bool]], description: str, stats: IngestStats) -> None:
+        async def write():
+            stats.write_calls += 1
+            started = time.perf_counter()
+            try:
+                stored = await store()
+            finally:
+                stats.write_seconds += time.perf_counter() - started
+            if not stored:
+                raise RuntimeError(f'Failed to store {description}')
+
+        await self._with_retries(write, stats)
+
+    async def _ingest_movie(self, movie: Movie, stats: IngestStats) -> None:
+        """Embed and store one movie. The embedding is kept if only the write needs retrying."""
+        try:
+            embedding = await self._embed(movie.context, stats)
+            await self._write(
+                lambda: self.vector_store.store_movie(
+                    movie_title=movie.title, metadata=movie.to_metadata(), embedding=embedding
+                ),
+                f'movie {movie.title}',
+                stats,
+            )
+            stats.stored += 1
+        except Exception as e:
+            stats.failed += 1
+            stats.errors.append(f'movie {movie.title}: {e}')
+
+    async def _process_batch(self, batch: pd.DataFrame, stats: Optional[IngestStats] = None) -> IngestStats:
+        """Embed and store the new movies in a batch, retrying individual calls rather than the whole batch"""
+        stats = stats or IngestStats()
+        movies = {}
+        for _, row in batch.iterrows():
+            movie_id = make_movie_id(row.get('Name', ''), row.get('Year', ''))
+            movies[movie_id] = Movie.from_row(row, movie_id)
+
+        existing_ids = await self._with_retries(lambda: self.vector_store.get_existing_movie_ids(list(movies)), stats)
+        new_movies = [movie for movie_id, movie in movies.items() if movie_id not in existing_ids]
+        stats.processed += len(batch)
+        stats.skipped += len(batch) - len(new_movies)
 
         if new_movies:
-            print(f'Generating embeddings for {len(new_movies)} new movies...')
-
-            # Generate embeddings in parallel
-            embeddings = await asyncio.gather(*(self.embeddings.aembed_query(movie.context) for movie in new_movies))
-
-            # Store movies with their embeddings
-            await asyncio.gather(
-                *(
-                    self.vector_store.store_movie(
-                        movie_title=movie.title, metadata=movie.to_metadata(), embedding=embedding
-                    )
-                    for movie, embedding in zip(new_movies, embeddings)
-                )
+            await asyncio.gather(*(self._ingest_movie(movie, stats) for movie in new_movies))
+
+        return stats
+
+    async def _ingest_review(
+        self,
+        review_id: str,
+        review_text: str,
+        movie: Movie,
+        embedding: Optional[List[float]],
+        stats: IngestStats,
+    ) -> None:
+        """Store one review, embedding its movie only when it is not in the watched collection"""
+        try:
+            if embedding is None:
+                embedding = await self._embed(movie.context, stats)
+            await self._write(
+                lambda: self.vector_store.store_review(
+                    review_id=review_id,
+                    review_text=review_text,
+                    metadata={'movie_id': movie.id, 'title': movie.title, 'year': movie.year},
+                    embedding=embedding,
+                ),
+                f'review {review_id}',
+                stats,
+            )
+            stats.stored += 1
+        except Exception as e:
+            stats.failed += 1
+            stats.errors.append(f'review {review_id}: {e}')
+
+    async def _process_review_batch(self, batch: pd.DataFrame, stats: Optional[IngestStats] = None) -> IngestStats:
+        """Store a batch of reviews under the embedding of the movie they review"""
+        stats = stats or IngestStats()
+        reviews = {}
+        for _, row in batch.iterrows():
+            review_text = row.get('Review')
+            if not isinstance(review_text, str) or not review_text.strip():
+                continue
+
+            movie = Movie.from_row(row, make_movie_id(row.get('Name', ''), row.get('Year', '')))
+            # Content hash keeps IDs stable across runs while allowing several reviews of the same film
+            review_id = f"{movie.id}-{hashlib.sha1(review_text.encode('utf-8')).hexdigest()[:8]}"
+            reviews[review_id] = (review_text, movie)
+
+        stats.processed += len(batch)
+        if not reviews:
+            stats.skipped += len(batch)
+            return stats
+
+        existing_ids = await self._with_retries(lambda: self.vector_store.get_existing_review_ids(list(reviews)), stats)
+        new_reviews = {review_id: review for review_id, review in reviews.items() if review_id not in existing_ids}
+        stats.skipped += len(batch) - len(new_reviews)
+        if not new_reviews:
+            return stats
+
+        # Reuse the stored movie embeddings, only embedding films that are missing from watched.csv
+        movie_ids = list({movie.id for _, movie in new_reviews.values()})
+        stored_embeddings = await self._with_retries(lambda: self.vector_store.get_movie_embeddings(movie_ids), stats)
+
+        await asyncio.gather(
+            *(
+                self._ingest_review(review_id, review_text, movie, stored_embeddings.get(movie.id), stats)
+                for review_id, (review_text, movie) in new_reviews.items()
             )
-        else:
-            print('All movies in batch already exist in database.')
+        )
+        return stats
 
     async def _analyze_vocabulary(self, reviews_df: pd.DataFrame) -> Dict:
         """Analyze vocabulary patterns in reviews"""
@@ -98,19 +311,31 @@ class ReviewStyleAnalyzer:
             self.llm_service._extract_references(all_reviews),
         )
 
+        # Rank the extracted references by how often they really occur, most frequent first
+        reviews = [review for review in reviews_df['Review'].tolist() if isinstance(review, str)]
+        reference_counts = ReferenceMatcher(results[1]).count(reviews)
+        references = sorted(reference_counts, key=reference_counts.get, reverse=True)
+
         return {
             'sentiment': results[0],
-            'references': results[1],
+            'references': references,
+            'reference_counts': reference_counts,
             'average_length': average_length,
         }
 
     async def _analyze_sentences(self, reviews_df: pd.DataFrame) -> List[Dict[str, str]]:
-        """Analyze common sentence structures and patterns in reviews"""
+        """Analyze common sentence structures and patterns in reviews.
 
-        all_reviews = ' '.join(reviews_df['Review'].tolist())
-        results = await self.llm_service._analyze_sentence_patterns(all_reviews)
+        Openings, closings, transitions and comparisons are counted locally, so the LLM only sees the top
+        candidates with their frequencies, or is skipped entirely in fast mode.
+        """
+        candidates = mine_sentence_patterns(reviews_df['Review'])
+        mined = patterns_from_candidates(candidates)
+        if self.pattern_mode == 'fast':
+            return mined
 
-        return results
+        summary = format_pattern_candidates(candidates, int(reviews_df['Review'].notna().sum()))
+        return await self.llm_service._analyze_sentence_patterns(summary, fallback=mined)
 
     def _compile_style_profile(self, style_components: List[Dict]) -> PersonalReviewStyle:
         """Compile analyzed components into a PersonalReviewStyle object"""
@@ -122,4 +347,5 @@ class ReviewStyleAnalyzer:
             average_length=vocabulary_data['average_length'],
             sentiment_scores=vocabulary_data['sentiment'],
             common_references=vocabulary_data['references'],
+            reference_counts=vocabulary_data.get('reference_counts', {}),
         )
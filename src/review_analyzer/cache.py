@@ -0,0 +1,97 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when a response was never recorded"""
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Stable hash of JSON-serialisable key parts"""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Persistent cache of JSON values in SQLite, with a TTL and least recently used eviction past max_entries.
+
+    With max_entries=None entries are never evicted, only expired.
+    """
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = 10000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entries '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)')
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None when it is missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT value, created_at FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._db.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+            self.hits += 1
+
+        try:
+            return json.loads(row[0])
+        except json.JSONDecodeError as e:
+            logger.error(f'Dropping corrupt cache entry {key}: {e}')
+            self.delete(key)
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._evict(now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM entries')
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds is not None:
+            self._db.execute('DELETE FROM entries WHERE created_at < ?', (now - self.ttl_seconds,))
+        if self.max_entries is None:
+            return
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                'DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at, rowid LIMIT ?)',
+                (excess,),
+            )
+
+    def __len__(self) -> int:
+        return self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
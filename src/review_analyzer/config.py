@@ -1,8 +1,9 @@
 import os
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
 # Get the project root directory (2 levels up from this file)
 project_root = Path(__file__).parent.parent.parent
@@ -10,11 +11,258 @@ project_root = Path(__file__).parent.parent.parent
 dotenv_path = project_root / '.env'
 load_dotenv(dotenv_path)
 
-# Get API key
-api_key = os.getenv('OPENAI_API_KEY')
-if not api_key:
-    raise ValueError('OPENAI_API_KEY not found in environment variables')
+# Embedding settings. EMBEDDING_DIMENSIONS reduces the vector size either through the
+# provider's native `dimensions` parameter or through a locally fitted PCA projection.
+embedding_model = os.getenv('EMBEDDING_MODEL', 'text-embedding-ada-002')
+embedding_dimensions = int(os.getenv('EMBEDDING_DIMENSIONS', '0')) or None
+embedding_reduction = os.getenv('EMBEDDING_REDUCTION', 'native')
+embedding_projection_path = os.getenv('EMBEDDING_PROJECTION_PATH', './.vectordb/projection.npz')
 
-# Create shared instances
-llm = ChatOpenAI(api_key=api_key, model='gpt-4o')
-embeddings = OpenAIEmbeddings(api_key=api_key)
+
+def supports_native_dimensions(model: str) -> bool:
+    """Whether the provider accepts the `dimensions` parameter for a model, which older models such as ada-002 do not"""
+    return model.startswith('text-embedding-3')
+
+
+if embedding_reduction not in ('native', 'pca'):
+    raise ValueError(f"EMBEDDING_REDUCTION must be 'native' or 'pca', got {embedding_reduction!r}")
+if embedding_dimensions and embedding_reduction == 'native' and not supports_native_dimensions(embedding_model):
+    raise ValueError(
+        f'{embedding_model} does not support native dimensions, use EMBEDDING_REDUCTION=pca to reduce its embeddings'
+    )
+
+# HNSW index parameters for new collections, unset values use Chroma's defaults
+hnsw_construction_ef = int(os.getenv('HNSW_CONSTRUCTION_EF', '0')) or None
+hnsw_search_ef = int(os.getenv('HNSW_SEARCH_EF', '0')) or None
+hnsw_m = int(os.getenv('HNSW_M', '0')) or None
+
+# Watched movies sharding: unset, 'hash' over MOVIE_SHARDS collections, or a metadata key such as 'era'
+movie_shard_by = os.getenv('MOVIE_SHARD_BY', '') or None
+movie_shards = int(os.getenv('MOVIE_SHARDS', '4'))
+
+# HTTP connection pool shared by the chat and embedding clients
+http_max_connections = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+http_max_keepalive_connections = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+http_keepalive_expiry = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+http2 = os.getenv('HTTP2', 'false').lower() in ('1', 'true', 'yes')
+http_timeout = float(os.getenv('HTTP_TIMEOUT', '60'))
+http_connect_timeout = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+
+# Opt-in persistent cache of generated reviews, disabled unless REVIEW_CACHE_PATH is set
+review_cache_path = os.getenv('REVIEW_CACHE_PATH', '')
+review_cache_ttl = float(os.getenv('REVIEW_CACHE_TTL', str(7 * 24 * 3600)))
+review_cache_max_entries = int(os.getenv('REVIEW_CACHE_MAX_ENTRIES', '10000'))
+
+# Cache of style analysis LLM responses: off, read-through, record (always call and store) or replay (cache only)
+llm_cache_mode = os.getenv('LLM_CACHE_MODE', 'off')
+llm_cache_path = os.getenv('LLM_CACHE_PATH', './.vectordb/llm_cache.db')
+
+if llm_cache_mode not in ('off', 'read-through', 'record', 'replay'):
+    raise ValueError(f"LLM_CACHE_MODE must be 'off', 'read-through', 'record' or 'replay', got {llm_cache_mode!r}")
+
+# Chat model per task route. Auxiliary analysis and scoring calls default to a smaller, faster model.
+# {ROUTE}_FALLBACK_MODELS lists models tried in order when a call fails, {ROUTE}_TIMEOUT bounds each attempt.
+MODEL_ROUTES = ('generation', 'analysis', 'scoring')
+route_models = {
+    'generation': os.getenv('GENERATION_MODEL', 'gpt-4o'),
+    'analysis': os.getenv('ANALYSIS_MODEL', 'gpt-4o-mini'),
+    'scoring': os.getenv('SCORING_MODEL', 'gpt-4o-mini'),
+}
+route_fallback_models = {
+    route: [model.strip() for model in os.getenv(f'{route.upper()}_FALLBACK_MODELS', '').split(',') if model.strip()]
+    for route in MODEL_ROUTES
+}
+route_timeouts = {route: float(os.getenv(f'{route.upper()}_TIMEOUT', '0')) or None for route in MODEL_ROUTES}
+
+# Sentence patterns are mined locally, then summarised by the LLM (llm) or used as they are (fast)
+pattern_mining_mode = os.getenv('PATTERN_MINING_MODE', 'llm')
+
+if pattern_mining_mode not in ('llm', 'fast'):
+    raise ValueError(f"PATTERN_MINING_MODE must be 'llm' or 'fast', got {pattern_mining_mode!r}")
+
+# Model clients are created on first use, so importing the package stays fast and does not
+# load langchain_openai until a client is actually needed.
+
+
+def get_api_key() -> str:
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise ValueError('OPENAI_API_KEY not found in environment variables')
+    return api_key
+
+
+@lru_cache(maxsize=None)
+def get_http_transport():
+    from src.review_analyzer.transport import PooledTransport
+
+    return PooledTransport(
+        max_connections=http_max_connections,
+        max_keepalive_connections=http_max_keepalive_connections,
+        keepalive_expiry=http_keepalive_expiry,
+        http2=http2,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_http_client():
+    """Async HTTP client whose connection pool is shared by the chat and embedding clients"""
+    import httpx
+
+    timeout = httpx.Timeout(http_timeout, connect=http_connect_timeout)
+    return httpx.AsyncClient(transport=get_http_transport(), timeout=timeout)
+
+
+@lru_cache(maxsize=None)
+def get_route_metrics() -> dict:
+    """Shared latency, token and cost metrics of every route, keyed by route name"""
+    from src.review_analyzer.routing import RouteMetrics
+
+    models = {**route_models, 'embeddings': embedding_model}
+    return {route: RouteMetrics(route, model) for route, model in models.items()}
+
+
+@lru_cache(maxsize=None)
+def get_llm(route: str = 'generation'):
+    """Chat model of a task route (generation, analysis or scoring), wrapped in its fallback chain if it has one"""
+    from langchain_openai import ChatOpenAI
+
+    from src.review_analyzer.routing import RouteMetricsHandler
+
+    if route not in MODEL_ROUTES:
+        raise ValueError(f'Unknown model route {route!r}, expected one of {MODEL_ROUTES}')
+
+    metrics = get_route_metrics()[route]
+    models = [
+        ChatOpenAI(
+            api_key=get_api_key(),
+            model=model,
+            timeout=route_timeouts[route] or http_timeout,
+            # Reports token usage on streamed responses as well, for the route's cost metrics
+            stream_usage=True,
+            callbacks=[RouteMetricsHandler(metrics, model)],
+            http_async_client=get_http_client(),
+        )
+        for model in [route_models[route], *route_fallback_models[route]]
+    ]
+    return models[0].with_fallbacks(models[1:]) if len(models) > 1 else models[0]
+
+
+def get_model_name(llm) -> str:
+    """Model of a chat client, or the primary model of a fallback chain"""
+    return getattr(llm, 'model_name', None) or getattr(getattr(llm, 'runnable', None), 'model_name', None)
+
+
+@lru_cache(maxsize=None)
+def _get_projection():
+    from src.review_analyzer.projection import PCAProjection
+
+    if not Path(embedding_projection_path).exists():
+        raise ValueError(
+            f'No PCA projection found at {embedding_projection_path}. '
+            'Fit one with `python -m scripts.embedding_benchmark fit` first.'
+        )
+    projection = PCAProjection.load(embedding_projection_path)
+    if projection.output_dimensions != embedding_dimensions or projection.source_model != embedding_model:
+        raise ValueError(
+            f'PCA projection at {embedding_projection_path} maps {projection.source_model} to '
+            f'{projection.output_dimensions} dimensions, expected {embedding_model} to {embedding_dimensions}'
+        )
+    return projection
+
+
+def _uses_projection() -> bool:
+    return bool(embedding_dimensions) and embedding_reduction == 'pca'
+
+
+@lru_cache(maxsize=None)
+def get_embeddings():
+    """Embeddings of the embeddings route. There is no fallback chain, as other models' vectors are not comparable."""
+    from langchain_openai import OpenAIEmbeddings
+
+    from src.review_analyzer.routing import MeteredEmbeddings
+
+    if _uses_projection():
+        from src.review_analyzer.projection import ProjectedEmbeddings
+
+        base = OpenAIEmbeddings(api_key=get_api_key(), model=embedding_model, http_async_client=get_http_client())
+        embeddings = ProjectedEmbeddings(base, _get_projection())
+    else:
+        embeddings = OpenAIEmbeddings(
+            api_key=get_api_key(),
+            model=embedding_model,
+            dimensions=embedding_dimensions,
+            http_async_client=get_http_client(),
+        )
+    return MeteredEmbeddings(embeddings, get_route_metrics()['embeddings'])
+
+
+@lru_cache(maxsize=None)
+def get_embeddings_for(model: str, dimensions: Optional[int] = None):
+    """Embeddings of a specific model, e.g. one a store is being migrated to. Only native dimensions are supported."""
+    if model == get_embedding_signature() and dimensions == embedding_dimensions:
+        return get_embeddings()
+    if dimensions and not supports_native_dimensions(model):
+        raise ValueError(f'{model} does not support native dimensions')
+
+    from langchain_openai import OpenAIEmbeddings
+
+    from src.review_analyzer.routing import MeteredEmbeddings
+
+    base = OpenAIEmbeddings(
+        api_key=get_api_key(), model=model, dimensions=dimensions, http_async_client=get_http_client()
+    )
+    return MeteredEmbeddings(base, get_route_metrics()['embeddings'])
+
+
+def get_embedding_signature() -> str:
+    """Identifier stamped on stored collections so they are never mixed with incompatible vectors"""
+    if _uses_projection():
+        # Includes the projection so a refitted projection is never mixed with old vectors
+        return f'{embedding_model}+pca-{_get_projection().fingerprint}'
+    return embedding_model
+
+
+@lru_cache(maxsize=None)
+def get_review_cache():
+    """Shared cache of generated reviews, or None when caching is not enabled"""
+    if not review_cache_path:
+        return None
+    from src.review_analyzer.cache import ResultCache
+
+    return ResultCache(review_cache_path, ttl_seconds=review_cache_ttl or None, max_entries=review_cache_max_entries)
+
+
+@lru_cache(maxsize=None)
+def get_llm_cache():
+    """Shared cache of analysis LLM responses, or None when LLM_CACHE_MODE is off"""
+    if llm_cache_mode == 'off':
+        return None
+    from src.review_analyzer.cache import ResultCache
+
+    # Never evicted, so every recorded response stays available to replay until the file is deleted
+    return ResultCache(llm_cache_path, max_entries=None)
+
+
+def vector_store_settings() -> dict:
+    """Keyword arguments for VectorStore matching the configured embeddings and index parameters"""
+    from src.review_analyzer.vector_store import HNSWConfig, ShardConfig
+
+    return {
+        'embedding_model': get_embedding_signature(),
+        'embedding_dimensions': embedding_dimensions,
+        'hnsw_config': HNSWConfig(construction_ef=hnsw_construction_ef, search_ef=hnsw_search_ef, M=hnsw_m),
+        'shard_config': ShardConfig(by=movie_shard_by, num_shards=movie_shards),
+    }
+
+
+def __getattr__(name: str):
+    # Backwards compatible access to the shared instances, e.g. `from config import llm`
+    if name == 'llm':
+        return get_llm()
+    if name == 'embeddings':
+        return get_embeddings()
+    if name == 'embedding_signature':
+        return get_embedding_signature()
+    if name == 'api_key':
+        return get_api_key()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,32 +1,207 @@
+import asyncio
 import json
-from typing import Dict, List
+import logging
+import re
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 
-from langchain.prompts import ChatPromptTemplate
-
-from src.review_analyzer.config import embeddings, llm
-from src.review_analyzer.schemas import GeneratedReview, MovieContext, PersonalReviewStyle
+from src.review_analyzer import config
+from src.review_analyzer.cache import ResultCache, make_cache_key
+from src.review_analyzer.matcher import ReferenceMatcher, get_reference_matcher
+from src.review_analyzer.schemas import (
+    DegradationPolicy,
+    GeneratedReview,
+    MovieContext,
+    PersonalReviewStyle,
+    RetrievalResult,
+    make_movie_id,
+)
 from src.review_analyzer.vector_store import VectorStore
 
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for English text, good enough for budgeting prompt size
+CHARS_PER_TOKEN = 4
+
+# Part of the review cache key, bump it whenever the prompts change so older cached reviews are not reused
+PROMPT_VERSION = 1
+
+
+class Deadline:
+    """Point in time by which a whole request must finish, shared by all of its stages"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    @classmethod
+    def coerce(cls, deadline: Union['Deadline', float, None]) -> 'Deadline':
+        return deadline if isinstance(deadline, Deadline) else cls(deadline)
+
+    def remaining(self, share: float = 1.0) -> Optional[float]:
+        """Seconds left, scaled by share, or None without a deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic()) * share
+
 
 class ReviewGenerator:
-    def __init__(self, style_profile: PersonalReviewStyle):
+    def __init__(
+        self,
+        style_profile: PersonalReviewStyle,
+        few_shot_token_budget: int = 600,
+        few_shot_candidates: int = 10,
+        vector_store: Optional[VectorStore] = None,
+        early_stop_score: float = 0.8,
+        degradation: Optional[DegradationPolicy] = None,
+        review_cache: Optional[ResultCache] = None,
+        embeddings: Optional['Embeddings'] = None,
+    ):
         self.style = style_profile
-        self.llm = llm
-        self.embeddings = embeddings
-        self.vector_store = VectorStore()
+        self.few_shot_token_budget = few_shot_token_budget
+        self.few_shot_candidates = few_shot_candidates
+        # Best-of-N generation returns the first candidate scoring at least this on the local style metric
+        self.early_stop_score = early_stop_score
+        self.degradation = degradation or DegradationPolicy()
+        self.review_cache = review_cache if review_cache is not None else config.get_review_cache()
+        self.llm = config.get_llm('generation')
+        # Style confidence scoring is low-stakes, so it is routed to its own, usually smaller, model
+        self.scoring_llm = config.get_llm('scoring')
+        # Must be the model the vector store was built with
+        self.embeddings = embeddings or config.get_embeddings()
+        self.vector_store = vector_store or VectorStore(**config.vector_store_settings())
         self._pattern_scores = {}
 
-    async def generate_review(self, movie_context: MovieContext, temperature: float = 0.9) -> GeneratedReview:
-        """Generate a review based on movie context and similar movies"""
+    async def generate_review(
+        self,
+        movie_context: MovieContext,
+        temperature: float = 0.9,
+        best_of: int = 1,
+        deadline: Union[Deadline, float, None] = None,
+        bypass_cache: bool = False,
+    ) -> GeneratedReview:
+        """Generate a review based on movie context and similar movies.
 
-        movie_query = movie_context.get_embedding_context()
-        query_embedding = await self.embeddings.aembed_query(movie_query)
+        deadline (seconds or a Deadline) bounds the whole request. Stages that run out of time are dropped
+        or cut short according to the degradation policy, and listed in degraded_stages.
+
+        With a review cache, an identical earlier request is answered from the cache without any API calls.
+        bypass_cache forces a fresh sample, which then replaces the cached review.
+        """
+        cache_key = self._review_cache_key(movie_context, temperature, best_of)
+        if self.review_cache is not None and not bypass_cache:
+            cached = self.review_cache.get(cache_key)
+            if cached is not None:
+                return GeneratedReview.model_validate(cached)
 
-        similar_movies = await self.vector_store.find_similar_movies(
+        deadline = Deadline.coerce(deadline)
+        retrieval = await self.retrieve(movie_context, deadline=deadline)
+        review = await self.compose(retrieval, temperature=temperature, best_of=best_of, deadline=deadline)
+
+        # Degraded reviews are not cached, so a later request gets a chance at the full result
+        if self.review_cache is not None and not review.degraded_stages:
+            self.review_cache.set(cache_key, review.model_dump())
+        return review
+
+    def _review_cache_key(self, movie_context: MovieContext, temperature: float, best_of: int) -> str:
+        return make_cache_key(
+            PROMPT_VERSION,
+            self.style.model_dump(),
+            movie_context.model_dump(),
+            {
+                'model': config.get_model_name(self.llm),
+                'temperature': temperature,
+                'best_of': best_of,
+                'early_stop_score': self.early_stop_score,
+                'few_shot_token_budget': self.few_shot_token_budget,
+                'few_shot_candidates': self.few_shot_candidates,
+            },
+        )
+
+    async def retrieve(
+        self, movie_context: MovieContext, n_results: int = 5, deadline: Union[Deadline, float, None] = None
+    ) -> RetrievalResult:
+        """Embed the movie once and look up similar watched movies and past reviews.
+
+        The result can be displayed, cached or shared by several compose calls. When the lookup would
+        exceed its share of the deadline, it is skipped and the review is written without neighbours.
+        """
+        deadline = Deadline.coerce(deadline)
+        start = time.perf_counter()
+        try:
+            retrieval = await asyncio.wait_for(
+                self._retrieve(movie_context, n_results),
+                timeout=deadline.remaining(self.degradation.retrieval_share),
+            )
+        except asyncio.TimeoutError:
+            if not self.degradation.skip_neighbours:
+                raise
+            logger.warning(f'Retrieval for {movie_context.title} timed out, generating without similar movies')
+            retrieval = RetrievalResult(
+                movie_context=movie_context,
+                query_embedding=[],
+                similar_movies=[],
+                similar_reviews=[],
+                degraded_stages=['retrieval'],
+            )
+
+        retrieval.stage_seconds['retrieval'] = time.perf_counter() - start
+        return retrieval
+
+    async def _retrieve(self, movie_context: MovieContext, n_results: int) -> RetrievalResult:
+        # A film the user has logged is already embedded, reuse that vector instead of calling the API
+        stored = await self.vector_store.lookup_movie(movie_context.title, movie_context.year)
+        if stored:
+            target_id, query_embedding = stored['id'], stored['embedding']
+        else:
+            target_id = make_movie_id(movie_context.title, movie_context.year)
+            query_embedding = await self.embeddings.aembed_query(movie_context.get_embedding_context())
+
+        # Never use the film itself as a neighbour, or the user's own review of it as an example
+        similar_movies, similar_reviews = await asyncio.gather(
+            self.vector_store.find_similar_movies(
+                query_embedding=query_embedding,
+                n_results=n_results,
+                filter_metadata={'id': {'$ne': target_id}} if stored else None,
+            ),
+            self.vector_store.find_similar_reviews(
+                query_embedding=query_embedding,
+                n_results=self.few_shot_candidates,
+                filter_metadata={'movie_id': {'$ne': target_id}},
+            ),
+        )
+
+        return RetrievalResult(
+            movie_context=movie_context,
             query_embedding=query_embedding,
-            n_results=5,
+            similar_movies=similar_movies,
+            similar_reviews=similar_reviews,
+            stored_movie_id=target_id if stored else None,
         )
 
+    async def compose(
+        self,
+        retrieval: RetrievalResult,
+        temperature: float = 0.9,
+        best_of: int = 1,
+        deadline: Union[Deadline, float, None] = None,
+    ) -> GeneratedReview:
+        """Generate a review from a previous retrieval, without embedding or querying again.
+
+        With best_of > 1, that many candidates are sampled concurrently and the best match on the local
+        style metric is kept, so quality improves at roughly the latency of a single call.
+        """
+        deadline = Deadline.coerce(deadline)
+        degraded_stages = list(retrieval.degraded_stages)
+        stage_seconds = dict(retrieval.stage_seconds)
+        from langchain_core.prompts import ChatPromptTemplate
+
+        movie_context = retrieval.movie_context
+        similar_movies = retrieval.similar_movies
+        similar_reviews = retrieval.similar_reviews
+
         prompt = ChatPromptTemplate.from_messages(
             [
                 # System message: Define the reviewer's characteristics and style
@@ -53,6 +228,9 @@ class ReviewGenerator:
                 {similar_movies}
 
                 Consider these movies' genres, and themes when writing the review.
+
+                Some of my past reviews of similar films, match their voice but do not copy them:
+                {examples}
                 
                 The review must:
                 - Recreate vibe and feeling of my reviews
@@ -64,9 +242,11 @@ class ReviewGenerator:
             ]
         )
 
+        examples = self._select_examples(similar_reviews)
         variables = {
             'title': movie_context.title,
             'similar_movies': self._format_similar_movies(similar_movies),
+            'examples': self._format_examples(examples),
             'sentiment_scores': str(self.style.sentiment_scores),
             'references': ', '.join(self.style.common_references[:5]),
             'opening_pattern': self.style.sentence_patterns[0]['pattern'],
@@ -74,19 +254,122 @@ class ReviewGenerator:
             'comparison_pattern': self.style.sentence_patterns[2]['pattern'],
             'closing_pattern': self.style.sentence_patterns[3]['pattern'],
             'avg_length': self.style.average_length,
-            'temperature': temperature,
         }
 
-        response = await (prompt | self.llm).ainvoke(variables)
+        start = time.perf_counter()
+        review_text, _ = await self._generate_best_of(
+            prompt | self.llm.bind(temperature=temperature),
+            variables,
+            best_of,
+            examples,
+            timeout=deadline.remaining(),
+            degraded=degraded_stages,
+        )
+        stage_seconds['generation'] = time.perf_counter() - start
 
-        review_text = response.content
+        start = time.perf_counter()
+        style_confidence = await self._style_confidence_within(review_text, deadline, degraded_stages)
+        stage_seconds['style_confidence'] = time.perf_counter() - start
 
         return GeneratedReview(
             text=review_text,
-            style_confidence=await self._calculate_style_confidence(review_text),
+            style_confidence=style_confidence,
             key_elements_used=self._extract_key_elements(review_text),
+            degraded_stages=degraded_stages,
+            stage_seconds=stage_seconds,
         )
 
+    async def _generate_best_of(
+        self,
+        chain,
+        variables: Dict,
+        n: int,
+        examples: List[Dict],
+        timeout: Optional[float] = None,
+        degraded: Optional[List[str]] = None,
+    ) -> Tuple[str, float]:
+        """Sample n reviews concurrently and return the best one with its local style score.
+
+        Candidates are scored as they finish, and the outstanding ones are cancelled as soon as one
+        reaches early_stop_score. Failed candidates are skipped unless every candidate fails. Candidates
+        are streamed, so when the timeout expires first the best partial text can still be returned.
+        """
+        buffers = [[] for _ in range(max(n, 1))]
+        pending = {asyncio.ensure_future(self._stream_candidate(chain, variables, buffer)) for buffer in buffers}
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        best_text, best_score, errors, timed_out = None, -1.0, [], False
+        try:
+            while pending:
+                remaining = None if expires_at is None else max(0.0, expires_at - time.monotonic())
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    timed_out = True
+                    break
+
+                for task in done:
+                    if task.exception() is not None:
+                        logger.warning(f'Error generating review candidate: {task.exception()}')
+                        errors.append(task.exception())
+                        continue
+
+                    score = self._local_style_score(task.result(), examples)
+                    if score > best_score:
+                        best_text, best_score = task.result(), score
+                if best_score >= self.early_stop_score:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if best_text is not None:
+            return best_text, best_score
+        if not timed_out:
+            raise errors[0]
+
+        partials = [''.join(buffer) for buffer in buffers if buffer]
+        if not partials or not self.degradation.partial_text:
+            raise asyncio.TimeoutError('Review generation ran out of time')
+        logger.warning('Review generation timed out, returning partial text')
+        if degraded is not None:
+            degraded.append('generation')
+        return max(((text, self._local_style_score(text, examples)) for text in partials), key=lambda c: c[1])
+
+    @staticmethod
+    async def _stream_candidate(chain, variables: Dict, buffer: List[str]) -> str:
+        async for chunk in chain.astream(variables):
+            buffer.append(chunk.content)
+        return ''.join(buffer)
+
+    async def _style_confidence_within(
+        self, review_text: str, deadline: Deadline, degraded: List[str]
+    ) -> Dict[str, float]:
+        """Style confidence within the deadline, falling back to the local length score"""
+        try:
+            return await asyncio.wait_for(self._calculate_style_confidence(review_text), timeout=deadline.remaining())
+        except (asyncio.TimeoutError, ValueError) as e:
+            if not self.degradation.skip_confidence:
+                raise
+            logger.warning(f'Skipping style confidence: {e!r}')
+            degraded.append('style_confidence')
+
+        target_length = self.style.average_length
+        return {'length': 1 - abs(target_length - len(review_text.split())) / target_length}
+
+    def _local_style_score(self, review_text: str, examples: List[Dict]) -> float:
+        """Cheap 0-1 style match from length, references and vocabulary overlap with past reviews, no LLM call"""
+        words = re.findall(r"[a-z']+", review_text.lower())
+        target_length = self.style.average_length
+        scores = [max(0.0, 1 - abs(target_length - len(words)) / target_length)]
+
+        if self.style.common_references:
+            scores.append(float(bool(self.reference_matcher.find(review_text))))
+
+        example_words = {word for example in examples for word in re.findall(r"[a-z']+", example['document'].lower())}
+        if example_words and words:
+            scores.append(len(example_words.intersection(words)) / len(set(words)))
+
+        return sum(scores) / len(scores)
+
     async def _calculate_style_confidence(self, review_text: str) -> Dict[str, float]:
         """
         Calculate how well the generated review matches the user's style.
@@ -94,6 +377,8 @@ class ReviewGenerator:
         Raises:
             ValueError: If the LLM response cannot be parsed or is not in the expected format.
         """
+        from langchain_core.prompts import ChatPromptTemplate
+
         confidence_scores = {
             'length': 0.0,
             'opening': 0.0,
@@ -137,7 +422,7 @@ class ReviewGenerator:
             'patterns': '\n'.join(f"- {p['type']}: {p['pattern']}" for p in self.style.sentence_patterns),
         }
 
-        response = await (prompt | self.llm.with_config({'temperature': 0.1})).ainvoke(variables)
+        response = await (prompt | self.scoring_llm.bind(temperature=0.1)).ainvoke(variables)
         try:
             pattern_scores = json.loads(response.content.strip())
 
@@ -148,22 +433,20 @@ class ReviewGenerator:
                     raise ValueError(f'Invalid score range for {pattern_type}: {score}')
                 confidence_scores[pattern_type] = score
 
-        except (ValueError, json.JSONDecodeError) as e:
-            print(f'Error parsing response: {str(e)}')
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f'Error parsing response: {str(e)}')
             raise ValueError(f'Failed to analyze review style: {str(e)}') from e
 
         return confidence_scores
 
     def _extract_key_elements(self, review_text: str) -> List[str]:
         """Extract key stylistic elements used in the generated review."""
-        elements = []
+        return [f'Referenced {ref}' for ref in self.reference_matcher.find(review_text)]
 
-        # Check for common references
-        for ref in self.style.common_references:
-            if ref.lower() in review_text.lower():
-                elements.append(f'Referenced {ref}')
-
-        return elements
+    @property
+    def reference_matcher(self) -> ReferenceMatcher:
+        # Compiled once per set of references and shared by every generator for the same style profile
+        return get_reference_matcher(tuple(self.style.common_references))
 
     def _format_similar_movies(self, similar_movies: List[Dict]) -> str:
         """Format similar movies in a clear, structured way for the LLM"""
@@ -182,6 +465,30 @@ class ReviewGenerator:
             )
         return '\n\n'.join(formatted)
 
+    def _select_examples(self, similar_reviews: List[Dict]) -> List[Dict]:
+        """Pick the closest reviews that fit within the few-shot token budget"""
+        selected = []
+        remaining = self.few_shot_token_budget
+
+        for review in sorted(similar_reviews, key=lambda r: r['distance']):
+            tokens = len(review['document']) // CHARS_PER_TOKEN + 1
+            if tokens <= remaining:
+                selected.append(review)
+                remaining -= tokens
+
+        return selected
+
+    def _format_examples(self, examples: List[Dict]) -> str:
+        """Format few-shot review examples for the LLM"""
+        if not examples:
+            return 'No past reviews available.'
+
+        return '\n\n'.join(
+            f"• {example['metadata'].get('title', 'Unknown')} ({example['metadata'].get('year', 'N/A')}):\n"
+            f"  {example['document']}"
+            for example in examples
+        )
+
     def _format_sentence_patterns(self) -> str:
         formatted = []
         for pattern in self.style.sentence_patterns:
@@ -1,22 +1,49 @@
 import json
-from typing import Dict, List, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 
-from langchain.prompts import ChatPromptTemplate
-from langchain.tools import Tool
+from src.review_analyzer import config
+from src.review_analyzer.cache import CacheMissError, ResultCache, make_cache_key
+from src.review_analyzer.patterns import DEFAULT_SENTENCE_PATTERNS
 
-from src.review_analyzer.config import llm
+if TYPE_CHECKING:
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.tools import Tool
 
 
 class LLMService:
-    def __init__(self):
-        self.llm = llm
+    def __init__(self, cache: Optional[ResultCache] = None, cache_mode: Optional[str] = None):
+        self.llm = config.get_llm('analysis')
+        self.cache_mode = cache_mode or config.llm_cache_mode
+        self.cache = cache if cache is not None else config.get_llm_cache()
         self.tools = self._initialize_tools()
 
     async def analyze_text(
-        self, text: str, prompt: ChatPromptTemplate, temperature: float = 0.7
+        self, text: str, prompt: 'ChatPromptTemplate', temperature: float = 0.7
     ) -> Union[Dict, List, str]:
-        """Generic method for text analysis with temperature control"""
-
+        """Generic method for text analysis with temperature control.
+
+        With a cache, responses are keyed on the rendered prompt, model and temperature. read-through serves
+        hits and stores misses, record always calls the model and stores the response, and replay never
+        calls the model, raising CacheMissError for prompts that were not recorded.
+        """
+        if self.cache is None or self.cache_mode == 'off':
+            return await self._invoke(text, prompt, temperature)
+
+        messages = [(message.type, message.content) for message in prompt.format_messages(text=text)]
+        key = make_cache_key(messages, config.get_model_name(self.llm), temperature)
+
+        if self.cache_mode in ('read-through', 'replay'):
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            if self.cache_mode == 'replay':
+                raise CacheMissError(f'No recorded response for prompt {key[:12]} in replay mode')
+
+        content = await self._invoke(text, prompt, temperature)
+        self.cache.set(key, content)
+        return content
+
+    async def _invoke(self, text: str, prompt: 'ChatPromptTemplate', temperature: float) -> str:
         configured_llm = self.llm.with_config({'temperature': temperature})
 
         # Invoke the chain
@@ -24,6 +51,8 @@ class LLMService:
         return response.content
 
     async def _analyze_sentiment(self, text: str) -> Dict[str, float]:
+        from langchain_core.prompts import ChatPromptTemplate
+
         prompt = ChatPromptTemplate.from_messages(
             [
                 (
@@ -39,6 +68,8 @@ class LLMService:
         return await self._parse_response(response, 'json')
 
     async def _extract_references(self, text: str) -> List[str]:
+        from langchain_core.prompts import ChatPromptTemplate
+
         prompt = ChatPromptTemplate.from_messages(
             [
                 (
@@ -59,7 +90,12 @@ class LLMService:
         response = await self.analyze_text(text, prompt, temperature=0.2)
         return await self._parse_response(response, 'list')
 
-    async def _analyze_sentence_patterns(self, text: str) -> List[Dict[str, str]]:
+    async def _analyze_sentence_patterns(
+        self, text: str, fallback: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        """Summarise phrase frequencies mined from the reviews into one pattern per category"""
+        from langchain_core.prompts import ChatPromptTemplate
+
         prompt = ChatPromptTemplate.from_messages(
             [
                 (
@@ -69,12 +105,14 @@ class LLMService:
                 ),
                 (
                     'user',
-                    """Analyze these reviews and identify common patterns for:
+                    """These are the most frequent phrases mined from a reviewer's reviews, with how often each occurs.
+            Describe the reviewer's habitual pattern for:
             1. Opening sentences
             2. Transition phrases
             3. Closing statements
             4. Comparative structures
 
+            Base each description on the frequencies, quoting the most common phrases.
             Format must be:
             [
                 {{"type": "opening", "pattern": "pattern description"}},
@@ -83,7 +121,7 @@ class LLMService:
                 {{"type": "comparative", "pattern": "pattern description"}}
             ]
 
-            Reviews: {text}""",
+            {text}""",
                 ),
             ]
         )
@@ -91,14 +129,13 @@ class LLMService:
         response = await self.analyze_text(text, prompt, temperature=0.3)
         patterns = await self._parse_response(response, 'json')
 
-        # Validate pattern count
-        if not patterns or len(patterns) != 4:
-            return [
-                {'type': 'opening', 'pattern': 'Starts with director mention'},
-                {'type': 'transition', 'pattern': 'However, despite the'},
-                {'type': 'closing', 'pattern': 'Ends with rating justification'},
-                {'type': 'comparative', 'pattern': 'Reminds me of...'},
-            ]
+        # Validate pattern count and shape
+        if (
+            not isinstance(patterns, list)
+            or len(patterns) != 4
+            or not all(isinstance(p, dict) and {'type', 'pattern'} <= p.keys() for p in patterns)
+        ):
+            return [dict(pattern) for pattern in (fallback or DEFAULT_SENTENCE_PATTERNS)]
 
         return patterns
 
@@ -130,7 +167,9 @@ class LLMService:
             print(f'Raw response: {response}')
             return {} if output_type == 'json' else []
 
-    def _initialize_tools(self) -> List[Tool]:
+    def _initialize_tools(self) -> List['Tool']:
+        from langchain_core.tools import Tool
+
         return [
             Tool(
                 name='analyze_sentiment',
@@ -0,0 +1,80 @@
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+class ReferenceMatcher:
+    """Aho-Corasick matcher finding whole-word, case-insensitive occurrences of many references in one pass.
+
+    Matching cost is linear in the text length plus the number of matches, however many references there are.
+    """
+
+    def __init__(self, references: Sequence[str]):
+        self.references = [ref for ref in dict.fromkeys(references) if ref.strip()]
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Matches ending at each state, as (reference index, length of the folded reference)
+        self._output: List[List[Tuple[int, int]]] = [[]]
+
+        for index, reference in enumerate(self.references):
+            folded = reference.casefold()
+            state = 0
+            for char in folded:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append((index, len(folded)))
+
+        self._build_failure_links()
+
+    def _build_failure_links(self) -> None:
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _matches(self, text: str) -> Iterable[int]:
+        """Yield the reference index of every whole-word match in the text"""
+        folded = text.casefold()
+        state = 0
+        for end, char in enumerate(folded, start=1):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+
+            for index, length in self._output[state]:
+                start = end - length
+                if (start == 0 or not _is_word_char(folded[start - 1])) and (
+                    end == len(folded) or not _is_word_char(folded[end])
+                ):
+                    yield index
+
+    def find(self, text: str) -> List[str]:
+        """References occurring in the text, each once, in reference order"""
+        found = set(self._matches(text))
+        return [reference for index, reference in enumerate(self.references) if index in found]
+
+    def count(self, texts: Iterable[str]) -> Dict[str, int]:
+        """Total occurrences of every reference across the texts"""
+        counts = Counter()
+        for text in texts:
+            counts.update(self._matches(text))
+        return {reference: counts[index] for index, reference in enumerate(self.references)}
+
+
+@lru_cache(maxsize=256)
+def get_reference_matcher(references: Tuple[str, ...]) -> ReferenceMatcher:
+    """Compiled matcher for a style profile's references, shared by every generator using the profile"""
+    return ReferenceMatcher(references)
@@ -0,0 +1,128 @@
+"""Online migration of a vector store to a new embedding model.
+
+EmbeddingMigration re-embeds every movie and review of a source store into a target store whose
+collections are namespaced by the new model, throttled to a maximum embedding rate. Records already in
+the target are skipped, so a stopped or crashed migration resumes where it left off. The source keeps
+serving reads throughout; the caller cuts over once coverage is reached (see ReviewService).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from src.review_analyzer.schemas import MigrationStatus, Movie
+from src.review_analyzer.vector_store import SNAPSHOT_PAGE_SIZE, VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingMigration:
+    def __init__(
+        self,
+        source: VectorStore,
+        target: VectorStore,
+        embeddings,
+        batch_size: int = 64,
+        max_per_second: Optional[float] = None,
+        page_size: int = SNAPSHOT_PAGE_SIZE,
+    ):
+        self.source = source
+        self.target = target
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        # Caps the embedding rate so a migration does not starve live traffic of API quota
+        self.max_per_second = max_per_second
+        self.page_size = page_size
+        self.status = MigrationStatus(embedding_model=target.embedding_model or '')
+        self._started = time.perf_counter()
+        self._next_slot = 0.0
+
+    async def run_pass(self) -> int:
+        """Copy every source record missing from the target, returning how many were copied"""
+        copied = 0
+        for collection in self.source.movie_collections():
+            for offset in range(0, collection.count(), self.page_size):
+                page = collection.get(limit=self.page_size, offset=offset, include=['documents', 'metadatas'])
+                copied += await self._migrate_movies(page)
+
+        reviews = self.source.reviews_collection
+        for offset in range(0, reviews.count(), self.page_size):
+            page = reviews.get(limit=self.page_size, offset=offset, include=['documents', 'metadatas'])
+            copied += await self._migrate_reviews(page)
+
+        await self.update_coverage()
+        logger.info(f'Migration pass copied {copied} records, coverage {self.status.coverage:.1%}')
+        return copied
+
+    async def update_coverage(self) -> float:
+        """Share of the source records present in the target"""
+        self.status.source_count = await self.source.get_movie_count() + await self.source.get_review_count()
+        self.status.migrated = await self.target.get_movie_count() + await self.target.get_review_count()
+        source_count, migrated = self.status.source_count, self.status.migrated
+        self.status.coverage = min(1.0, migrated / source_count) if source_count else 1.0
+        return self.status.coverage
+
+    async def _migrate_movies(self, page: Dict) -> int:
+        existing = await self.target.get_existing_movie_ids(page['ids']) if page['ids'] else set()
+        movies = [
+            (document, metadata)
+            for movie_id, document, metadata in zip(page['ids'], page['documents'], page['metadatas'])
+            if movie_id not in existing
+        ]
+
+        copied = 0
+        for start in range(0, len(movies), self.batch_size):
+            batch = movies[start : start + self.batch_size]
+            vectors = await self._embed([Movie.from_metadata(metadata).context for _, metadata in batch])
+            for (document, metadata), vector in zip(batch, vectors):
+                if await self.target.store_movie(document, self._unstamped(metadata), vector):
+                    copied += 1
+                else:
+                    self.status.failed += 1
+        return copied
+
+    async def _migrate_reviews(self, page: Dict) -> int:
+        existing = await self.target.get_existing_review_ids(page['ids']) if page['ids'] else set()
+        reviews = [
+            (review_id, document, metadata)
+            for review_id, document, metadata in zip(page['ids'], page['documents'], page['metadatas'])
+            if review_id not in existing
+        ]
+
+        copied = 0
+        for start in range(0, len(reviews), self.batch_size):
+            batch = reviews[start : start + self.batch_size]
+            # Reviews share their movie's embedding, so only films missing from the target are embedded
+            movie_ids = list({metadata.get('movie_id', '') for _, _, metadata in batch})
+            movie_embeddings = await self.target.get_movie_embeddings(movie_ids)
+            missing = [metadata for _, _, metadata in batch if metadata.get('movie_id', '') not in movie_embeddings]
+            missing = list({metadata.get('movie_id', ''): metadata for metadata in missing}.values())
+            if missing:
+                vectors = await self._embed([Movie.from_metadata(metadata).context for metadata in missing])
+                movie_embeddings.update(zip((metadata.get('movie_id', '') for metadata in missing), vectors))
+
+            for review_id, document, metadata in batch:
+                vector = movie_embeddings[metadata.get('movie_id', '')]
+                if await self.target.store_review(review_id, document, self._unstamped(metadata), vector):
+                    copied += 1
+                else:
+                    self.status.failed += 1
+        return copied
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        if self.max_per_second:
+            now = time.monotonic()
+            if self._next_slot > now:
+                await asyncio.sleep(self._next_slot - now)
+            self._next_slot = max(now, self._next_slot) + len(texts) / self.max_per_second
+
+        vectors = await self.embeddings.aembed_documents(texts)
+        self.status.embedded += len(texts)
+        self.status.embeddings_per_second = self.status.embedded / (time.perf_counter() - self._started)
+        return vectors
+
+    @staticmethod
+    def _unstamped(metadata: Dict) -> Dict:
+        # The target stamps each record with its own model
+        return {key: value for key, value in metadata.items() if key != 'embedding_model'}
@@ -0,0 +1,150 @@
+import re
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Used when neither the reviews nor the LLM yield a pattern for a category
+DEFAULT_SENTENCE_PATTERNS = [
+    {'type': 'opening', 'pattern': 'Starts with director mention'},
+    {'type': 'transition', 'pattern': 'However, despite the'},
+    {'type': 'closing', 'pattern': 'Ends with rating justification'},
+    {'type': 'comparative', 'pattern': 'Reminds me of...'},
+]
+
+TRANSITIONS = [
+    'however',
+    'but',
+    'yet',
+    'still',
+    'though',
+    'although',
+    'despite',
+    'that said',
+    'even so',
+    'then again',
+    'on the other hand',
+    'meanwhile',
+    'also',
+    'and yet',
+    'overall',
+    'anyway',
+]
+
+# Words ending in -est that are not superlatives, such as "the forest"
+NOT_SUPERLATIVES = [
+    'arrest',
+    'bequest',
+    'chest',
+    'conquest',
+    'contest',
+    'digest',
+    'earnest',
+    'forest',
+    'guest',
+    'harvest',
+    'honest',
+    'inquest',
+    'interest',
+    'manifest',
+    'modest',
+    'protest',
+    'quest',
+    'request',
+    'suggest',
+    'tempest',
+    'unrest',
+]
+_NOT_SUPERLATIVES = '(?:' + '|'.join(NOT_SUPERLATIVES) + ')'
+
+COMPARATIVES = [
+    r'reminds? me of',
+    r'reminiscent of',
+    r'compared to',
+    r'similar to',
+    r'(?:better|worse|funnier|scarier|longer|shorter) than',
+    r'not as \w+ as',
+    r'as \w+ as',
+    r'the (?:most|least) \w+',
+    rf'the (?:best|worst|(?!{_NOT_SUPERLATIVES}\b)\w{{2,}}est)',
+    r'feels like',
+    r'if \w+ (?:made|directed)',
+]
+
+# Abbreviations whose period does not end a sentence, matched after lowercasing
+ABBREVIATIONS = ['mr', 'mrs', 'ms', 'dr', 'st', 'vs', 'jr', 'sr']
+
+_SENTENCE_END = '(?:' + ''.join(rf'(?<!\b{a})' for a in ABBREVIATIONS) + r'\.|[!?\n])+'
+_TRANSITION_PATTERN = '|'.join(sorted((re.escape(t) for t in TRANSITIONS), key=len, reverse=True))
+
+
+def _normalize(sentences: 'pd.Series') -> 'pd.Series':
+    """Lowercase and replace numbers, such as ratings, with a placeholder so templates group together"""
+    return sentences.str.lower().str.replace(r'\d+(?:[./]\d+)*', '<num>', regex=True).str.strip()
+
+
+def _leading_ngrams(sentences: 'pd.Series', n: int) -> 'pd.Series':
+    return sentences.str.split().str[:n].str.join(' ')
+
+
+def mine_sentence_patterns(reviews: 'pd.Series', top_k: int = 5, ngram: int = 3) -> Dict[str, List[Tuple[str, int]]]:
+    """Most frequent opening and closing n-grams, transitions and comparative templates, with their counts.
+
+    Counting runs on vectorised pandas string operations over the whole Review column.
+    """
+    reviews = reviews.dropna().astype(str)
+    reviews = reviews[reviews.str.strip() != '']
+    if reviews.empty:
+        return {'opening': [], 'transition': [], 'closing': [], 'comparative': []}
+
+    # Normalised before splitting, so the periods of ratings such as 3.5/5 do not end sentences
+    normalized = _normalize(reviews)
+    sentences = normalized.str.split(_SENTENCE_END, regex=True).explode().str.strip()
+    sentences = sentences[sentences != '']
+    first = sentences.groupby(level=0).first()
+    last = sentences.groupby(level=0).last()
+
+    # Single-sentence reviews are counted as openings only
+    closings = last[sentences.groupby(level=0).size() > 1]
+    transitions = sentences.str.extract(rf'^(?:,\s*)?({_TRANSITION_PATTERN})\b', expand=False).dropna()
+    comparatives = normalized.str.findall('|'.join(rf'\b{c}\b' for c in COMPARATIVES)).explode().dropna()
+
+    def top(values: 'pd.Series') -> List[Tuple[str, int]]:
+        counts = values[values != ''].value_counts().head(top_k)
+        return [(str(value), int(count)) for value, count in counts.items()]
+
+    return {
+        'opening': top(_leading_ngrams(first, ngram)),
+        'transition': top(transitions),
+        'closing': top(_leading_ngrams(closings, ngram)),
+        'comparative': top(comparatives),
+    }
+
+
+def format_pattern_candidates(candidates: Dict[str, List[Tuple[str, int]]], review_count: int) -> str:
+    """Compact listing of mined candidates for the LLM, a few hundred tokens whatever the corpus size"""
+    lines = [f'Mined from {review_count} reviews (phrase: count):']
+    for pattern_type, values in candidates.items():
+        listed = ', '.join(f'"{value}": {count}' for value, count in values) or 'none found'
+        lines.append(f'- {pattern_type}: {listed}')
+    return '\n'.join(lines)
+
+
+def patterns_from_candidates(candidates: Dict[str, List[Tuple[str, int]]]) -> List[Dict[str, str]]:
+    """Sentence patterns built directly from the mined frequencies, without an LLM call"""
+    descriptions = {
+        'opening': 'Often opens with',
+        'transition': 'Transitions with',
+        'closing': 'Often closes with',
+        'comparative': 'Compares using',
+    }
+
+    patterns = []
+    for default in DEFAULT_SENTENCE_PATTERNS:
+        values = candidates.get(default['type'], [])
+        if not values:
+            patterns.append(dict(default))
+            continue
+        listed = ', '.join(f'"{value}..." ({count}x)' for value, count in values[:3])
+        patterns.append({'type': default['type'], 'pattern': f'{descriptions[default["type"]]} {listed}'})
+    return patterns
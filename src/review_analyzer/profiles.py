@@ -0,0 +1,72 @@
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from src.review_analyzer.schemas import PersonalReviewStyle, make_user_key
+
+logger = logging.getLogger(__name__)
+
+
+class StyleProfileStore:
+    """Persists style profiles per user as JSON, keeping the most recently used ones in memory.
+
+    Cached profiles are reloaded when their file changes, so a profile re-learned by another process is served.
+    """
+
+    def __init__(self, profiles_dir: str = './.vectordb/profiles', max_cached: int = 1024):
+        self.profiles_dir = Path(profiles_dir)
+        self.profiles_dir.mkdir(parents=True, exist_ok=True)
+        self.max_cached = max_cached
+        # User -> (file version, profile)
+        self._cache: 'OrderedDict[Optional[str], Tuple[Tuple[int, int], PersonalReviewStyle]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, user_id: Optional[str]) -> Path:
+        # User keys always end in a hash, so the single-user profile cannot collide with a named user
+        return self.profiles_dir / f'{make_user_key(user_id) if user_id is not None else "default"}.json'
+
+    @staticmethod
+    def _version(path: Path) -> Tuple[int, int]:
+        # Saves replace the file, so a new inode marks a change even within the filesystem's timestamp granularity
+        stat = path.stat()
+        return stat.st_ino, stat.st_mtime_ns
+
+    def get(self, user_id: Optional[str] = None) -> Optional[PersonalReviewStyle]:
+        """Look up a user's style profile, loading it from disk on a cache miss or when the file changed"""
+        path = self._path(user_id)
+        try:
+            version = self._version(path)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is not None and cached[0] == version:
+                self._cache.move_to_end(user_id)
+                return cached[1]
+
+        try:
+            profile = PersonalReviewStyle.model_validate_json(path.read_text(encoding='utf-8'))
+        except Exception as e:
+            logger.error(f'Error loading style profile for user {user_id}: {e}')
+            return None
+
+        self._remember(user_id, version, profile)
+        return profile
+
+    def save(self, user_id: Optional[str], profile: PersonalReviewStyle) -> None:
+        """Persist a user's style profile, replacing any previous one atomically"""
+        path = self._path(user_id)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(profile.model_dump_json(), encoding='utf-8')
+        tmp_path.replace(path)
+        self._remember(user_id, self._version(path), profile)
+
+    def _remember(self, user_id: Optional[str], version: Tuple[int, int], profile: PersonalReviewStyle) -> None:
+        with self._lock:
+            self._cache[user_id] = (version, profile)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
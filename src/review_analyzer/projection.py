@@ -0,0 +1,84 @@
+import hashlib
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class PCAProjection:
+    """Linear projection that reduces embeddings to their top principal components"""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, source_model: str = ''):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+        self.source_model = source_model
+
+    @classmethod
+    def fit(cls, vectors: List[List[float]], n_components: int, source_model: str = '') -> 'PCAProjection':
+        """Fit a projection on full-dimension embeddings"""
+        matrix = np.asarray(vectors, dtype=np.float64)
+        if matrix.ndim != 2:
+            raise ValueError('Expected a 2D array of embeddings')
+        if not 0 < n_components <= min(matrix.shape):
+            raise ValueError(
+                f'n_components must be between 1 and {min(matrix.shape)} for {matrix.shape[0]} embeddings, '
+                f'got {n_components}'
+            )
+
+        mean = matrix.mean(axis=0)
+        _, _, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+        return cls(mean=mean, components=vt[:n_components], source_model=source_model)
+
+    @property
+    def input_dimensions(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def output_dimensions(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def fingerprint(self) -> str:
+        """Short stable hash identifying this projection"""
+        digest = hashlib.sha1(self.mean.tobytes() + self.components.tobytes())
+        return digest.hexdigest()[:12]
+
+    def transform(self, vectors: List[List[float]]) -> List[List[float]]:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.shape[-1] != self.input_dimensions:
+            raise ValueError(f'Expected {self.input_dimensions}-dimension embeddings, got {matrix.shape[-1]}')
+
+        projected = (matrix - self.mean) @ self.components.T
+        return projected.tolist()
+
+    def save(self, path: str) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('wb') as f:
+            np.savez(f, mean=self.mean, components=self.components, source_model=np.array(self.source_model))
+
+    @classmethod
+    def load(cls, path: str) -> 'PCAProjection':
+        with np.load(path) as data:
+            return cls(mean=data['mean'], components=data['components'], source_model=str(data['source_model']))
+
+
+class ProjectedEmbeddings(Embeddings):
+    """Embeddings wrapper that applies a PCAProjection to every vector of the base model"""
+
+    def __init__(self, base: Embeddings, projection: PCAProjection):
+        self.base = base
+        self.projection = projection
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.projection.transform(self.base.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.projection.transform([self.base.embed_query(text)])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.projection.transform(await self.base.aembed_documents(texts))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.projection.transform([await self.base.aembed_query(text)])[0]
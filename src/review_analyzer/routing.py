@@ -0,0 +1,174 @@
+"""Per-route latency, token and cost metrics for the chat and embedding models.
+
+Each task route (generation, analysis, scoring, embeddings) has its own configured model and
+RouteMetrics. Chat models report through a RouteMetricsHandler callback, so every call is counted
+however it is invoked, streamed or not. Embeddings are wrapped in MeteredEmbeddings.
+"""
+
+import time
+from typing import Any, Dict, List, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.outputs import LLMResult
+
+# USD per million (input, output) tokens, matched on the longest prefix of the model name
+MODEL_PRICES = {
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4.1': (2.00, 8.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-4-turbo': (10.00, 30.00),
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'text-embedding-3-small': (0.02, 0.0),
+    'text-embedding-3-large': (0.13, 0.0),
+    'text-embedding-ada-002': (0.10, 0.0),
+}
+
+# The embeddings API does not report usage, so embedding tokens are estimated from text length
+CHARS_PER_TOKEN = 4
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Cost in USD of a call, 0 for models missing from MODEL_PRICES"""
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    if not matches:
+        return 0.0
+    input_price, output_price = MODEL_PRICES[max(matches, key=len)]
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+class RouteMetrics:
+    """Calls, errors, latency, tokens and cost of one route, counting calls served by a fallback model"""
+
+    def __init__(self, route: str, primary_model: str):
+        self.route = route
+        self.primary_model = primary_model
+        self.calls = 0
+        self.errors = 0
+        self.fallback_calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.calls_by_model: Dict[str, int] = {}
+
+    def record(self, model: str, seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        self.calls += 1
+        self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+        if model != self.primary_model:
+            self.fallback_calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost_usd += estimate_cost(model, prompt_tokens, completion_tokens)
+
+    def record_error(self) -> None:
+        self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'model': self.primary_model,
+            'calls': self.calls,
+            'errors': self.errors,
+            'fallback_calls': self.fallback_calls,
+            'mean_latency_ms': round(1000 * self.total_seconds / self.calls, 1) if self.calls else 0.0,
+            'max_latency_ms': round(1000 * self.max_seconds, 1),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cost_usd': round(self.cost_usd, 6),
+            'calls_by_model': dict(self.calls_by_model),
+        }
+
+
+def _token_usage(response: LLMResult) -> Tuple[int, int]:
+    for generations in response.generations:
+        for generation in generations:
+            # Set on streamed responses too when the model is created with stream_usage=True
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                return usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+    usage = (response.llm_output or {}).get('token_usage') or {}
+    return usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+
+
+class RouteMetricsHandler(BaseCallbackHandler):
+    """Callback attached to one chat model of a route, recording each of its calls"""
+
+    # Bookkeeping only, so run in the event loop rather than in a thread pool
+    run_inline = True
+
+    def __init__(self, metrics: RouteMetrics, model: str):
+        self.metrics = metrics
+        self.model = model
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized: Dict, messages: List, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Dict, prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        seconds = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+        self.metrics.record(self.model, seconds, *_token_usage(response))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+        self.metrics.record_error()
+
+
+class MeteredEmbeddings(Embeddings):
+    """Embeddings wrapper recording latency and estimated tokens and cost on the embeddings route"""
+
+    def __init__(self, base: Embeddings, metrics: RouteMetrics):
+        self.base = base
+        self.metrics = metrics
+
+    def _record(self, started: float, texts: List[str]) -> None:
+        tokens = sum(len(text) for text in texts) // CHARS_PER_TOKEN
+        self.metrics.record(self.metrics.primary_model, time.perf_counter() - started, tokens)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        try:
+            embeddings = self.base.embed_documents(texts)
+        except Exception:
+            self.metrics.record_error()
+            raise
+        self._record(started, texts)
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        started = time.perf_counter()
+        try:
+            embedding = self.base.embed_query(text)
+        except Exception:
+            self.metrics.record_error()
+            raise
+        self._record(started, [text])
+        return embedding
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        try:
+            embeddings = await self.base.aembed_documents(texts)
+        except Exception:
+            self.metrics.record_error()
+            raise
+        self._record(started, texts)
+        return embeddings
+
+    async def aembed_query(self, text: str) -> List[float]:
+        started = time.perf_counter()
+        try:
+            embedding = await self.base.aembed_query(text)
+        except Exception:
+            self.metrics.record_error()
+            raise
+        self._record(started, [text])
+        return embedding
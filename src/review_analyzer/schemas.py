@@ -1,7 +1,32 @@
-from typing import Dict, List
+import hashlib
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 
-import pandas as pd
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from slugify import slugify
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def make_movie_id(title: str, year: Union[int, str]) -> str:
+    """Stable movie ID shared by the watched and reviews collections"""
+    return slugify(f'{title}-{year}')
+
+
+def normalize_title(title: str) -> str:
+    """Title key for lexical matching that ignores case, punctuation, accents and a leading article"""
+    words = slugify(title).split('-')
+    if len(words) > 1 and words[0] in ('the', 'a', 'an'):
+        words = words[1:]
+    return '-'.join(words)
+
+
+def make_user_key(user_id: str) -> str:
+    """Filesystem and collection safe key for a user ID"""
+    # The hash keeps keys unique when different user IDs slugify to the same string
+    digest = hashlib.sha1(user_id.encode('utf-8')).hexdigest()[:8]
+    slug = slugify(user_id)[:32].strip('-')
+    return f'{slug}-{digest}' if slug else digest
 
 
 def _get_era_description(year: int) -> str:
@@ -47,7 +72,7 @@ class Movie(BaseModel):
     context: str
 
     @classmethod
-    def from_row(cls, row: pd.Series, movie_id: str) -> 'Movie':
+    def from_row(cls, row: 'pd.Series', movie_id: str) -> 'Movie':
         year = row.get('Year', 0)
         runtime = row.get('runtimeMinutes', 0)
         era = _get_era_description(year)
@@ -64,6 +89,17 @@ class Movie(BaseModel):
             context=context,
         )
 
+    @classmethod
+    def from_metadata(cls, metadata: Dict) -> 'Movie':
+        """Rebuild a stored movie, and so the context it was embedded from, from its vector store metadata"""
+        row = {
+            'Name': metadata.get('title', ''),
+            'Year': int(metadata.get('year') or 0),
+            'genres': metadata.get('genres', ''),
+            'runtimeMinutes': int(metadata.get('runtime') or 0),
+        }
+        return cls.from_row(row, metadata.get('id') or metadata.get('movie_id', ''))
+
     def to_metadata(self) -> Dict:
         return {
             'id': self.id,
@@ -76,11 +112,72 @@ class Movie(BaseModel):
         }
 
 
+class IngestStats(BaseModel):
+    """Counters for embedding and storing watched movies and reviews during learn_style"""
+
+    processed: int = 0
+    skipped: int = 0
+    stored: int = 0
+    failed: int = 0
+    embedding_calls: int = 0
+    write_calls: int = 0
+    retries: int = 0
+    # Calls whose result was lost to an error and had to be repeated or given up on
+    wasted_calls: int = 0
+    # Total time spent in vector store writes, including failed attempts
+    write_seconds: float = 0.0
+    errors: List[str] = []
+
+
+class MigrationStatus(BaseModel):
+    """Progress of re-embedding a user's vector store with a new embedding model"""
+
+    embedding_model: str
+    # 'running', 'cut_over' or 'failed'
+    state: str = 'running'
+    source_count: int = 0
+    # Records already in the new collections, whether embedded by this run or an earlier one
+    migrated: int = 0
+    embedded: int = 0
+    failed: int = 0
+    coverage: float = 0.0
+    embeddings_per_second: float = 0.0
+    error: Optional[str] = None
+
+
 class PersonalReviewStyle(BaseModel):
     sentence_patterns: List[Dict[str, str]]
     average_length: int
     sentiment_scores: Dict[str, float]
     common_references: List[str]
+    # Occurrences of each reference across the user's reviews
+    reference_counts: Dict[str, int] = {}
+
+
+class ProgressEvent(BaseModel):
+    """learn_style progress, published after every ingestion batch and at each later stage"""
+
+    # 'movies', 'reviews', 'analysis' or 'done'
+    stage: str
+    batch: int = 0
+    total_batches: int = 0
+    rows_processed: int
+    total_rows: int
+    # Rows not yet in the vector store, as opposed to skipped ones already stored by an earlier run
+    new: int
+    skipped: int
+    stored: int
+    failed: int
+    embeddings_per_second: float
+    # Mean duration of a vector store write
+    write_latency_ms: float
+    elapsed_seconds: float
+    # None until the first rows are processed, and once ingestion is over
+    eta_seconds: Optional[float] = None
+    # Errors since the previous event
+    errors: List[str] = []
+    # Set on the final 'done' event
+    style: Optional[PersonalReviewStyle] = None
 
 
 class MovieContext(BaseModel):
@@ -97,7 +194,37 @@ class MovieContext(BaseModel):
         return f"{self.title} {' '.join(self.genres)} {era} {length_category}"
 
 
+class RetrievalResult(BaseModel):
+    """Output of the retrieval stage, reusable across several generations"""
+
+    movie_context: MovieContext
+    query_embedding: List[float]
+    similar_movies: List[Dict]
+    similar_reviews: List[Dict]
+    # Stored film whose embedding was reused as the query, None when the movie had to be embedded
+    stored_movie_id: Optional[str] = None
+    degraded_stages: List[str] = []
+    stage_seconds: Dict[str, float] = {}
+
+    @property
+    def distances(self) -> List[float]:
+        return [movie['distance'] for movie in self.similar_movies]
+
+
+class DegradationPolicy(BaseModel):
+    """What the generation path may drop instead of failing when a request runs out of time"""
+
+    skip_neighbours: bool = True
+    skip_confidence: bool = True
+    partial_text: bool = True
+    # Largest share of the remaining time the retrieval stage may use, so generation keeps the rest
+    retrieval_share: float = Field(default=0.3, gt=0, le=1)
+
+
 class GeneratedReview(BaseModel):
     text: str
     style_confidence: Dict[str, float]
     key_elements_used: List[str]
+    # Stages that timed out or failed and were skipped or cut short, e.g. ['retrieval', 'style_confidence']
+    degraded_stages: List[str] = []
+    stage_seconds: Dict[str, float] = {}
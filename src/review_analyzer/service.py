@@ -0,0 +1,555 @@
+"""Long-running HTTP service for style learning, similar-movie lookup and review generation.
+
+Run with:
+    poetry run python -m src.review_analyzer.service --reviews data/letterboxd/reviews.csv \
+        --watched data/letterboxd/watched.csv
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+from aiohttp import web
+from pydantic import BaseModel, Field, ValidationError
+
+from src.review_analyzer import config
+from src.review_analyzer.analyzer import ReviewStyleAnalyzer
+from src.review_analyzer.generator import ReviewGenerator
+from src.review_analyzer.migration import EmbeddingMigration
+from src.review_analyzer.profiles import StyleProfileStore
+from src.review_analyzer.schemas import MigrationStatus, MovieContext, PersonalReviewStyle, ProgressEvent
+from src.review_analyzer.shared_index import SharedVectorIndex, publish_index
+from src.review_analyzer.vector_store import (
+    DEFAULT_MEMORY_LIMIT_MB,
+    VectorStore,
+    VectorStoreCache,
+    embedding_generation,
+)
+
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    """Merges identical concurrent requests into a single in-flight computation"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced_count = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced_count += 1
+        else:
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield so one caller disconnecting does not cancel the work for everyone else
+        return await asyncio.shield(future)
+
+    @property
+    def inflight_count(self) -> int:
+        return len(self._inflight)
+
+
+class LearnStyleRequest(BaseModel):
+    reviews_path: str
+    watched_path: str
+    user_id: Optional[str] = None
+
+
+class MigrateEmbeddingsRequest(BaseModel):
+    embedding_model: str
+    embedding_dimensions: Optional[int] = Field(default=None, ge=1)
+    max_per_second: Optional[float] = Field(default=None, gt=0)
+    cutover_coverage: float = Field(default=1.0, gt=0, le=1)
+    user_id: Optional[str] = None
+
+
+class SimilarMoviesRequest(MovieContext):
+    n_results: int = Field(default=5, ge=1, le=50)
+    user_id: Optional[str] = None
+
+
+class GenerateReviewRequest(MovieContext):
+    temperature: float = Field(default=0.9, ge=0, le=2)
+    best_of: int = Field(default=1, ge=1, le=8)
+    deadline_ms: Optional[int] = Field(default=None, ge=1)
+    bypass_cache: bool = False
+    user_id: Optional[str] = None
+
+
+def _movie_context(body: MovieContext) -> MovieContext:
+    return MovieContext.model_validate(body.model_dump(include=set(MovieContext.model_fields)))
+
+
+class ReviewService:
+    """Serves many users from one process, keeping model clients, vector stores and style profiles warm"""
+
+    def __init__(
+        self,
+        persist_dir: str = './.vectordb',
+        max_open_stores: int = 256,
+        memory_limit_bytes: int = DEFAULT_MEMORY_LIMIT_MB * 1024 * 1024,
+        default_deadline: Optional[float] = None,
+        shared_index_dir: Optional[str] = None,
+    ):
+        # Chroma is opened on first use, so workers only serving the shared index never load it. Evicting a
+        # store from the cache only drops its Python objects, the memory limit is what bounds loaded indexes
+        self.stores = VectorStoreCache(
+            persist_dir=persist_dir,
+            max_open=max_open_stores,
+            memory_limit_bytes=memory_limit_bytes,
+            **config.vector_store_settings(),
+        )
+        self.profiles = StyleProfileStore(profiles_dir=str(Path(persist_dir) / 'profiles'))
+        # Upper bound in seconds for review generation when a request does not set its own deadline
+        self.default_deadline = default_deadline
+        # Memory-mapped movie index shared with other worker processes, used for similar-movie lookups
+        self.shared_index_dir = shared_index_dir
+        self._shared_indexes: Dict[Optional[str], SharedVectorIndex] = {}
+        # Latest learn_style progress per user, for dashboards and autoscaling
+        self.learn_progress: Dict[Optional[str], ProgressEvent] = {}
+        # Background embedding migrations per user run in this process, reads stay on the current store until
+        # cutover. Their status is also persisted, so any process sharing persist_dir can report it
+        self.migrations: Dict[Optional[str], EmbeddingMigration] = {}
+        self._migration_tasks: Dict[Optional[str], asyncio.Task] = {}
+        # Held by writers to a user's store and by a migration's cutover, so no write lands after the final copy.
+        # Paired with a file lock, which keeps out writers in other processes
+        self._write_locks: Dict[Optional[str], asyncio.Lock] = {}
+
+    async def warm_up(self, user_ids: Sequence[Optional[str]] = (None,), stores: bool = True) -> None:
+        """Open and preload the vector indexes of the given users before serving.
+
+        With stores=False only the shared indexes are opened, and Chroma stays closed until a request needs it.
+        """
+        for user_id in user_ids:
+            self.shared_index(user_id)
+            if stores:
+                await self.stores.get(user_id).warm_up()
+
+    def get_style_profile(self, user_id: Optional[str] = None) -> Optional[PersonalReviewStyle]:
+        return self.profiles.get(user_id)
+
+    @contextlib.asynccontextmanager
+    async def _write_lock(self, user_id: Optional[str]) -> AsyncIterator[None]:
+        if user_id not in self._write_locks:
+            self._write_locks[user_id] = asyncio.Lock()
+        # The in-process lock first, so tasks of this process queue on it instead of tying up threads on the file
+        async with self._write_locks[user_id], self.stores.generations.lock(user_id):
+            yield
+
+    async def learn_style(
+        self, reviews_path: str, watched_path: str, user_id: Optional[str] = None
+    ) -> PersonalReviewStyle:
+        # Taken before choosing the store, so learning after a cutover writes to the migrated store
+        async with self._write_lock(user_id):
+            store, embeddings = self.serving(user_id)
+            analyzer = ReviewStyleAnalyzer(vector_store=store, embeddings=embeddings)
+
+            def record_progress(event: ProgressEvent) -> None:
+                for error in event.errors:
+                    logger.warning(f'learn_style for user {user_id}: {error}')
+                self.learn_progress[user_id] = event.model_copy(update={'style': None})
+
+            style_profile = await analyzer.learn_style(
+                reviews_path=reviews_path, watched_path=watched_path, on_progress=record_progress
+            )
+            self.profiles.save(user_id, style_profile)
+            if self.shared_index_dir:
+                publish_index(store, self.shared_index_dir)
+        return style_profile
+
+    def serving(self, user_id: Optional[str] = None) -> Tuple[VectorStore, 'Embeddings']:
+        """The user's store and the embeddings it was built with, taken together so a cutover never splits them"""
+        store = self.stores.get(user_id)
+        if store.generation is None:
+            return store, config.get_embeddings()
+        return store, config.get_embeddings_for(store.embedding_model, store.embedding_dimensions)
+
+    async def migrate_embeddings(
+        self,
+        embedding_model: str,
+        embedding_dimensions: Optional[int] = None,
+        user_id: Optional[str] = None,
+        max_per_second: Optional[float] = None,
+        cutover_coverage: float = 1.0,
+    ) -> MigrationStatus:
+        """Start re-embedding a user's store with another embedding model in the background.
+
+        Requests keep being served from the current store until the new one covers cutover_coverage of its
+        records. Both then switch to the new store and model at once, and stay switched after a restart.
+        Only one migration per store runs at a time, across all processes sharing persist_dir.
+        """
+        task = self._migration_tasks.get(user_id)
+        if task is not None and not task.done():
+            raise LookupError(f'A migration to {self.migrations[user_id].status.embedding_model} is already running')
+        migration_lock = self.stores.generations.try_lock_migration(user_id)
+        if migration_lock is None:
+            raise LookupError('A migration of this store is already running in another process')
+
+        try:
+            source = self.stores.get(user_id)
+            generation = embedding_generation(embedding_model, embedding_dimensions)
+            if source.generation == generation:
+                raise ValueError(f'The store already uses {embedding_model}')
+
+            target = self.stores.open(
+                user_id,
+                embedding_model=embedding_model,
+                embedding_dimensions=embedding_dimensions,
+                generation=generation,
+            )
+            embeddings = config.get_embeddings_for(embedding_model, embedding_dimensions)
+        except Exception:
+            migration_lock.close()
+            raise
+        migration = EmbeddingMigration(source, target, embeddings, max_per_second=max_per_second)
+        self.migrations[user_id] = migration
+        self.stores.generations.save_status(user_id, migration.status.model_dump())
+        self._migration_tasks[user_id] = asyncio.ensure_future(
+            self._run_migration(user_id, migration, cutover_coverage, migration_lock)
+        )
+        return migration.status
+
+    async def _run_migration(
+        self, user_id: Optional[str], migration: EmbeddingMigration, cutover_coverage: float, migration_lock: IO
+    ) -> None:
+        status = migration.status
+        try:
+            while await migration.run_pass() and status.coverage < cutover_coverage:
+                self.stores.generations.save_status(user_id, status.model_dump())
+            if status.coverage < cutover_coverage:
+                raise RuntimeError(f'Migration stalled at {status.coverage:.1%} coverage, {status.failed} failed')
+
+            target = migration.target
+            async with self._write_lock(user_id):
+                # Catch up on records written during the last pass, with writers held off until the switch
+                await migration.run_pass()
+                # Publish the new vectors before switching query models, so workers never query an index
+                # with another model's vectors. Until the switch they skip it as its model does not match
+                if self.shared_index_dir:
+                    publish_index(target, self.shared_index_dir)
+                self.stores.generations.set(user_id, target.embedding_model, target.embedding_dimensions)
+            status.state = 'cut_over'
+            logger.info(f'Cut user {user_id} over to {target.embedding_model} at {status.coverage:.1%} coverage')
+            if user_id in self._shared_indexes:
+                self._shared_indexes[user_id].refresh()
+        except Exception as e:
+            status.state = 'failed'
+            status.error = str(e)
+            logger.error(f'Embedding migration for user {user_id} failed: {e}')
+        finally:
+            self.stores.generations.save_status(user_id, status.model_dump())
+            migration_lock.close()
+
+    def migration_status(self, user_id: Optional[str] = None) -> Optional[MigrationStatus]:
+        """Status of the latest migration of the user's store, whichever process ran it, None if there was none"""
+        task = self._migration_tasks.get(user_id)
+        if task is not None and not task.done():
+            return self.migrations[user_id].status
+        record = self.stores.generations.load_status(user_id)
+        if record is None:
+            return None
+        status = MigrationStatus(**record)
+        if status.state == 'running':
+            # Still claimed while its process runs, free when that process exited before finishing
+            migration_lock = self.stores.generations.try_lock_migration(user_id)
+            if migration_lock is not None:
+                migration_lock.close()
+                status.state, status.error = 'failed', 'The migrating process exited before cutover'
+        return status
+
+    def shared_index(self, user_id: Optional[str] = None) -> Optional[SharedVectorIndex]:
+        """The user's published shared index, or None without a shared index or before the first publish"""
+        if not self.shared_index_dir:
+            return None
+        if user_id not in self._shared_indexes:
+            self._shared_indexes[user_id] = SharedVectorIndex(self.shared_index_dir, user_id=user_id)
+        index = self._shared_indexes[user_id]
+        return index if index.version is not None or index.refresh() else None
+
+    def _serving_embeddings(self, user_id: Optional[str] = None) -> Tuple[str, 'Embeddings']:
+        """The model and embeddings the user's store is built with, read from the registry without opening it"""
+        record = self.stores.generations.get(user_id)
+        if record is None:
+            return config.get_embedding_signature(), config.get_embeddings()
+        embeddings = config.get_embeddings_for(record['embedding_model'], record['embedding_dimensions'])
+        return record['embedding_model'], embeddings
+
+    async def find_similar_movies(self, movie: MovieContext, n_results: int = 5, user_id: Optional[str] = None):
+        # Served from the shared index when there is one, without opening Chroma in this process. During a
+        # cutover the index may hold another model's vectors than the query model, then the store serves
+        index = self.shared_index(user_id)
+        embedding_model, embeddings = self._serving_embeddings(user_id)
+        if index is None or index.embedding_model != embedding_model:
+            index, embeddings = self.serving(user_id)
+        query_embedding = await embeddings.aembed_query(movie.get_embedding_context())
+        return await index.find_similar_movies(query_embedding=query_embedding, n_results=n_results)
+
+    async def generate_review(
+        self,
+        movie: MovieContext,
+        temperature: float = 0.9,
+        user_id: Optional[str] = None,
+        best_of: int = 1,
+        deadline: Optional[float] = None,
+        bypass_cache: bool = False,
+    ):
+        style_profile = self.profiles.get(user_id)
+        if style_profile is None:
+            raise LookupError('No style profile learned yet, POST /style/learn first')
+
+        store, embeddings = self.serving(user_id)
+        generator = ReviewGenerator(style_profile, vector_store=store, embeddings=embeddings)
+        return await generator.generate_review(
+            movie,
+            temperature=temperature,
+            best_of=best_of,
+            deadline=deadline or self.default_deadline,
+            bypass_cache=bypass_cache,
+        )
+
+
+SERVICE_KEY = web.AppKey('service', ReviewService)
+COALESCER_KEY = web.AppKey('coalescer', RequestCoalescer)
+
+
+def _coalescing_key(route: str, body: BaseModel) -> str:
+    return f'{route}:{json.dumps(body.model_dump(), sort_keys=True)}'
+
+
+async def _parse(request: web.Request, model: type) -> BaseModel:
+    try:
+        return model.model_validate(await request.json())
+    except json.JSONDecodeError as e:
+        raise web.HTTPBadRequest(text=json.dumps({'error': f'Invalid JSON: {e}'}), content_type='application/json')
+    except ValidationError as e:
+        raise web.HTTPBadRequest(text=e.json(include_url=False), content_type='application/json')
+
+
+async def health(request: web.Request) -> web.Response:
+    service: ReviewService = request.app[SERVICE_KEY]
+    coalescer: RequestCoalescer = request.app[COALESCER_KEY]
+    return web.json_response(
+        {
+            'status': 'ok',
+            'open_stores': len(service.stores),
+            'inflight_requests': coalescer.inflight_count,
+            'coalesced_requests': coalescer.coalesced_count,
+            'http_pool': config.get_http_transport().stats(),
+            'model_routes': {route: metrics.stats() for route, metrics in config.get_route_metrics().items()},
+        }
+    )
+
+
+async def get_style(request: web.Request) -> web.Response:
+    service: ReviewService = request.app[SERVICE_KEY]
+    style_profile = service.get_style_profile(request.query.get('user_id'))
+    if style_profile is None:
+        raise web.HTTPNotFound(
+            text=json.dumps({'error': 'No style profile learned yet'}), content_type='application/json'
+        )
+    return web.json_response(style_profile.model_dump())
+
+
+async def learn_progress(request: web.Request) -> web.Response:
+    service: ReviewService = request.app[SERVICE_KEY]
+    event = service.learn_progress.get(request.query.get('user_id'))
+    if event is None:
+        raise web.HTTPNotFound(
+            text=json.dumps({'error': 'No style learning has run yet'}), content_type='application/json'
+        )
+    return web.json_response(event.model_dump(exclude={'style'}))
+
+
+async def migrate_embeddings(request: web.Request) -> web.Response:
+    body = await _parse(request, MigrateEmbeddingsRequest)
+    service: ReviewService = request.app[SERVICE_KEY]
+
+    try:
+        status = await service.migrate_embeddings(
+            body.embedding_model,
+            body.embedding_dimensions,
+            user_id=body.user_id,
+            max_per_second=body.max_per_second,
+            cutover_coverage=body.cutover_coverage,
+        )
+    except LookupError as e:
+        raise web.HTTPConflict(text=json.dumps({'error': str(e)}), content_type='application/json')
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=json.dumps({'error': str(e)}), content_type='application/json')
+    return web.json_response(status.model_dump(), status=202)
+
+
+async def migration_status(request: web.Request) -> web.Response:
+    service: ReviewService = request.app[SERVICE_KEY]
+    status = service.migration_status(request.query.get('user_id'))
+    if status is None:
+        raise web.HTTPNotFound(
+            text=json.dumps({'error': 'No embedding migration has run yet'}), content_type='application/json'
+        )
+    return web.json_response(status.model_dump())
+
+
+async def learn_style(request: web.Request) -> web.Response:
+    body = await _parse(request, LearnStyleRequest)
+    service: ReviewService = request.app[SERVICE_KEY]
+
+    style_profile = await request.app[COALESCER_KEY].run(
+        _coalescing_key('learn', body),
+        lambda: service.learn_style(body.reviews_path, body.watched_path, user_id=body.user_id),
+    )
+    return web.json_response(style_profile.model_dump())
+
+
+async def similar_movies(request: web.Request) -> web.Response:
+    body = await _parse(request, SimilarMoviesRequest)
+    service: ReviewService = request.app[SERVICE_KEY]
+
+    movies = await request.app[COALESCER_KEY].run(
+        _coalescing_key('similar', body),
+        lambda: service.find_similar_movies(_movie_context(body), body.n_results, user_id=body.user_id),
+    )
+    return web.json_response(movies)
+
+
+async def generate_review(request: web.Request) -> web.Response:
+    body = await _parse(request, GenerateReviewRequest)
+    service: ReviewService = request.app[SERVICE_KEY]
+
+    try:
+        review = await request.app[COALESCER_KEY].run(
+            _coalescing_key('review', body),
+            lambda: service.generate_review(
+                _movie_context(body),
+                body.temperature,
+                user_id=body.user_id,
+                best_of=body.best_of,
+                deadline=body.deadline_ms / 1000 if body.deadline_ms else None,
+                bypass_cache=body.bypass_cache,
+            ),
+        )
+    except LookupError as e:
+        raise web.HTTPConflict(text=json.dumps({'error': str(e)}), content_type='application/json')
+    except asyncio.TimeoutError:
+        raise web.HTTPGatewayTimeout(
+            text=json.dumps({'error': 'Review generation ran out of time'}), content_type='application/json'
+        )
+    return web.json_response(review.model_dump())
+
+
+def create_app(
+    service: Optional[ReviewService] = None,
+    reviews_path: Optional[str] = None,
+    watched_path: Optional[str] = None,
+    warm_user_ids: Sequence[Optional[str]] = (None,),
+    warm_stores: bool = True,
+    read_only: bool = False,
+) -> web.Application:
+    """Build the aiohttp application, optionally learning the style profile at startup.
+
+    The vector indexes of warm_user_ids (None being the single-user store) are loaded before serving. With
+    warm_stores=False only their shared indexes are, which is how workers avoid each loading Chroma's indexes.
+    A read_only app has no endpoints writing to the vector store, which is left to a single writer process.
+    """
+    app = web.Application()
+    app[SERVICE_KEY] = service or ReviewService()
+    app[COALESCER_KEY] = RequestCoalescer()
+
+    if reviews_path and watched_path:
+
+        async def learn_at_startup(app: web.Application):
+            logger.info('Learning style profile at startup...')
+            await app[SERVICE_KEY].learn_style(reviews_path, watched_path)
+
+        app.on_startup.append(learn_at_startup)
+
+    async def warm_up(app: web.Application):
+        await app[SERVICE_KEY].warm_up(warm_user_ids, stores=warm_stores)
+
+    app.on_startup.append(warm_up)
+
+    app.router.add_get('/health', health)
+    app.router.add_get('/style', get_style)
+    app.router.add_get('/style/learn/progress', learn_progress)
+    app.router.add_get('/embeddings/migrate', migration_status)
+    if not read_only:
+        app.router.add_post('/style/learn', learn_style)
+        app.router.add_post('/embeddings/migrate', migrate_embeddings)
+    app.router.add_post('/movies/similar', similar_movies)
+    app.router.add_post('/reviews', generate_review)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='StyleSynth HTTP service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--reviews', help='reviews.csv to learn the style profile from at startup')
+    parser.add_argument('--watched', help='watched.csv to learn the style profile from at startup')
+    parser.add_argument('--persist-dir', default='./.vectordb')
+    parser.add_argument('--max-open-stores', type=int, default=256, help='Per-user vector stores kept open')
+    parser.add_argument(
+        '--memory-limit-mb',
+        type=int,
+        default=DEFAULT_MEMORY_LIMIT_MB,
+        help='Memory limit for loaded collection indexes, 0 for no limit',
+    )
+    parser.add_argument('--deadline-ms', type=int, default=0, help='Default deadline for review generation')
+    parser.add_argument('--shared-index', help='Directory of memory-mapped movie indexes shared between workers')
+    parser.add_argument('--workers', type=int, default=1, help='Read-only worker processes, requires --shared-index')
+    parser.add_argument(
+        '--read-only', action='store_true', help='Serve without the endpoints writing to the vector store'
+    )
+    parser.add_argument('--warm-users', nargs='*', default=[], help='User IDs whose indexes are preloaded at startup')
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if not args.shared_index:
+            parser.error('--workers requires --shared-index, workers serve similar movies from the shared index')
+        if args.reviews or args.watched:
+            parser.error('Learn the style profile once with a single process before starting several workers')
+        # Every worker binds the same port, the kernel spreads connections across them
+        workers = [multiprocessing.Process(target=_serve, args=(args,)) for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    else:
+        _serve(args)
+
+
+def _serve(args: argparse.Namespace) -> None:
+    logging.basicConfig(level=logging.INFO)
+    service = ReviewService(
+        persist_dir=args.persist_dir,
+        max_open_stores=args.max_open_stores,
+        memory_limit_bytes=args.memory_limit_mb * 1024 * 1024,
+        default_deadline=args.deadline_ms / 1000 or None,
+        shared_index_dir=args.shared_index,
+    )
+    app = create_app(
+        service=service,
+        reviews_path=args.reviews,
+        watched_path=args.watched,
+        warm_user_ids=[None, *args.warm_users],
+        # Workers serve similar movies from the shared index and open Chroma only to generate or learn
+        warm_stores=args.workers <= 1,
+        # Workers share the persist directory, so only a separate single process learns and migrates
+        read_only=args.read_only or args.workers > 1,
+    )
+    web.run_app(app, host=args.host, port=args.port, reuse_port=args.workers > 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Read-only movie index shared by several serving processes through memory-mapped snapshots.
+
+One writer publishes the watched-movies collection as an immutable snapshot directory holding a
+normalized float32 embedding matrix and its metadata, then atomically repoints CURRENT at it.
+Readers memory-map the matrix, so every process shares the same pages of the OS page cache instead
+of holding its own copy, and pick up new snapshots on their next refresh.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.review_analyzer.schemas import make_user_key
+from src.review_analyzer.vector_store import SNAPSHOT_PAGE_SIZE, VectorStore
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = 'CURRENT'
+# Older snapshots are kept briefly so readers still mapping them are not cut off mid-query
+KEEP_SNAPSHOTS = 2
+
+
+def _index_dir(directory: str, user_id: Optional[str]) -> Path:
+    return Path(directory) / (make_user_key(user_id) if user_id is not None else 'default')
+
+
+def publish_index(store: VectorStore, directory: str) -> Path:
+    """Write an immutable snapshot of the store's watched movies and make it the current one"""
+    index_dir = _index_dir(directory, store.user_id)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    collections = store.movie_collections()
+
+    ids, documents, metadatas, pages = [], [], [], []
+    for collection in collections:
+        for offset in range(0, collection.count(), SNAPSHOT_PAGE_SIZE):
+            page = collection.get(
+                limit=SNAPSHOT_PAGE_SIZE, offset=offset, include=['documents', 'metadatas', 'embeddings']
+            )
+            ids.extend(page['ids'])
+            documents.extend(page['documents'])
+            metadatas.extend(page['metadatas'])
+            pages.append(np.asarray(page['embeddings'], dtype=np.float32))
+
+    embeddings = np.concatenate(pages) if pages else np.zeros((0, 0), dtype=np.float32)
+    if len(embeddings):
+        # Normalized once here so a query is a single matrix-vector product
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
+
+    version = f'{time.strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    snapshot_dir = index_dir / version
+    snapshot_dir.mkdir()
+    np.save(snapshot_dir / 'embeddings.npy', np.ascontiguousarray(embeddings, dtype=np.float32))
+    (snapshot_dir / 'metadata.json').write_text(
+        json.dumps(
+            {
+                'ids': ids,
+                'documents': documents,
+                'metadatas': metadatas,
+                'embedding_model': (collections[0].metadata or {}).get('embedding_model') or store.embedding_model,
+            }
+        ),
+        encoding='utf-8',
+    )
+
+    tmp_path = index_dir / f'{CURRENT_FILE}.tmp'
+    tmp_path.write_text(version, encoding='utf-8')
+    os.replace(tmp_path, index_dir / CURRENT_FILE)
+    logger.info(f'Published {len(ids)} movies to {snapshot_dir}')
+
+    snapshots = sorted((path for path in index_dir.iterdir() if path.is_dir()), key=lambda p: p.stat().st_mtime_ns)
+    for old_dir in snapshots[:-KEEP_SNAPSHOTS]:
+        if old_dir != snapshot_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    return snapshot_dir
+
+
+class SharedVectorIndex:
+    """Exact cosine search over the current memory-mapped snapshot, safe to open from many processes"""
+
+    def __init__(self, directory: str, user_id: Optional[str] = None, refresh_interval: float = 5.0):
+        self.index_dir = _index_dir(directory, user_id)
+        self.refresh_interval = refresh_interval
+        self.version: Optional[str] = None
+        self._embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._metadata: Dict = {'ids': [], 'documents': [], 'metadatas': []}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Switch to the latest published snapshot, returning whether it changed"""
+        self._checked_at = time.monotonic()
+        try:
+            version = (self.index_dir / CURRENT_FILE).read_text(encoding='utf-8').strip()
+        except FileNotFoundError:
+            return False
+        if version == self.version:
+            return False
+
+        snapshot_dir = self.index_dir / version
+        embeddings = np.load(snapshot_dir / 'embeddings.npy', mmap_mode='r')
+        metadata = json.loads((snapshot_dir / 'metadata.json').read_text(encoding='utf-8'))
+        with self._lock:
+            # Swapped together so a query never sees vectors and metadata from different snapshots
+            self._embeddings, self._metadata, self.version = embeddings, metadata, version
+        logger.info(f'Loaded shared index snapshot {version} with {len(metadata["ids"])} movies')
+        return True
+
+    def __len__(self) -> int:
+        return len(self._metadata['ids'])
+
+    @property
+    def embedding_model(self) -> Optional[str]:
+        """The model the current snapshot's vectors were embedded with"""
+        return self._metadata.get('embedding_model')
+
+    async def find_similar_movies(
+        self, query_embedding: List[float], n_results: int = 5, filter_metadata: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Same results format as VectorStore.find_similar_movies, supporting $eq and $ne metadata filters"""
+        if time.monotonic() - self._checked_at > self.refresh_interval:
+            self.refresh()
+
+        with self._lock:
+            embeddings, metadata = self._embeddings, self._metadata
+        if not len(metadata['ids']):
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        distances = 1 - embeddings @ query
+
+        results = []
+        for i in self._ranked(distances, n_results, bool(filter_metadata)):
+            if filter_metadata and not self._matches(metadata['metadatas'][i], filter_metadata):
+                continue
+            results.append(
+                {
+                    'id': metadata['ids'][i],
+                    'document': metadata['documents'][i],
+                    'metadata': metadata['metadatas'][i],
+                    'distance': float(distances[i]),
+                }
+            )
+            if len(results) == n_results:
+                break
+        return results
+
+    @staticmethod
+    def _ranked(distances: np.ndarray, n_results: int, filtered: bool):
+        """Yield row indices by increasing distance, partially sorting only as far as needed"""
+        # Filters usually exclude a handful of rows, so over-fetch a little before sorting everything
+        k = min(len(distances), n_results + (16 if filtered else 0))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        yield from top
+        if filtered and k < len(distances):
+            yield from np.argsort(distances)[k:]
+
+    @staticmethod
+    def _matches(metadata: Dict, filter_metadata: Dict) -> bool:
+        for key, condition in filter_metadata.items():
+            if not isinstance(condition, dict):
+                condition = {'$eq': condition}
+            for operator, value in condition.items():
+                if operator == '$eq' and metadata.get(key) != value:
+                    return False
+                if operator == '$ne' and metadata.get(key) == value:
+                    return False
+                if operator not in ('$eq', '$ne'):
+                    raise ValueError(f'Unsupported filter operator {operator}')
+        return True
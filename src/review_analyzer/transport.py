@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that reports when it is closed, so a streamed response counts as in flight until then"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._on_close()
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """Connection-pooling transport shared by the chat and embedding clients, with utilisation stats.
+
+    Connections belong to the event loop that opened them, so a fresh pool is started if the
+    transport is used from a different loop, e.g. after a second asyncio.run().
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.requests_total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def _get_transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        if self._transport is None or self._loop is not loop:
+            previous, self._transport = self._transport, httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+            self._loop = loop
+            if previous is not None:
+                try:
+                    await previous.aclose()
+                except Exception as e:
+                    # Its connections may belong to a loop that is already closed
+                    logger.debug(f'Error closing the previous connection pool: {e}')
+        return self._transport
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = await self._get_transport()
+        self.requests_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await transport.handle_async_request(request)
+        except BaseException:
+            self._release()
+            raise
+        # Returned at the headers, streamed bodies are released when the client closes the response
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, self._release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        if self._transport is not None:
+            await self._transport.aclose()
+            self._transport = None
+
+    def stats(self) -> Dict[str, int]:
+        """Pool utilisation: requests sent and in flight, and open and idle connections"""
+        # httpcore exposes its connections, but not through httpx's public API
+        pool = getattr(self._transport, '_pool', None)
+        connections = list(getattr(pool, 'connections', []))
+        return {
+            'requests_total': self.requests_total,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'connections_open': sum(not connection.is_closed() for connection in connections),
+            'connections_idle': sum(connection.is_idle() for connection in connections),
+            'max_connections': self.limits.max_connections,
+        }
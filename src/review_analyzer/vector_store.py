@@ -1,24 +1,442 @@
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import json
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import IO, TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Set, Tuple
 
-import chromadb
+from pydantic import BaseModel, Field
+
+from src.review_analyzer.schemas import make_movie_id, make_user_key, normalize_title
+
+if TYPE_CHECKING:
+    from chromadb.api import ClientAPI
+    from chromadb.api.models.Collection import Collection
 
 logger = logging.getLogger(__name__)
 
+_clients: Dict[str, 'ClientAPI'] = {}
+_clients_lock = threading.Lock()
+# Serializes updates of the per-store shard lists
+_shard_lists_lock = threading.Lock()
 
-class VectorStore:
-    def __init__(self, persist_dir: str = './.vectordb'):
-        persist_dir = Path(persist_dir)
-        persist_dir.mkdir(parents=True, exist_ok=True)
+SNAPSHOT_VERSION = 1
+SNAPSHOT_PAGE_SIZE = 5000
+# Default bound on loaded collection indexes when serving many users from one process
+DEFAULT_MEMORY_LIMIT_MB = 1024
+
+
+def get_client(persist_dir: str = './.vectordb', memory_limit_bytes: int = 0) -> 'ClientAPI':
+    """Return the process-wide client for a persist directory, creating it on first use.
+
+    A non-zero memory_limit_bytes makes Chroma evict least recently used collection indexes from memory,
+    which bounds memory when serving many users from one process. The first call for a directory wins.
+    """
+    # Imported on first use, chromadb alone takes most of a second to import
+    import chromadb
+    from chromadb.config import Settings
+
+    persist_dir = Path(persist_dir)
+    persist_dir.mkdir(parents=True, exist_ok=True)
+    key = str(persist_dir.resolve())
+
+    with _clients_lock:
+        if key not in _clients:
+            settings = Settings(anonymized_telemetry=False)
+            if memory_limit_bytes:
+                settings = Settings(
+                    anonymized_telemetry=False,
+                    chroma_segment_cache_policy='LRU',
+                    chroma_memory_limit_bytes=memory_limit_bytes,
+                )
+            _clients[key] = chromadb.PersistentClient(path=key, settings=settings)
+        return _clients[key]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError('Snapshots require pyarrow, install it with `poetry install -E snapshot`') from e
+    return pa, pq
+
+
+def _collection_name(base: str, user_id: Optional[str], generation: Optional[str] = None) -> str:
+    """Per-user collection name within Chroma's 3-63 character limit"""
+    if generation:
+        base = f'{base}-{generation}'
+    if user_id is None:
+        return base
+    return f'{base}-{make_user_key(user_id)}'
+
+
+def _fit_collection_name(name: str) -> str:
+    """Shorten a derived collection name to Chroma's 63 character limit, keeping it unique with a digest"""
+    if len(name) <= 63:
+        return name
+    return f'{name[:54]}-{hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]}'
+
+
+def embedding_generation(embedding_model: str, embedding_dimensions: Optional[int] = None) -> str:
+    """Short ID namespacing the collections built with one embedding model"""
+    return hashlib.sha1(f'{embedding_model}:{embedding_dimensions or ""}'.encode('utf-8')).hexdigest()[:6]
+
+
+class EmbeddingGenerations:
+    """Records which embedding model, and so which generation of collections, each user's store serves from.
+
+    Users without a record use the configured model and the original, unnamespaced collections. A record is
+    written when an embedding migration cuts over, so restarts keep serving the migrated collections.
+
+    Migration status and the file locks serializing writes live next to the registry, so every process
+    sharing persist_dir sees the same migration and no two of them write to a store at once.
+    """
+
+    FILE_NAME = 'embedding_generations.json'
+
+    def __init__(self, persist_dir: str):
+        self.path = Path(persist_dir) / self.FILE_NAME
+        self.status_dir = Path(persist_dir) / 'migrations'
+        self.lock_dir = Path(persist_dir) / 'locks'
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict] = {}
+        self._version: Optional[Tuple[int, int]] = None
+
+    def _stat_version(self) -> Tuple[int, int]:
+        # Every write replaces the file, so a new inode catches changes within the mtime resolution
+        stat = self.path.stat()
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _reload_if_changed(self) -> None:
+        # Other worker processes may cut over, so pick up their records as soon as the file changes
+        try:
+            version = self._stat_version()
+        except FileNotFoundError:
+            return
+        if version != self._version:
+            self._records = json.loads(self.path.read_text(encoding='utf-8'))
+            self._version = version
+
+    @staticmethod
+    def _key(user_id: Optional[str]) -> str:
+        return make_user_key(user_id) if user_id is not None else 'default'
+
+    def get(self, user_id: Optional[str]) -> Optional[Dict]:
+        with self._lock:
+            self._reload_if_changed()
+            return self._records.get(self._key(user_id))
+
+    def set(self, user_id: Optional[str], embedding_model: str, embedding_dimensions: Optional[int] = None) -> Dict:
+        record = {
+            'embedding_model': embedding_model,
+            'embedding_dimensions': embedding_dimensions,
+            'generation': embedding_generation(embedding_model, embedding_dimensions),
+        }
+        with self._lock:
+            self._reload_if_changed()
+            records = {**self._records, self._key(user_id): record}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.json.tmp')
+            tmp_path.write_text(json.dumps(records, indent=2), encoding='utf-8')
+            os.replace(tmp_path, self.path)
+            self._records, self._version = records, self._stat_version()
+        return record
+
+    def save_status(self, user_id: Optional[str], status: Dict) -> None:
+        """Persist the status of the user's latest migration, for processes other than the one running it"""
+        path = self.status_dir / f'{self._key(user_id)}.json'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.json.tmp')
+        tmp_path.write_text(json.dumps(status, indent=2), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    def load_status(self, user_id: Optional[str]) -> Optional[Dict]:
+        try:
+            return json.loads((self.status_dir / f'{self._key(user_id)}.json').read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None
+
+    def _open_lock_file(self, name: str) -> IO:
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        return open(self.lock_dir / name, 'a')
+
+    @contextlib.asynccontextmanager
+    async def lock(self, user_id: Optional[str]) -> AsyncIterator[None]:
+        """Exclusive write access to the user's store across all processes sharing persist_dir"""
+        import fcntl
+
+        with self._open_lock_file(f'{self._key(user_id)}.lock') as lock_file:
+            await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def try_lock_migration(self, user_id: Optional[str]) -> Optional[IO]:
+        """Claim the user's store for a migration, None when another one holds it.
+
+        Closing the returned file releases the claim, as does the exit of the process holding it.
+        """
+        import fcntl
+
+        lock_file = self._open_lock_file(f'{self._key(user_id)}.migration.lock')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
 
-        self.client = chromadb.PersistentClient(path=str(persist_dir))
+
+class HNSWConfig(BaseModel):
+    """HNSW index parameters, unset values fall back to Chroma's defaults.
+
+    construction_ef and M only take effect when a collection is created. Higher search_ef and
+    construction_ef trade query and insert latency for recall, higher M trades memory for recall.
+    """
+
+    space: str = 'cosine'
+    construction_ef: Optional[int] = None
+    search_ef: Optional[int] = None
+    M: Optional[int] = None
+
+    def to_metadata(self) -> Dict:
+        metadata = {
+            'hnsw:space': self.space,
+            'hnsw:construction_ef': self.construction_ef,
+            'hnsw:search_ef': self.search_ef,
+            'hnsw:M': self.M,
+        }
+        return {key: value for key, value in metadata.items() if value is not None}
+
+
+class ShardConfig(BaseModel):
+    """How watched movies are split over several collections, unsharded by default.
+
+    by='hash' spreads movies evenly over num_shards collections by ID. Any other value names a metadata
+    key, e.g. 'era', giving one collection per value, so queries filtered on that key only search the
+    matching shards. Queries without such a filter fan out to every shard concurrently.
+    """
+
+    by: Optional[str] = None
+    num_shards: int = Field(default=4, ge=1)
+
+
+def _stable_hash(value: str) -> int:
+    return int(hashlib.sha1(value.encode('utf-8')).hexdigest()[:8], 16)
+
+
+class VectorStore:
+    def __init__(
+        self,
+        persist_dir: str = './.vectordb',
+        embedding_model: Optional[str] = None,
+        embedding_dimensions: Optional[int] = None,
+        user_id: Optional[str] = None,
+        hnsw_config: Optional[HNSWConfig] = None,
+        shard_config: Optional[ShardConfig] = None,
+        generation: Optional[str] = None,
+    ):
+        self.client = get_client(persist_dir)
+        self.persist_dir = persist_dir
+        self.user_id = user_id
+        # Namespaces the collections, so stores built with different embedding models live side by side
+        self.generation = generation
+        self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
+        self.hnsw_config = hnsw_config or HNSWConfig()
+        self.shard_config = shard_config or ShardConfig()
+        # Normalized title -> [(year, movie ID)], built on the first fuzzy lookup
+        self._title_index: Optional[Dict[str, List[Tuple[int, str]]]] = None
 
         # Create collections with cosine similarity
-        self.movies_collection = self.client.get_or_create_collection(
-            name='watched_movies', metadata={'hnsw:space': 'cosine'}
+        self.movies_collection = self._open_collection(_collection_name('watched_movies', user_id, generation))
+        # Reviews are stored under the embedding of the film they review, so they share the movies' vector space
+        self.reviews_collection = self._open_collection(_collection_name('user_reviews', user_id, generation))
+        # Shard collection name -> collection, empty when unsharded
+        self._shards: Dict[str, 'Collection'] = {}
+        # Whether the unsharded collection holds movies, counted once here rather than on every lookup
+        self._has_unsharded_movies = self.movies_collection.count() > 0
+        if self.shard_config.by:
+            self._open_shards()
+
+    def _open_collection(self, name: str, extra_metadata: Optional[Dict] = None):
+        """Open a collection, stamping it with the embedding settings so stored and query vectors always match"""
+        stamp = {}
+        if self.embedding_model:
+            stamp['embedding_model'] = self.embedding_model
+        if self.embedding_dimensions:
+            stamp['embedding_dimensions'] = self.embedding_dimensions
+
+        hnsw_metadata = self.hnsw_config.to_metadata()
+        collection = self.client.get_or_create_collection(
+            name=name, metadata={**hnsw_metadata, **stamp, **(extra_metadata or {})}
         )
 
+        existing = collection.metadata or {}
+        hnsw_mismatched = {key: existing.get(key) for key, value in hnsw_metadata.items() if existing.get(key) != value}
+        if hnsw_mismatched and 'hnsw:space' not in hnsw_mismatched:
+            # HNSW parameters are fixed once the index exists, so keep serving with the stored ones
+            logger.warning(f'Collection {name} keeps its existing HNSW parameters {hnsw_mismatched}')
+        mismatched = {key: existing[key] for key, value in stamp.items() if key in existing and existing[key] != value}
+        if mismatched:
+            raise ValueError(
+                f'Collection {name} was built with {mismatched}, but the current settings are {stamp}. '
+                'Use a different persist_dir or rebuild the collection with learn_style.'
+            )
+
+        missing = [key for key in stamp if key not in existing]
+        if missing:
+            logger.warning(f'Collection {name} has no record of {missing}; assuming it matches the current settings')
+
+        return collection
+
+    def _stamp(self, metadata: Dict) -> Dict:
+        """Record the embedding model on each vector, so its origin is known wherever the record ends up"""
+        return {**metadata, 'embedding_model': self.embedding_model} if self.embedding_model else metadata
+
+    def _open_shards(self) -> None:
+        base = self.movies_collection.name
+        if self.shard_config.by == 'hash':
+            for i in range(self.shard_config.num_shards):
+                self._open_shard(_fit_collection_name(f'{base}-h{i}'), str(i))
+        else:
+            # Metadata shards are created as values turn up, so reopen the ones earlier runs recorded
+            path = self._shard_list_path()
+            if path.exists():
+                shards = json.loads(path.read_text(encoding='utf-8'))
+            else:
+                shards = self._scan_shards()
+                self._save_shard_list(shards)
+            for name, value in shards.items():
+                self._open_shard(name, value)
+
+        if self._has_unsharded_movies:
+            logger.warning(
+                f'{base} holds unsharded movies, which are still searched. '
+                'Export and re-import a snapshot to move them into shards.'
+            )
+
+    def _shard_list_path(self) -> Path:
+        # One small file per store, so opening a store never lists every user's collections
+        return Path(self.persist_dir) / 'shards' / f'{self.movies_collection.name}.json'
+
+    def _scan_shards(self) -> Dict[str, str]:
+        """Shard names and values found by listing every collection, for stores sharded before shard lists"""
+        shards = {}
+        for collection in self.client.list_collections():
+            if not hasattr(collection, 'metadata'):
+                collection = self.client.get_collection(collection)
+            metadata = collection.metadata or {}
+            if (
+                metadata.get('shard_of') == self.movies_collection.name
+                and metadata.get('shard_by') == self.shard_config.by
+            ):
+                shards[collection.name] = metadata.get('shard_value', '')
+        return shards
+
+    def _save_shard_list(self, shards: Dict[str, str]) -> None:
+        path = self._shard_list_path()
+        with _shard_lists_lock:
+            # Merged with the file, as another open store of the same user may have added shards meanwhile
+            if path.exists():
+                shards = {**json.loads(path.read_text(encoding='utf-8')), **shards}
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.json.tmp')
+            tmp_path.write_text(json.dumps(shards), encoding='utf-8')
+            os.replace(tmp_path, path)
+
+    def _open_shard(self, name: str, value: str) -> 'Collection':
+        if name not in self._shards:
+            shard_metadata = {'shard_of': self.movies_collection.name, 'shard_by': self.shard_config.by}
+            self._shards[name] = self._open_collection(name, {**shard_metadata, 'shard_value': value})
+        return self._shards[name]
+
+    def _metadata_shard_name(self, value) -> str:
+        # A short digest keeps per-user shard names within Chroma's 63 character limit
+        digest = hashlib.sha1(str(value).encode('utf-8')).hexdigest()[:6]
+        return _fit_collection_name(f'{self.movies_collection.name}-{digest}')
+
+    def _shard_for(self, movie_id: str, metadata: Dict) -> 'Collection':
+        """The collection a movie is written to"""
+        if not self.shard_config.by:
+            return self.movies_collection
+        if self.shard_config.by == 'hash':
+            index = _stable_hash(movie_id) % self.shard_config.num_shards
+            return self._shards[_fit_collection_name(f'{self.movies_collection.name}-h{index}')]
+        value = str(metadata.get(self.shard_config.by, ''))
+        name = self._metadata_shard_name(value)
+        if name not in self._shards:
+            self._open_shard(name, value)
+            self._save_shard_list({name: value})
+        return self._shards[name]
+
+    def movie_collections(self) -> List['Collection']:
+        """Every collection holding watched movies, including unsharded ones left from before sharding"""
+        if not self._shards:
+            return [self.movies_collection]
+        shards = list(self._shards.values())
+        return shards + [self.movies_collection] if self._has_unsharded_movies else shards
+
+    def _collections_for_ids(self, movie_ids: List[str]) -> Dict[int, Tuple['Collection', List[str]]]:
+        """Collections that may hold the given movies, with the IDs to look up in each"""
+        if self.shard_config.by != 'hash':
+            return {i: (collection, movie_ids) for i, collection in enumerate(self.movie_collections())}
+        groups = {}
+        for movie_id in movie_ids:
+            shard = self._shard_for(movie_id, {})
+            groups.setdefault(id(shard), (shard, []))[1].append(movie_id)
+        if self._has_unsharded_movies:
+            groups[id(self.movies_collection)] = (self.movies_collection, movie_ids)
+        return groups
+
+    def _collections_for_filter(self, filter_metadata: Optional[Dict]) -> List['Collection']:
+        """Shards that can hold movies matching a filter on the shard key, or every movie collection"""
+        key = self.shard_config.by
+        if not self._shards or key == 'hash' or not filter_metadata:
+            return self.movie_collections()
+
+        conditions = [filter_metadata, *filter_metadata.get('$and', [])]
+        for condition in conditions:
+            if key not in condition:
+                continue
+            value = condition[key]
+            if not isinstance(value, dict):
+                values = [value]
+            elif '$eq' in value:
+                values = [value['$eq']]
+            elif '$in' in value:
+                values = value['$in']
+            else:
+                continue
+            names = {self._metadata_shard_name(str(v)) for v in values}
+            shards = [self._shards[name] for name in names if name in self._shards]
+            return shards + [self.movies_collection] if self._has_unsharded_movies else shards
+        return self.movie_collections()
+
+    async def warm_up(self) -> Dict[str, float]:
+        """Load every collection's index into memory so the first real query does not pay for it.
+
+        Returns the warm-up time in seconds per collection.
+        """
+        timings = {}
+        for collection in (*self.movie_collections(), self.reviews_collection):
+            start = time.perf_counter()
+            sample = collection.peek(limit=1)
+            if len(sample['ids']):
+                collection.query(query_embeddings=[sample['embeddings'][0]], n_results=1, include=[])
+            timings[collection.name] = time.perf_counter() - start
+            logger.info(f'Warmed up {collection.name} in {timings[collection.name]:.3f}s')
+        return timings
+
     async def store_movie(self, movie_title: str, metadata: dict, embedding: List[float]) -> bool:
         """Store a movie with its embedding and metadata."""
         movie_id = metadata.get('id')
@@ -26,10 +444,14 @@ class VectorStore:
             logger.error(f'No ID provided for movie: {movie_title}')
             return False
 
+        metadata = self._stamp(metadata)
         try:
-            self.movies_collection.add(
-                documents=[movie_title], metadatas=[metadata], embeddings=[embedding], ids=[movie_id]
-            )
+            collection = self._shard_for(movie_id, metadata)
+            collection.add(documents=[movie_title], metadatas=[metadata], embeddings=[embedding], ids=[movie_id])
+            if collection is self.movies_collection:
+                self._has_unsharded_movies = True
+            if self._title_index is not None:
+                self._index_title(self._title_index, movie_id, metadata)
             logger.info(f'Successfully stored movie: {movie_title}')
             return True
 
@@ -40,43 +462,419 @@ class VectorStore:
     async def get_movie_by_id(self, movie_id: str) -> Optional[Dict]:
         """Retrieve a specific movie by ID"""
         try:
-            results = self.movies_collection.get(ids=[movie_id], include=['documents', 'metadatas', 'embeddings'])
+            for collection, ids in self._collections_for_ids([movie_id]).values():
+                results = await asyncio.to_thread(
+                    collection.get, ids=ids, include=['documents', 'metadatas', 'embeddings']
+                )
+                if results['ids']:
+                    return {
+                        'id': results['ids'][0],
+                        'document': results['documents'][0],
+                        'metadata': results['metadatas'][0],
+                        'embedding': results['embeddings'][0],
+                    }
+        except Exception as e:
+            logger.error(f'Error retrieving movie {movie_id}: {e}')
+        return None
+
+    async def get_existing_movie_ids(self, movie_ids: List[str]) -> Set[str]:
+        """Return which of the given movie IDs are already stored, in a single lookup.
+
+        Errors are raised rather than logged so callers can retry the lookup.
+        """
+        existing = set()
+        for collection, ids in self._collections_for_ids(movie_ids).values():
+            existing.update((await asyncio.to_thread(collection.get, ids=ids, include=[]))['ids'])
+        return existing
+
+    async def get_movie_embeddings(self, movie_ids: List[str]) -> Dict[str, List[float]]:
+        """Return the stored embeddings of the given movies, in a single lookup"""
+        embeddings = {}
+        for collection, ids in self._collections_for_ids(movie_ids).values():
+            results = await asyncio.to_thread(collection.get, ids=ids, include=['embeddings'])
+            embeddings.update(zip(results['ids'], results['embeddings']))
+        return embeddings
+
+    async def lookup_movie(self, title: str, year: int, year_tolerance: int = 1) -> Optional[Dict]:
+        """Find a stored movie and its embedding by slug, falling back to a lexical title and nearby year match.
+
+        Returns the movie's ID and embedding, or None when it is not stored or the lookup fails.
+        """
+        try:
+            movie_id = make_movie_id(title, year)
+            embeddings = await self.get_movie_embeddings([movie_id])
+            if movie_id not in embeddings:
+                title_index = await asyncio.to_thread(self._get_title_index)
+                candidates = title_index.get(normalize_title(title), [])
+                matches = sorted(
+                    (abs(stored_year - int(year)), stored_id)
+                    for stored_year, stored_id in candidates
+                    if abs(stored_year - int(year)) <= year_tolerance
+                )
+                if not matches:
+                    return None
+                movie_id = matches[0][1]
+                embeddings = await self.get_movie_embeddings([movie_id])
+
+            if movie_id in embeddings:
+                return {'id': movie_id, 'embedding': list(embeddings[movie_id])}
+        except Exception as e:
+            logger.error(f'Error looking up movie {title} ({year}): {e}')
+        return None
+
+    def _get_title_index(self) -> Dict[str, List[Tuple[int, str]]]:
+        if self._title_index is None:
+            index = {}
+            for collection in self.movie_collections():
+                results = collection.get(include=['metadatas'])
+                for movie_id, metadata in zip(results['ids'], results['metadatas']):
+                    self._index_title(index, movie_id, metadata)
+            self._title_index = index
+        return self._title_index
+
+    @staticmethod
+    def _index_title(index: Dict[str, List[Tuple[int, str]]], movie_id: str, metadata: Dict) -> None:
+        try:
+            year = int(float(metadata.get('year') or 0))
+        except (TypeError, ValueError):
+            return
+        index.setdefault(normalize_title(str(metadata.get('title', ''))), []).append((year, movie_id))
+
+    async def find_similar_movies(
+        self, query_embedding: List[float], n_results: int = 5, filter_metadata: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Find similar movies using semantic similarity and optional metadata filters.
+
+        With sharding, the shards that can match the filter are queried concurrently and their results merged.
+        """
+        try:
+            # Queries run in worker threads, so a stalled Chroma call cannot block the event loop or deadlines
+            collections = self._collections_for_filter(filter_metadata)
+            if len(collections) == 1:
+                results = await asyncio.to_thread(
+                    collections[0].query, query_embeddings=[query_embedding], n_results=n_results, where=filter_metadata
+                )
+                return self._format_query_results(results)
+
+            shard_results = await asyncio.gather(
+                *(
+                    asyncio.to_thread(
+                        collection.query, query_embeddings=[query_embedding], n_results=n_results, where=filter_metadata
+                    )
+                    for collection in collections
+                )
+            )
+            movies = [movie for results in shard_results for movie in self._format_query_results(results)]
+            return heapq.nsmallest(n_results, movies, key=lambda movie: movie['distance'])
+
+        except Exception as e:
+            logger.error(f'Error querying similar movies: {e}')
+            return []
+
+    async def get_movie_count(self) -> int:
+        """Get total number of stored movies"""
+        return sum(collection.count() for collection in self.movie_collections())
+
+    async def store_review(self, review_id: str, review_text: str, metadata: dict, embedding: List[float]) -> bool:
+        """Store a review with the embedding of the movie it reviews"""
+        metadata = self._stamp(metadata)
+        try:
+            self.reviews_collection.add(
+                documents=[review_text], metadatas=[metadata], embeddings=[embedding], ids=[review_id]
+            )
+            logger.info(f'Successfully stored review: {review_id}')
+            return True
+
+        except Exception as e:
+            logger.error(f'Error storing review {review_id}: {e}')
+            return False
+
+    async def get_review_by_id(self, review_id: str) -> Optional[Dict]:
+        """Retrieve a specific review by ID"""
+        try:
+            results = await asyncio.to_thread(
+                self.reviews_collection.get, ids=[review_id], include=['documents', 'metadatas']
+            )
             if results['ids']:
                 return {
                     'id': results['ids'][0],
                     'document': results['documents'][0],
                     'metadata': results['metadatas'][0],
-                    'embedding': results['embeddings'][0],
                 }
         except Exception as e:
-            logger.error(f'Error retrieving movie {movie_id}: {e}')
+            logger.error(f'Error retrieving review {review_id}: {e}')
         return None
 
-    async def find_similar_movies(
+    async def get_existing_review_ids(self, review_ids: List[str]) -> Set[str]:
+        """Return which of the given review IDs are already stored, in a single lookup"""
+        return set((await asyncio.to_thread(self.reviews_collection.get, ids=review_ids, include=[]))['ids'])
+
+    async def find_similar_reviews(
         self, query_embedding: List[float], n_results: int = 5, filter_metadata: Optional[Dict] = None
     ) -> List[Dict]:
-        """Find similar movies using semantic similarity and optional metadata filters"""
+        """Find the user's reviews of the movies most similar to the query embedding"""
         try:
-            results = self.movies_collection.query(
+            results = await asyncio.to_thread(
+                self.reviews_collection.query,
                 query_embeddings=[query_embedding],
                 n_results=n_results,
                 where=filter_metadata,
             )
 
-            return [
-                {
-                    'id': results['ids'][0][i],
-                    'document': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i],
-                }
-                for i in range(len(results['ids'][0]))
-            ]
+            return self._format_query_results(results)
 
         except Exception as e:
-            logger.error(f'Error querying similar movies: {e}')
+            logger.error(f'Error querying similar reviews: {e}')
             return []
 
-    async def get_movie_count(self) -> int:
-        """Get total number of stored movies"""
-        return self.movies_collection.count()
+    async def get_review_count(self) -> int:
+        """Get total number of stored reviews"""
+        return self.reviews_collection.count()
+
+    async def export_snapshot(self, path: str) -> Dict[str, int]:
+        """Write the IDs, documents, metadata and embeddings of every collection to Parquet files.
+
+        The snapshot is a directory with one file per collection, stamped with the snapshot version and
+        the embedding settings. Returns the number of records exported per collection.
+        """
+        pa, pq = _import_pyarrow()
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        counts = {}
+        for base, collection in self._snapshot_collections().items():
+            # Shards are exported together, so a snapshot loads into any sharding layout
+            collections = self.movie_collections() if base == 'watched_movies' else [collection]
+            counts[base] = self._export_collection(collection, collections, path / f'{base}.parquet', pa, pq)
+            logger.info(f'Exported {counts[base]} records from {collection.name}')
+        return counts
+
+    async def import_snapshot(self, path: str) -> Dict[str, int]:
+        """Bulk load a snapshot written by export_snapshot, without calling the embeddings API.
+
+        Records are upserted, so importing the same snapshot twice is harmless. Raises ValueError when the
+        snapshot was built with different embedding settings. Returns the number of records imported per collection.
+        """
+        _, pq = _import_pyarrow()
+        path = Path(path)
+        if not (path / 'watched_movies.parquet').exists():
+            raise FileNotFoundError(f'No vector store snapshot found at {path}')
+
+        counts = {}
+        for base in self._snapshot_collections():
+            file_path = path / f'{base}.parquet'
+            if not file_path.exists():
+                logger.warning(f'Snapshot {path} has no {base} collection, skipping it')
+                continue
+            counts[base] = self._import_collection(base, pq.ParquetFile(file_path))
+            self._title_index = None
+            self._has_unsharded_movies = self.movies_collection.count() > 0
+            logger.info(f'Imported {counts[base]} records into {_collection_name(base, self.user_id)}')
+        return counts
+
+    def _snapshot_collections(self) -> Dict:
+        # Keyed by base name so a snapshot can be imported for a different user
+        return {'watched_movies': self.movies_collection, 'user_reviews': self.reviews_collection}
+
+    def _export_collection(self, collection, collections: List, file_path: Path, pa, pq) -> int:
+        import numpy as np
+
+        stamp = collections[0].metadata or {}
+        metadata = {
+            'snapshot_version': str(SNAPSHOT_VERSION),
+            'embedding_model': stamp.get('embedding_model') or self.embedding_model or '',
+            'embedding_dimensions': str(stamp.get('embedding_dimensions') or self.embedding_dimensions or ''),
+            'collection': collection.name,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+        }
+
+        tmp_path = file_path.with_suffix('.parquet.tmp')
+        writer, count = None, 0
+        try:
+            pages = (
+                source.get(limit=SNAPSHOT_PAGE_SIZE, offset=offset, include=['documents', 'metadatas', 'embeddings'])
+                for source in collections
+                for offset in range(0, source.count(), SNAPSHOT_PAGE_SIZE)
+            )
+            for page in pages:
+                if not len(page['ids']):
+                    continue
+                embeddings = np.asarray(page['embeddings'], dtype=np.float32)
+                table = pa.table(
+                    {
+                        'id': pa.array(page['ids'], pa.string()),
+                        'document': pa.array(page['documents'], pa.string()),
+                        'metadata': pa.array([json.dumps(m) for m in page['metadatas']], pa.string()),
+                        # Fixed size lists keep the vectors as one contiguous float32 buffer
+                        'embedding': pa.FixedSizeListArray.from_arrays(embeddings.ravel(), embeddings.shape[1]),
+                    }
+                ).replace_schema_metadata(metadata)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                writer.write_table(table)
+                count += len(page['ids'])
+
+            if writer is None:
+                # Empty collection, the vector size is unknown
+                schema = pa.schema(
+                    [
+                        ('id', pa.string()),
+                        ('document', pa.string()),
+                        ('metadata', pa.string()),
+                        ('embedding', pa.list_(pa.float32())),
+                    ],
+                    metadata=metadata,
+                )
+                writer = pq.ParquetWriter(tmp_path, schema)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        os.replace(tmp_path, file_path)
+        return count
+
+    def _import_collection(self, base: str, parquet) -> int:
+        metadata = {key.decode(): value.decode() for key, value in (parquet.schema_arrow.metadata or {}).items()}
+        version = int(metadata.get('snapshot_version', 0))
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f'Unsupported snapshot version {version}, expected {SNAPSHOT_VERSION}')
+
+        snapshot_stamp = {}
+        if metadata.get('embedding_model'):
+            snapshot_stamp['embedding_model'] = metadata['embedding_model']
+        if metadata.get('embedding_dimensions'):
+            snapshot_stamp['embedding_dimensions'] = int(metadata['embedding_dimensions'])
+
+        collection = self._snapshot_collections()[base]
+        existing = collection.metadata or {}
+        current = {key: existing.get(key) or getattr(self, key) for key in snapshot_stamp}
+        mismatched = {key: value for key, value in snapshot_stamp.items() if current[key] and current[key] != value}
+        if mismatched:
+            raise ValueError(
+                f'Snapshot was built with {mismatched}, but {collection.name} uses {current}. '
+                'Import it into a store with matching embedding settings.'
+            )
+
+        unstamped = [key for key in snapshot_stamp if key not in existing]
+        if unstamped and collection.count() == 0:
+            # Recreate the empty collection so it carries the snapshot's embedding stamp
+            self.client.delete_collection(collection.name)
+            collection = self.client.create_collection(
+                name=collection.name, metadata={**self.hnsw_config.to_metadata(), **existing, **snapshot_stamp}
+            )
+            if base == 'watched_movies':
+                self.movies_collection = collection
+            else:
+                self.reviews_collection = collection
+
+        count = 0
+        if not parquet.metadata.num_row_groups:
+            # Exported from an empty collection, and pyarrow cannot iterate a file without row groups
+            return count
+        batch_size = min(SNAPSHOT_PAGE_SIZE, self.client.get_max_batch_size())
+        for batch in parquet.iter_batches(batch_size=batch_size):
+            if not batch.num_rows:
+                continue
+            embedding_column = batch.column('embedding')
+            embeddings = embedding_column.flatten().to_numpy().reshape(batch.num_rows, -1)
+            ids = batch.column('id').to_pylist()
+            documents = batch.column('document').to_pylist()
+            metadatas = [json.loads(m) for m in batch.column('metadata').to_pylist()]
+
+            # Movies are routed to their shards, all other records go to the collection itself
+            targets = {}
+            for row, (record_id, record_metadata) in enumerate(zip(ids, metadatas)):
+                target = self._shard_for(record_id, record_metadata) if base == 'watched_movies' else collection
+                targets.setdefault(target.name, (target, []))[1].append(row)
+            for target, rows in targets.values():
+                target.upsert(
+                    ids=[ids[row] for row in rows],
+                    documents=[documents[row] for row in rows],
+                    metadatas=[metadatas[row] for row in rows],
+                    embeddings=embeddings[rows],
+                )
+            count += batch.num_rows
+        return count
+
+    @staticmethod
+    def _format_query_results(results: Dict) -> List[Dict]:
+        return [
+            {
+                'id': results['ids'][0][i],
+                'document': results['documents'][0][i],
+                'metadata': results['metadatas'][0][i],
+                'distance': results['distances'][0][i],
+            }
+            for i in range(len(results['ids'][0]))
+        ]
+
+
+class VectorStoreCache:
+    """Bounded LRU of open per-user VectorStores sharing one client per persist directory.
+
+    max_open bounds the open VectorStore objects only. Their collection indexes stay loaded in the shared
+    client, whose memory is bounded by the memory_limit_bytes it was created with (see get_client).
+    """
+
+    def __init__(
+        self,
+        persist_dir: str = './.vectordb',
+        max_open: int = 256,
+        embedding_model: Optional[str] = None,
+        embedding_dimensions: Optional[int] = None,
+        hnsw_config: Optional[HNSWConfig] = None,
+        shard_config: Optional[ShardConfig] = None,
+        memory_limit_bytes: int = 0,
+    ):
+        self.persist_dir = persist_dir
+        self.max_open = max_open
+        # Applied when the shared client is created, on the first store opened
+        self.memory_limit_bytes = memory_limit_bytes
+        self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
+        self.hnsw_config = hnsw_config
+        self.shard_config = shard_config
+        self.generations = EmbeddingGenerations(persist_dir)
+        self._stores: 'OrderedDict[Optional[str], VectorStore]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: Optional[str] = None) -> VectorStore:
+        """Return the store for a user, opening it and evicting the least recently used one if needed"""
+        # Users whose store was migrated to another embedding model serve from that generation
+        record = self.generations.get(user_id)
+        generation = record['generation'] if record is not None else None
+        with self._lock:
+            if user_id in self._stores and self._stores[user_id].generation == generation:
+                self._stores.move_to_end(user_id)
+                return self._stores[user_id]
+
+            if record is not None:
+                store = self.open(
+                    user_id,
+                    embedding_model=record['embedding_model'],
+                    embedding_dimensions=record['embedding_dimensions'],
+                    generation=record['generation'],
+                )
+            else:
+                store = self.open(user_id)
+            self._stores.pop(user_id, None)
+            self._stores[user_id] = store
+            while len(self._stores) > self.max_open:
+                evicted_user, _ = self._stores.popitem(last=False)
+                logger.debug(f'Evicted vector store for user {evicted_user}')
+            return store
+
+    def open(self, user_id: Optional[str] = None, **overrides) -> VectorStore:
+        """Open a store for a user with the cache's settings, without caching it"""
+        settings = {
+            'embedding_model': self.embedding_model,
+            'embedding_dimensions': self.embedding_dimensions,
+            'hnsw_config': self.hnsw_config,
+            'shard_config': self.shard_config,
+            **overrides,
+        }
+        get_client(self.persist_dir, memory_limit_bytes=self.memory_limit_bytes)
+        return VectorStore(persist_dir=self.persist_dir, user_id=user_id, **settings)
+
+    def __len__(self) -> int:
+        return len(self._stores)
@@ -1,4 +1,5 @@
-from unittest.mock import patch
+import logging
+from unittest.mock import AsyncMock, patch
 
 import pandas as pd
 import pytest
@@ -26,6 +27,7 @@ async def mock_analyzer():
             patch.object(analyzer, '_analyze_vocabulary') as mock_analyze_vocabulary,
             patch.object(analyzer, '_analyze_sentences') as mock_analyze_sentences,
             patch.object(analyzer, '_process_batch') as mock_process_batch,
+            patch.object(analyzer, '_process_review_batch') as mock_process_review_batch,
         ):
             yield {
                 'analyzer': analyzer,
@@ -33,6 +35,7 @@ async def mock_analyzer():
                 'mock_analyze_vocabulary': mock_analyze_vocabulary,
                 'mock_analyze_sentences': mock_analyze_sentences,
                 'mock_process_batch': mock_process_batch,
+                'mock_process_review_batch': mock_process_review_batch,
             }
 
 
@@ -62,6 +65,41 @@ async def test_learn_style_valid_data(mock_analyzer):
     assert mock_analyzer['mock_read_csv'].call_count == 2, 'Expected 2 calls to pd.read_csv'
     assert mock_analyzer['mock_analyze_vocabulary'].call_count == 1, 'Expected 1 call to _analyze_vocabulary'
     assert mock_analyzer['mock_analyze_sentences'].call_count == 1, 'Expected 1 call to _analyze_sentences'
+    assert mock_analyzer['mock_process_review_batch'].call_count == 1, 'Expected 1 call to _process_review_batch'
+
+
+async def test_stream_learn_style_yields_progress_events(mock_analyzer):
+    mock_analyzer['mock_read_csv'].return_value = pd.DataFrame({'Review': ['Great movie!', 'Not bad']})
+    mock_analyzer['mock_process_batch'].side_effect = RuntimeError('store unavailable')
+    mock_analyzer['mock_analyze_vocabulary'].return_value = {
+        'sentiment': {'positive': 1.0},
+        'references': [],
+        'average_length': 2,
+    }
+    mock_analyzer['mock_analyze_sentences'].return_value = [{'type': 'opening', 'pattern': 'Starts with a quote'}]
+
+    events = [event async for event in mock_analyzer['analyzer'].stream_learn_style('reviews.csv', 'watched.csv')]
+
+    assert [event.stage for event in events] == ['movies', 'reviews', 'analysis', 'done']
+    assert events[0].total_rows == 4
+    assert events[0].errors == ['movies batch 1: store unavailable']
+    assert events[1].errors == []
+    assert events[-1].style.sentence_patterns[0]['pattern'] == 'Starts with a quote'
+
+
+async def test_failing_progress_callback_is_logged_not_printed(mock_analyzer, caplog, capsys):
+    mock_analyzer['mock_read_csv'].return_value = pd.DataFrame({'Review': ['Great movie!']})
+    mock_analyzer['mock_analyze_vocabulary'].return_value = {'sentiment': {}, 'references': [], 'average_length': 2}
+    mock_analyzer['mock_analyze_sentences'].return_value = []
+
+    def fail(event):
+        raise RuntimeError('dashboard down')
+
+    with caplog.at_level(logging.WARNING, logger='src.review_analyzer.analyzer'):
+        await mock_analyzer['analyzer'].learn_style('reviews.csv', 'watched.csv', on_progress=fail)
+
+    assert 'Progress callback failed: dashboard down' in caplog.text
+    assert capsys.readouterr().out == ''
 
 
 async def test_learn_style_invalid_path(mock_analyzer):
@@ -76,3 +114,97 @@ async def test_learn_style_empty_data(mock_analyzer):
 
     with pytest.raises(ValueError):
         await mock_analyzer['analyzer'].learn_style('path/to/reviews.csv', 'path/to/watched.csv')
+
+
+@pytest.fixture
+def flaky_analyzer():
+    with (
+        patch('src.review_analyzer.analyzer.LLMService'),
+        patch('src.review_analyzer.analyzer.VectorStore') as MockVectorStore,
+    ):
+        vector_store = MockVectorStore.return_value
+        vector_store.get_existing_movie_ids = AsyncMock(return_value=set())
+        vector_store.store_movie = AsyncMock(return_value=True)
+
+        analyzer = ReviewStyleAnalyzer(max_attempts=3, retry_initial_wait=0)
+        analyzer.embeddings = AsyncMock()
+        yield analyzer
+
+
+async def test_process_batch_retries_only_failed_items(flaky_analyzer, test_sample_batch):
+    failures = {'The Matrix': 1}
+
+    async def embed(text):
+        title = 'The Matrix' if text.startswith('The Matrix') else 'Inception'
+        if failures.get(title):
+            failures[title] -= 1
+            raise ConnectionError('flaky network')
+        return [0.1, 0.2, 0.3]
+
+    flaky_analyzer.embeddings.aembed_query.side_effect = embed
+
+    stats = await flaky_analyzer._process_batch(test_sample_batch)
+
+    assert stats.stored == 2
+    assert stats.embedding_calls == 3
+    assert stats.retries == 1
+    assert stats.wasted_calls == 1
+    assert flaky_analyzer.vector_store.get_existing_movie_ids.await_count == 1
+
+
+async def test_process_batch_retries_writes_without_reembedding(flaky_analyzer, test_sample_batch):
+    flaky_analyzer.embeddings.aembed_query.return_value = [0.1, 0.2, 0.3]
+    flaky_analyzer.vector_store.store_movie.side_effect = [False, True, True]
+
+    stats = await flaky_analyzer._process_batch(test_sample_batch)
+
+    assert stats.stored == 2
+    assert stats.embedding_calls == 2
+    assert stats.write_calls == 3
+    assert stats.retries == 1
+
+
+async def test_process_batch_skips_existing_and_reports_failures(flaky_analyzer, test_sample_batch):
+    flaky_analyzer.vector_store.get_existing_movie_ids.return_value = {'inception-2010'}
+    flaky_analyzer.embeddings.aembed_query.side_effect = ConnectionError('down')
+
+    stats = await flaky_analyzer._process_batch(test_sample_batch)
+
+    assert stats.skipped == 1
+    assert stats.failed == 1
+    assert stats.embedding_calls == 3
+    assert stats.wasted_calls == 3
+    flaky_analyzer.vector_store.store_movie.assert_not_awaited()
+
+
+async def test_analyze_vocabulary_ranks_references_by_frequency(flaky_analyzer):
+    reviews_df = pd.DataFrame({'Review': ['Nolan again, pure Nolan.', 'Inception but worse.', 'Nolan fatigue.']})
+    flaky_analyzer.llm_service._analyze_sentiment = AsyncMock(return_value={'positive': 1.0})
+    flaky_analyzer.llm_service._extract_references = AsyncMock(return_value=['Inception', 'The Matrix', 'Nolan'])
+
+    vocabulary = await flaky_analyzer._analyze_vocabulary(reviews_df)
+
+    assert vocabulary['references'] == ['Nolan', 'Inception', 'The Matrix']
+    assert vocabulary['reference_counts'] == {'Inception': 1, 'The Matrix': 0, 'Nolan': 3}
+
+
+async def test_analyze_sentences_sends_only_mined_candidates(flaky_analyzer):
+    reviews_df = pd.DataFrame({'Review': ['I love this. But it drags.', 'I love this too. Reminds me of Alien.']})
+    flaky_analyzer.llm_service._analyze_sentence_patterns = AsyncMock(return_value=[])
+
+    await flaky_analyzer._analyze_sentences(reviews_df)
+
+    summary = flaky_analyzer.llm_service._analyze_sentence_patterns.await_args.args[0]
+    assert summary.startswith('Mined from 2 reviews')
+    assert '"i love this": 2' in summary
+    assert '"reminds me of": 1' in summary
+
+
+async def test_analyze_sentences_fast_mode_skips_llm(flaky_analyzer):
+    flaky_analyzer.pattern_mode = 'fast'
+    flaky_analyzer.llm_service._analyze_sentence_patterns = AsyncMock()
+
+    patterns = await flaky_analyzer._analyze_sentences(pd.DataFrame({'Review': ['I love this. But it drags.']}))
+
+    flaky_analyzer.llm_service._analyze_sentence_patterns.assert_not_awaited()
+    assert patterns[0] == {'type': 'opening', 'pattern': 'Often opens with "i love this..." (1x)'}
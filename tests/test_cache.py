@@ -0,0 +1,53 @@
+from unittest.mock import patch
+
+from src.review_analyzer.cache import ResultCache, make_cache_key
+
+
+def test_make_cache_key_is_stable():
+    assert make_cache_key({'b': 1, 'a': 2}, 0.9) == make_cache_key({'a': 2, 'b': 1}, 0.9)
+    assert make_cache_key({'a': 2}, 0.9) != make_cache_key({'a': 2}, 1.0)
+
+
+def test_result_cache_round_trip_and_persistence(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    assert cache.get('missing') is None
+
+    cache.set('review', {'text': 'Loved it.'})
+
+    assert cache.get('review') == {'text': 'Loved it.'}
+    assert ResultCache(str(tmp_path / 'cache.db')).get('review') == {'text': 'Loved it.'}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_result_cache_expires_entries(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'), ttl_seconds=60)
+    with patch('src.review_analyzer.cache.time.time', return_value=1000.0):
+        cache.set('review', {'text': 'Loved it.'})
+
+    with patch('src.review_analyzer.cache.time.time', return_value=1030.0):
+        assert cache.get('review') == {'text': 'Loved it.'}
+    with patch('src.review_analyzer.cache.time.time', return_value=1061.0):
+        assert cache.get('review') is None
+    assert len(cache) == 0
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'), max_entries=2)
+    cache.set('first', 1)
+    cache.set('second', 2)
+    cache.get('first')
+
+    cache.set('third', 3)
+
+    assert len(cache) == 2
+    assert cache.get('second') is None
+    assert cache.get('first') == 1
+
+
+def test_result_cache_without_limit_keeps_every_entry(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'), max_entries=None)
+    for i in range(50):
+        cache.set(f'key-{i}', i)
+
+    assert len(cache) == 50
+    assert cache.get('key-0') == 0
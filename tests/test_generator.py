@@ -0,0 +1,266 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+from src.review_analyzer.cache import ResultCache
+from src.review_analyzer.generator import ReviewGenerator
+from src.review_analyzer.schemas import DegradationPolicy, MovieContext, PersonalReviewStyle
+from src.review_analyzer.vector_store import VectorStore
+
+
+@pytest.fixture
+def test_generator(test_style_profile):
+    with patch('src.review_analyzer.generator.VectorStore'):
+        yield ReviewGenerator(test_style_profile, few_shot_token_budget=20)
+
+
+@pytest.fixture
+def test_full_generator():
+    style_profile = PersonalReviewStyle(
+        sentence_patterns=[
+            {'type': 'opening', 'pattern': 'Starts with a quote'},
+            {'type': 'transition', 'pattern': 'However, despite the'},
+            {'type': 'closing', 'pattern': 'Ends with rating justification'},
+            {'type': 'comparative', 'pattern': 'Reminds me of...'},
+        ],
+        average_length=4,
+        sentiment_scores={'positive': 0.5, 'negative': 0.3, 'neutral': 0.2},
+        common_references=['Inception', 'The Matrix'],
+    )
+    with patch('src.review_analyzer.generator.VectorStore'):
+        generator = ReviewGenerator(style_profile)
+
+    generator.embeddings = AsyncMock()
+    generator.embeddings.aembed_query.return_value = [0.1, 0.2, 0.3]
+    generator.vector_store.lookup_movie = AsyncMock(return_value=None)
+    generator.vector_store.find_similar_movies = AsyncMock(
+        return_value=[{'id': 'the-matrix-1999', 'metadata': {'title': 'The Matrix'}, 'distance': 0.1}]
+    )
+    generator.vector_store.find_similar_reviews = AsyncMock(return_value=[])
+    generator.llm = FakeListChatModel(responses=['Like The Matrix, but dreamier.'])
+    generator.scoring_llm = FakeListChatModel(
+        responses=['{"opening": 0.8, "transition": 0.7, "closing": 0.9, "comparative": 0.6}']
+    )
+    return generator
+
+
+@pytest.fixture
+def test_movie_context():
+    return MovieContext(title='Inception', year=2010, genres=['Action', 'Sci-Fi'], runtime=148)
+
+
+async def test_retrieve(test_full_generator, test_movie_context):
+    retrieval = await test_full_generator.retrieve(test_movie_context)
+
+    assert retrieval.movie_context == test_movie_context
+    assert retrieval.query_embedding == [0.1, 0.2, 0.3]
+    assert retrieval.distances == [0.1]
+    test_full_generator.embeddings.aembed_query.assert_awaited_once_with(test_movie_context.get_embedding_context())
+
+
+async def test_retrieve_reuses_stored_embedding(test_full_generator, test_movie_context):
+    test_full_generator.vector_store.lookup_movie.return_value = {'id': 'inception-2010', 'embedding': [0.3, 0.2, 0.1]}
+
+    retrieval = await test_full_generator.retrieve(test_movie_context)
+
+    assert retrieval.query_embedding == [0.3, 0.2, 0.1]
+    assert retrieval.stored_movie_id == 'inception-2010'
+    test_full_generator.embeddings.aembed_query.assert_not_awaited()
+    movies_filter = test_full_generator.vector_store.find_similar_movies.call_args.kwargs['filter_metadata']
+    assert movies_filter == {'id': {'$ne': 'inception-2010'}}
+
+
+async def test_compose_reuses_retrieval(test_full_generator, test_movie_context):
+    retrieval = await test_full_generator.retrieve(test_movie_context)
+
+    review = await test_full_generator.compose(retrieval)
+
+    assert review.text == 'Like The Matrix, but dreamier.'
+    assert review.key_elements_used == ['Referenced The Matrix']
+    assert test_full_generator.embeddings.aembed_query.await_count == 1
+    assert test_full_generator.vector_store.find_similar_movies.await_count == 1
+
+
+async def test_compose_applies_temperature(test_full_generator, test_movie_context):
+    llm = test_full_generator.llm
+    test_full_generator.llm = MagicMock()
+    test_full_generator.llm.bind.return_value = llm
+
+    await test_full_generator.generate_review(test_movie_context, temperature=0.3)
+
+    test_full_generator.llm.bind.assert_called_once_with(temperature=0.3)
+
+
+async def test_compose_best_of_keeps_best_candidate(test_full_generator, test_movie_context):
+    test_full_generator.llm = FakeListChatModel(
+        responses=['A long rambling review without any references at all.', 'Like The Matrix, but dreamier.']
+    )
+    test_full_generator.early_stop_score = 1.1
+    retrieval = await test_full_generator.retrieve(test_movie_context)
+
+    review = await test_full_generator.compose(retrieval, best_of=2)
+
+    assert review.text == 'Like The Matrix, but dreamier.'
+    assert review.style_confidence['opening'] == 0.8
+
+
+class FakeStreamingChain:
+    """Streams scripted responses, one per call, optionally stalling after the first chunk"""
+
+    def __init__(self, responses, stall_after=()):
+        self.responses = list(responses)
+        self.stall_after = stall_after
+        self.calls = 0
+        self.cancelled = 0
+
+    async def astream(self, variables):
+        self.calls += 1
+        call = self.calls
+        response = self.responses[(call - 1) % len(self.responses)]
+        if isinstance(response, Exception):
+            raise response
+        for word in response.split(' '):
+            yield SimpleNamespace(content=word + ' ')
+            if call in self.stall_after:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    self.cancelled += 1
+                    raise
+
+
+async def test_best_of_cancels_outstanding_candidates(test_full_generator):
+    chain = FakeStreamingChain(['Like The Matrix, but dreamier.'], stall_after=(2, 3))
+
+    text, score = await asyncio.wait_for(test_full_generator._generate_best_of(chain, {}, 3, []), timeout=1)
+    await asyncio.sleep(0)
+
+    assert text.strip() == 'Like The Matrix, but dreamier.'
+    assert score >= test_full_generator.early_stop_score
+    assert chain.cancelled == 2
+
+
+async def test_best_of_skips_failed_candidates(test_full_generator):
+    chain = FakeStreamingChain([RuntimeError('rate limited'), 'Fine.'])
+
+    text, _ = await test_full_generator._generate_best_of(chain, {}, 2, [])
+
+    assert text.strip() == 'Fine.'
+
+
+async def test_generation_timeout_returns_partial_text(test_full_generator):
+    chain = FakeStreamingChain(['Like The Matrix, but dreamier.'], stall_after=(1,))
+    degraded = []
+
+    text, _ = await test_full_generator._generate_best_of(chain, {}, 1, [], timeout=0.05, degraded=degraded)
+
+    assert text.strip() == 'Like'
+    assert degraded == ['generation']
+
+
+async def test_generation_timeout_without_partial_text_raises(test_full_generator):
+    test_full_generator.degradation = DegradationPolicy(partial_text=False)
+    chain = FakeStreamingChain(['Like The Matrix, but dreamier.'], stall_after=(1,))
+
+    with pytest.raises(asyncio.TimeoutError):
+        await test_full_generator._generate_best_of(chain, {}, 1, [], timeout=0.05)
+
+
+async def test_generate_review_skips_stalled_retrieval(test_full_generator, test_movie_context, caplog):
+    async def stall(**kwargs):
+        await asyncio.sleep(10)
+
+    test_full_generator.vector_store.find_similar_movies = AsyncMock(side_effect=stall)
+
+    review = await asyncio.wait_for(test_full_generator.generate_review(test_movie_context, deadline=1), timeout=2)
+
+    assert review.text == 'Like The Matrix, but dreamier.'
+    assert review.degraded_stages == ['retrieval']
+    assert set(review.stage_seconds) == {'retrieval', 'generation', 'style_confidence'}
+    assert 'Retrieval for Inception timed out' in caplog.text
+
+
+async def test_generate_review_skips_blocking_vector_store(test_full_generator, test_movie_context, tmp_path):
+    # A synchronous Chroma stall, not a cooperative one, must still be cut off by the deadline
+    store = VectorStore(persist_dir=str(tmp_path))
+    test_full_generator.vector_store = store
+
+    start = time.perf_counter()
+    with patch.object(store.movies_collection, 'query', side_effect=lambda **kwargs: time.sleep(1.5)):
+        review = await test_full_generator.generate_review(test_movie_context, deadline=0.5)
+
+    assert time.perf_counter() - start < 1.0
+    assert review.degraded_stages == ['retrieval']
+
+
+async def test_compose_skips_unparseable_style_confidence(test_full_generator, test_movie_context):
+    test_full_generator.scoring_llm = FakeListChatModel(responses=['not json'])
+    retrieval = await test_full_generator.retrieve(test_movie_context)
+
+    review = await test_full_generator.compose(retrieval)
+
+    assert review.degraded_stages == ['style_confidence']
+    assert set(review.style_confidence) == {'length'}
+
+    test_full_generator.degradation = DegradationPolicy(skip_confidence=False)
+    with pytest.raises(ValueError):
+        await test_full_generator.compose(retrieval)
+
+
+def test_local_style_score_prefers_matching_reviews(test_full_generator):
+    examples = [{'document': 'Dreamier than The Matrix.', 'metadata': {}, 'distance': 0.1}]
+
+    matching = test_full_generator._local_style_score('Like The Matrix, but dreamier.', examples)
+    unrelated = test_full_generator._local_style_score('An overlong review that mentions nothing familiar.', examples)
+
+    assert 0 <= unrelated < matching <= 1
+
+
+async def test_generate_review_uses_review_cache(test_full_generator, test_movie_context, tmp_path):
+    test_full_generator.review_cache = ResultCache(str(tmp_path / 'reviews.db'))
+
+    first = await test_full_generator.generate_review(test_movie_context)
+    test_full_generator.llm = FakeListChatModel(responses=['A fresh take.'])
+    cached = await test_full_generator.generate_review(test_movie_context)
+
+    assert cached == first
+    assert test_full_generator.embeddings.aembed_query.await_count == 1
+
+    # A different temperature is a different request, and bypass_cache always samples again
+    assert (await test_full_generator.generate_review(test_movie_context, temperature=0.5)).text == 'A fresh take.'
+    test_full_generator.llm = FakeListChatModel(responses=['Another take.'])
+    fresh = await test_full_generator.generate_review(test_movie_context, bypass_cache=True)
+
+    assert fresh.text == 'Another take.'
+    assert (await test_full_generator.generate_review(test_movie_context)).text == 'Another take.'
+
+
+def test_select_examples_within_budget(test_generator):
+    reviews = [
+        {'document': 'x' * 200, 'metadata': {'title': 'Long'}, 'distance': 0.1},
+        {'document': 'Loved every minute.', 'metadata': {'title': 'Short'}, 'distance': 0.2},
+        {'document': 'Fine.', 'metadata': {'title': 'Shortest'}, 'distance': 0.3},
+    ]
+
+    selected = test_generator._select_examples(reviews)
+
+    assert [review['metadata']['title'] for review in selected] == ['Short', 'Shortest']
+
+
+def test_select_examples_orders_by_distance(test_generator):
+    reviews = [
+        {'document': 'Second.', 'metadata': {'title': 'Far'}, 'distance': 0.9},
+        {'document': 'First.', 'metadata': {'title': 'Near'}, 'distance': 0.1},
+    ]
+
+    selected = test_generator._select_examples(reviews)
+
+    assert [review['metadata']['title'] for review in selected] == ['Near', 'Far']
+
+
+def test_format_examples_empty(test_generator):
+    assert test_generator._format_examples([]) == 'No past reviews available.'
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+LAZY_DEPENDENCIES = ('chromadb', 'langchain', 'langchain_core', 'langchain_openai', 'openai')
+
+
+def _import_profile(module: str) -> dict:
+    """Import a module in a fresh interpreter and return cumulative import times in seconds per module"""
+    # Importing must not require an API key, clients are only built on first use
+    env = {key: value for key, value in os.environ.items() if key != 'OPENAI_API_KEY'}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.parametrize(
+    'module,budget_seconds,forbidden',
+    [
+        # Budgets are generous for slow CI runners, the eager imports they guard against cost seconds
+        ('src.review_analyzer.schemas', 0.5, LAZY_DEPENDENCIES + ('pandas',)),
+        ('src.review_analyzer.profiles', 0.5, LAZY_DEPENDENCIES + ('pandas',)),
+        ('src.review_analyzer.vector_store', 0.5, LAZY_DEPENDENCIES + ('pandas',)),
+        ('src.review_analyzer.generator', 0.5, LAZY_DEPENDENCIES + ('pandas',)),
+        ('src.review_analyzer.analyzer', 1.5, LAZY_DEPENDENCIES),
+    ],
+)
+def test_import_time_budget(module, budget_seconds, forbidden):
+    times = _import_profile(module)
+
+    loaded = [name for name in times if name.split('.')[0] in forbidden]
+    assert not loaded, f'{module} eagerly imports {sorted(set(name.split(".")[0] for name in loaded))}'
+    assert times[module] < budget_seconds, f'Importing {module} took {times[module]:.2f}s, budget {budget_seconds}s'
@@ -0,0 +1,46 @@
+from unittest.mock import patch
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate
+
+from src.review_analyzer.cache import CacheMissError, ResultCache
+from src.review_analyzer.llm import LLMService
+
+
+@pytest.fixture
+def prompt():
+    return ChatPromptTemplate.from_messages([('system', 'Summarise.'), ('user', '{text}')])
+
+
+def _service(cache: ResultCache, mode: str, responses=('first', 'second')) -> LLMService:
+    with patch('src.review_analyzer.llm.config.get_llm', return_value=FakeListChatModel(responses=list(responses))):
+        return LLMService(cache=cache, cache_mode=mode)
+
+
+async def test_read_through_serves_repeated_prompts_from_cache(tmp_path, prompt):
+    service = _service(ResultCache(str(tmp_path / 'llm.db')), 'read-through')
+
+    assert await service.analyze_text('Great film.', prompt, temperature=0.3) == 'first'
+    assert await service.analyze_text('Great film.', prompt, temperature=0.3) == 'first'
+    assert await service.analyze_text('Great film.', prompt, temperature=0.5) == 'second'
+
+
+async def test_record_then_replay_without_model_calls(tmp_path, prompt):
+    cache = ResultCache(str(tmp_path / 'llm.db'))
+    recorder = _service(cache, 'record')
+    await recorder.analyze_text('Great film.', prompt)
+    assert await recorder.analyze_text('Great film.', prompt) == 'second'
+
+    replayer = _service(cache, 'replay', responses=['from the network'])
+
+    assert await replayer.analyze_text('Great film.', prompt) == 'second'
+    with pytest.raises(CacheMissError):
+        await replayer.analyze_text('Unrecorded text.', prompt)
+
+
+async def test_invalid_sentence_patterns_fall_back_to_mined_ones(tmp_path):
+    service = _service(ResultCache(str(tmp_path / 'llm.db')), 'off', responses=['not json'])
+    mined = [{'type': 'opening', 'pattern': 'Often opens with "i love this..." (3x)'}]
+
+    assert await service._analyze_sentence_patterns('Mined from 3 reviews', fallback=mined) == mined
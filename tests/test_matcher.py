@@ -0,0 +1,34 @@
+from src.review_analyzer.matcher import ReferenceMatcher, get_reference_matcher
+
+
+def test_find_matches_whole_words_case_insensitively():
+    matcher = ReferenceMatcher(['Inception', 'The Matrix', 'Her', 'Nolan'])
+
+    found = matcher.find('Like THE MATRIX remade by nolan, with none of the inceptions. Here we go.')
+
+    assert found == ['The Matrix', 'Nolan']
+
+
+def test_find_overlapping_references():
+    matcher = ReferenceMatcher(['The Matrix', 'Matrix', 'Matrix Reloaded'])
+
+    assert matcher.find('The Matrix Reloaded') == ['The Matrix', 'Matrix', 'Matrix Reloaded']
+
+
+def test_count_across_texts():
+    matcher = ReferenceMatcher(['Alien', 'Aliens', 'alien'])
+
+    counts = matcher.count(['Alien beats Aliens.', 'ALIEN!', 'Alienated.'])
+
+    assert counts == {'Alien': 2, 'Aliens': 1, 'alien': 2}
+
+
+def test_empty_references():
+    matcher = ReferenceMatcher(['', '  '])
+
+    assert matcher.find('Anything at all') == []
+    assert matcher.count(['Anything']) == {}
+
+
+def test_get_reference_matcher_is_cached():
+    assert get_reference_matcher(('Inception',)) is get_reference_matcher(('Inception',))
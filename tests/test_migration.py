@@ -0,0 +1,127 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.review_analyzer.migration import EmbeddingMigration
+from src.review_analyzer.schemas import MovieContext
+from src.review_analyzer.service import ReviewService
+from src.review_analyzer.shared_index import publish_index
+from src.review_analyzer.vector_store import EmbeddingGenerations, VectorStore, embedding_generation
+
+
+async def test_migration_copies_and_resumes(tmp_path, test_movie_data):
+    source = VectorStore(persist_dir=str(tmp_path), embedding_model='model-a')
+    await source.store_movie(test_movie_data['title'], test_movie_data['metadata'], test_movie_data['embedding'])
+    movie_id = test_movie_data['metadata']['id']
+    await source.store_review('inception-review', 'Dreams within dreams.', {'movie_id': movie_id}, [0.1, 0.2, 0.3])
+    target = VectorStore(
+        persist_dir=str(tmp_path), embedding_model='model-b', generation=embedding_generation('model-b')
+    )
+    migration = EmbeddingMigration(source, target, DeterministicFakeEmbedding(size=8))
+
+    assert await migration.run_pass() == 2
+    assert migration.status.coverage == 1.0
+    # The review reuses its movie's new embedding rather than embedding it again
+    assert migration.status.embedded == 1
+
+    movie = await target.get_movie_by_id(movie_id)
+    assert movie['metadata']['embedding_model'] == 'model-b'
+    assert len(movie['embedding']) == 8
+    assert (await source.get_movie_by_id(movie_id))['metadata']['embedding_model'] == 'model-a'
+
+    assert await migration.run_pass() == 0
+
+
+async def test_service_cuts_over_after_migration(tmp_path, test_movie_data):
+    service = ReviewService(persist_dir=str(tmp_path))
+    source = service.stores.get(None)
+    await source.store_movie(test_movie_data['title'], test_movie_data['metadata'], test_movie_data['embedding'])
+    embeddings = DeterministicFakeEmbedding(size=8)
+
+    with patch('src.review_analyzer.service.config.get_embeddings_for', return_value=embeddings):
+        status = await service.migrate_embeddings('model-b')
+        await service._migration_tasks[None]
+        store, serving_embeddings = service.serving(None)
+
+    assert status.state == 'cut_over'
+    assert store is not source
+    assert store.embedding_model == 'model-b'
+    assert serving_embeddings is embeddings
+    assert await store.get_movie_count() == 1
+
+    # A restarted service, or another worker, reads the cutover and the migration status from persist_dir
+    restarted = ReviewService(persist_dir=str(tmp_path))
+    assert restarted.stores.get(None).generation == embedding_generation('model-b')
+    assert restarted.migration_status(None).state == 'cut_over'
+
+
+async def test_cutover_copies_writes_held_off_by_the_write_lock(tmp_path, test_movie_data):
+    service = ReviewService(persist_dir=str(tmp_path))
+    source = service.stores.get(None)
+    await source.store_movie(test_movie_data['title'], test_movie_data['metadata'], test_movie_data['embedding'])
+
+    with patch(
+        'src.review_analyzer.service.config.get_embeddings_for', return_value=DeterministicFakeEmbedding(size=8)
+    ):
+        # Stands in for a learn_style run writing to the old store while the migration catches up
+        async with service._write_lock(None):
+            status = await service.migrate_embeddings('model-b')
+            while status.coverage < 1.0:
+                await asyncio.sleep(0.01)
+            await source.store_movie('Heat', {'id': 'heat-1995', 'title': 'Heat', 'year': 1995}, [0.3, 0.2, 0.1])
+            assert status.state == 'running'
+        await service._migration_tasks[None]
+
+    assert status.state == 'cut_over'
+    assert await service.stores.get(None).get_existing_movie_ids(['heat-1995']) == {'heat-1995'}
+
+
+async def test_migrations_and_writes_are_locked_across_processes(tmp_path, test_movie_data):
+    service = ReviewService(persist_dir=str(tmp_path))
+    source = service.stores.get(None)
+    await source.store_movie(test_movie_data['title'], test_movie_data['metadata'], test_movie_data['embedding'])
+    # Stands in for another worker process sharing persist_dir
+    other = EmbeddingGenerations(str(tmp_path))
+
+    with patch(
+        'src.review_analyzer.service.config.get_embeddings_for', return_value=DeterministicFakeEmbedding(size=8)
+    ):
+        migration_lock = other.try_lock_migration(None)
+        with pytest.raises(LookupError):
+            await service.migrate_embeddings('model-b')
+        migration_lock.close()
+
+        async with other.lock(None):
+            status = await service.migrate_embeddings('model-b')
+            while status.coverage < 1.0:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            assert status.state == 'running'
+            assert other.try_lock_migration(None) is None
+        await service._migration_tasks[None]
+
+    assert status.state == 'cut_over'
+
+
+async def test_shared_index_is_skipped_until_its_model_is_served(tmp_path, test_movie_data):
+    service = ReviewService(persist_dir=str(tmp_path / 'db'), shared_index_dir=str(tmp_path / 'shared'))
+    generation = embedding_generation('model-b')
+    target = service.stores.open(None, embedding_model='model-b', generation=generation)
+    await target.store_movie(test_movie_data['title'], test_movie_data['metadata'], [0.1, 0.2, 0.3])
+    # Published ahead of the switch, as a cutover does
+    publish_index(target, str(tmp_path / 'shared'))
+    embeddings = DeterministicFakeEmbedding(size=3)
+    movie = MovieContext(title='Inception', year=2010, genres=['Action'], runtime=148)
+
+    with (
+        patch('src.review_analyzer.service.config.get_embeddings', return_value=embeddings),
+        patch('src.review_analyzer.service.config.get_embeddings_for', return_value=embeddings),
+    ):
+        assert await service.find_similar_movies(movie) == []
+
+        service.stores.generations.set(None, 'model-b')
+        movies = await service.find_similar_movies(movie)
+
+    assert [m['id'] for m in movies] == [test_movie_data['metadata']['id']]
@@ -0,0 +1,58 @@
+import pandas as pd
+
+from src.review_analyzer.patterns import (
+    DEFAULT_SENTENCE_PATTERNS,
+    format_pattern_candidates,
+    mine_sentence_patterns,
+    patterns_from_candidates,
+)
+
+
+def test_mine_sentence_patterns_counts_openings_closings_and_phrases():
+    reviews = pd.Series(
+        [
+            'I love this movie. However, the ending drags. 4/5 would watch again.',
+            'I love this one! But it reminds me of Alien. 3.5/5 would watch again',
+            'Not as good as the first. Still fun.',
+            None,
+            '',
+        ]
+    )
+
+    candidates = mine_sentence_patterns(reviews)
+
+    assert candidates['opening'][0] == ('i love this', 2)
+    assert candidates['closing'][0] == ('<num> would watch', 2)
+    assert {'however', 'but', 'still'} <= {phrase for phrase, _ in candidates['transition']}
+    assert ('reminds me of', 1) in candidates['comparative']
+    assert ('not as good as', 1) in candidates['comparative']
+
+
+def test_mine_sentence_patterns_ignores_false_superlatives_and_inner_periods():
+    reviews = pd.Series(
+        [
+            'Lost in the forest. Mr. Nolan made the finest film. 3.5/5',
+            'The interest fades. Easily the best. Dr. Strange would agree',
+        ]
+    )
+
+    candidates = mine_sentence_patterns(reviews)
+
+    assert {phrase for phrase, _ in candidates['comparative']} == {'the finest', 'the best'}
+    assert {phrase for phrase, _ in candidates['closing']} == {'<num>', 'dr. strange would'}
+
+
+def test_patterns_from_candidates_falls_back_per_category():
+    patterns = patterns_from_candidates({'opening': [('i love this', 3)], 'transition': []})
+
+    assert [p['type'] for p in patterns] == ['opening', 'transition', 'closing', 'comparative']
+    assert patterns[0]['pattern'] == 'Often opens with "i love this..." (3x)'
+    assert patterns[1:] == DEFAULT_SENTENCE_PATTERNS[1:]
+
+
+def test_empty_reviews_mine_nothing():
+    candidates = mine_sentence_patterns(pd.Series([None, '  ']))
+
+    assert all(values == [] for values in candidates.values())
+    assert patterns_from_candidates(candidates) == DEFAULT_SENTENCE_PATTERNS
+    assert '- opening: none found' in format_pattern_candidates(candidates, 0)
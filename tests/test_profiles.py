@@ -0,0 +1,45 @@
+from src.review_analyzer.profiles import StyleProfileStore
+
+
+def test_save_and_get_profile(tmp_path, test_style_profile):
+    store = StyleProfileStore(profiles_dir=str(tmp_path))
+    store.save('cinephile', test_style_profile)
+
+    # A fresh store reads the profile back from disk
+    reloaded = StyleProfileStore(profiles_dir=str(tmp_path)).get('cinephile')
+
+    assert reloaded == test_style_profile
+
+
+def test_get_missing_profile(tmp_path):
+    store = StyleProfileStore(profiles_dir=str(tmp_path))
+    assert store.get('nobody') is None
+
+
+def test_default_profile_is_separate_from_users(tmp_path, test_style_profile):
+    store = StyleProfileStore(profiles_dir=str(tmp_path))
+    store.save(None, test_style_profile)
+
+    assert store.get(None) == test_style_profile
+    assert store.get('default') is None
+
+
+def test_profile_cache_is_bounded(tmp_path, test_style_profile):
+    store = StyleProfileStore(profiles_dir=str(tmp_path), max_cached=2)
+    for user_id in ['a', 'b', 'c']:
+        store.save(user_id, test_style_profile)
+
+    assert len(store._cache) == 2
+    assert store.get('a') == test_style_profile
+
+
+def test_profile_relearned_by_another_process_is_reloaded(tmp_path, test_style_profile):
+    worker = StyleProfileStore(profiles_dir=str(tmp_path))
+    writer = StyleProfileStore(profiles_dir=str(tmp_path))
+    writer.save('cinephile', test_style_profile)
+    assert worker.get('cinephile') == test_style_profile
+
+    relearned = test_style_profile.model_copy(update={'average_length': 42})
+    writer.save('cinephile', relearned)
+
+    assert worker.get('cinephile').average_length == 42
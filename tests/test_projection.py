@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import FakeEmbeddings
+
+from src.review_analyzer.projection import PCAProjection, ProjectedEmbeddings
+
+
+@pytest.fixture
+def test_vectors():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(50, 16)).tolist()
+
+
+def test_pca_projection_fit_and_transform(test_vectors):
+    projection = PCAProjection.fit(test_vectors, 4, source_model='test-model')
+    projected = projection.transform(test_vectors)
+
+    assert projection.input_dimensions == 16
+    assert projection.output_dimensions == 4
+    assert np.asarray(projected).shape == (50, 4)
+    # Principal components are ordered by explained variance
+    variances = np.var(projected, axis=0)
+    assert list(variances) == sorted(variances, reverse=True)
+
+
+def test_pca_projection_invalid_components(test_vectors):
+    with pytest.raises(ValueError):
+        PCAProjection.fit(test_vectors, 17)
+
+
+def test_pca_projection_dimension_mismatch(test_vectors):
+    projection = PCAProjection.fit(test_vectors, 4)
+    with pytest.raises(ValueError):
+        projection.transform([[0.1, 0.2, 0.3]])
+
+
+def test_pca_projection_save_and_load(test_vectors, tmp_path):
+    projection = PCAProjection.fit(test_vectors, 4, source_model='test-model')
+    path = tmp_path / 'projection.npz'
+    projection.save(str(path))
+
+    loaded = PCAProjection.load(str(path))
+
+    assert loaded.source_model == 'test-model'
+    assert loaded.fingerprint == projection.fingerprint
+    np.testing.assert_array_almost_equal(loaded.transform(test_vectors), projection.transform(test_vectors))
+
+
+async def test_projected_embeddings(test_vectors):
+    base = FakeEmbeddings(size=16)
+    projection = PCAProjection.fit(test_vectors, 4)
+    projected = ProjectedEmbeddings(base, projection)
+
+    assert len(await projected.aembed_query('Inception Action Sci-Fi')) == 4
+    assert len(projected.embed_query('Inception Action Sci-Fi')) == 4
+    assert np.asarray(await projected.aembed_documents(['a', 'b', 'c'])).shape == (3, 4)
@@ -0,0 +1,83 @@
+from typing import Any, List
+
+import pytest
+from langchain_core.embeddings import FakeEmbeddings
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from src.review_analyzer import config
+from src.review_analyzer.routing import MeteredEmbeddings, RouteMetrics, RouteMetricsHandler, estimate_cost
+
+
+class FailingChatModel(FakeListChatModel):
+    def _call(self, messages: List, stop=None, run_manager=None, **kwargs: Any) -> str:
+        raise RuntimeError('model unavailable')
+
+
+def test_estimate_cost_matches_longest_model_prefix():
+    assert estimate_cost('gpt-4o-mini-2024-07-18', 1_000_000, 1_000_000) == pytest.approx(0.75)
+    assert estimate_cost('gpt-4o', 1_000_000, 0) == pytest.approx(2.5)
+    assert estimate_cost('unknown-model', 1000, 1000) == 0.0
+
+
+async def test_fallback_calls_are_recorded_on_the_route():
+    metrics = RouteMetrics('scoring', 'gpt-4o-mini')
+    primary = FailingChatModel(responses=['unused'], callbacks=[RouteMetricsHandler(metrics, 'gpt-4o-mini')])
+    fallback = FakeListChatModel(responses=['scored'], callbacks=[RouteMetricsHandler(metrics, 'gpt-4o')])
+
+    response = await primary.with_fallbacks([fallback]).ainvoke('Score this review')
+
+    assert response.content == 'scored'
+    stats = metrics.stats()
+    assert stats['calls'] == 1
+    assert stats['errors'] == 1
+    assert stats['fallback_calls'] == 1
+    assert stats['calls_by_model'] == {'gpt-4o': 1}
+
+
+def test_handler_records_token_usage_and_cost():
+    metrics = RouteMetrics('generation', 'gpt-4o')
+    handler = RouteMetricsHandler(metrics, 'gpt-4o')
+    message = AIMessage(
+        content='A review.', usage_metadata={'input_tokens': 1000, 'output_tokens': 200, 'total_tokens': 1200}
+    )
+
+    handler.on_chat_model_start({}, [], run_id='run')
+    handler.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id='run')
+
+    assert (metrics.prompt_tokens, metrics.completion_tokens) == (1000, 200)
+    assert metrics.cost_usd == pytest.approx(0.0045)
+
+
+async def test_metered_embeddings_records_calls():
+    metrics = RouteMetrics('embeddings', 'text-embedding-3-small')
+    embeddings = MeteredEmbeddings(FakeEmbeddings(size=4), metrics)
+
+    await embeddings.aembed_query('Inception Action Sci-Fi')
+    await embeddings.aembed_documents(['The Matrix', 'Alien'])
+
+    assert metrics.calls == 2
+    assert metrics.prompt_tokens > 0
+
+
+def test_get_llm_wraps_fallback_models(monkeypatch):
+    monkeypatch.setitem(config.route_fallback_models, 'scoring', ['gpt-4o'])
+    config.get_llm.cache_clear()
+    try:
+        llm = config.get_llm('scoring')
+
+        assert config.get_model_name(llm) == config.route_models['scoring']
+        assert [model.model_name for model in llm.fallbacks] == ['gpt-4o']
+        with pytest.raises(ValueError):
+            config.get_llm('unknown')
+    finally:
+        config.get_llm.cache_clear()
+
+
+def test_native_dimensions_rejected_for_unsupported_models():
+    assert config.supports_native_dimensions('text-embedding-3-small')
+    assert not config.supports_native_dimensions('text-embedding-ada-002')
+
+    with pytest.raises(ValueError, match='native dimensions'):
+        config.get_embeddings_for('text-embedding-ada-002', 256)
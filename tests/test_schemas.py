@@ -9,6 +9,7 @@ from src.review_analyzer.schemas import (
     PersonalReviewStyle,
     _get_era_description,
     _get_runtime_category,
+    normalize_title,
 )
 
 
@@ -199,3 +200,17 @@ def test_movie_metadata():
         'era': '2010s modern film',
         'length_category': 'directors_cut',
     }
+
+
+@pytest.mark.parametrize(
+    'title,expected',
+    [
+        ('The Matrix', 'matrix'),
+        ('matrix!', 'matrix'),
+        ('Amélie', 'amelie'),
+        ('A Quiet Place', 'quiet-place'),
+        ('The', 'the'),
+    ],
+)
+def test_normalize_title(title, expected):
+    assert normalize_title(title) == expected
@@ -0,0 +1,237 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.review_analyzer.schemas import GeneratedReview, MigrationStatus, MovieContext, ProgressEvent
+from src.review_analyzer.service import RequestCoalescer, ReviewService, create_app
+from src.review_analyzer.shared_index import publish_index
+
+
+@pytest.fixture
+def test_service(test_style_profile):
+    service = MagicMock()
+    service.get_style_profile.return_value = test_style_profile
+    service.warm_up = AsyncMock()
+    service.find_similar_movies = AsyncMock(return_value=[{'id': 'the-matrix-1999', 'distance': 0.1}])
+    service.generate_review = AsyncMock(
+        return_value=GeneratedReview(text='Loved it.', style_confidence={'length': 0.9}, key_elements_used=[])
+    )
+    return service
+
+
+@pytest.fixture
+async def test_client(test_service):
+    client = TestClient(TestServer(create_app(service=test_service)))
+    await client.start_server()
+    yield client
+    await client.close()
+
+
+async def test_service_warms_up_at_startup(test_client, test_service):
+    test_service.warm_up.assert_awaited_once_with((None,), stores=True)
+
+
+async def test_request_coalescer_merges_identical_requests():
+    coalescer = RequestCoalescer()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 'result'
+
+    results = await asyncio.gather(*(coalescer.run('key', compute) for _ in range(5)))
+
+    assert results == ['result'] * 5
+    assert calls == 1
+    assert coalescer.coalesced_count == 4
+    assert coalescer.inflight_count == 0
+
+
+async def test_request_coalescer_propagates_errors():
+    coalescer = RequestCoalescer()
+
+    async def fail():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        await coalescer.run('key', fail)
+    assert coalescer.inflight_count == 0
+
+
+async def test_generate_review_endpoint(test_client, test_service):
+    movie = {'title': 'Inception', 'year': 2010, 'genres': ['Action', 'Sci-Fi'], 'runtime': 148}
+
+    responses = await asyncio.gather(*(test_client.post('/reviews', json=movie) for _ in range(3)))
+
+    for response in responses:
+        assert response.status == 200
+        assert (await response.json())['text'] == 'Loved it.'
+
+
+async def test_similar_movies_endpoint(test_client):
+    movie = {'title': 'Inception', 'year': 2010, 'genres': ['Action'], 'runtime': 148, 'n_results': 1}
+
+    response = await test_client.post('/movies/similar', json=movie)
+
+    assert response.status == 200
+    assert (await response.json())[0]['id'] == 'the-matrix-1999'
+
+
+async def test_invalid_request_body(test_client):
+    response = await test_client.post('/reviews', json={'title': 'Inception'})
+    assert response.status == 400
+
+
+async def test_generate_review_without_style(test_client, test_service):
+    test_service.generate_review.side_effect = LookupError('No style profile learned yet')
+
+    response = await test_client.post(
+        '/reviews', json={'title': 'Inception', 'year': 2010, 'genres': ['Action'], 'runtime': 148}
+    )
+
+    assert response.status == 409
+
+
+async def test_get_style_for_user(test_client, test_service):
+    response = await test_client.get('/style', params={'user_id': 'cinephile'})
+
+    assert response.status == 200
+    test_service.get_style_profile.assert_called_with('cinephile')
+
+
+async def test_learn_progress_endpoint(test_client, test_service):
+    test_service.learn_progress = {
+        'cinephile': ProgressEvent(
+            stage='movies',
+            batch=1,
+            total_batches=4,
+            rows_processed=50,
+            total_rows=200,
+            new=40,
+            skipped=10,
+            stored=40,
+            failed=0,
+            embeddings_per_second=12.5,
+            write_latency_ms=3.0,
+            elapsed_seconds=4.0,
+            eta_seconds=12.0,
+        )
+    }
+
+    response = await test_client.get('/style/learn/progress', params={'user_id': 'cinephile'})
+    missing = await test_client.get('/style/learn/progress')
+
+    assert response.status == 200
+    assert (await response.json())['eta_seconds'] == 12.0
+    assert missing.status == 404
+
+
+async def test_migrate_embeddings_endpoint(test_client, test_service):
+    test_service.migrate_embeddings = AsyncMock(return_value=MigrationStatus(embedding_model='text-embedding-3-large'))
+    test_service.migration_status.return_value = None
+
+    response = await test_client.post(
+        '/embeddings/migrate', json={'embedding_model': 'text-embedding-3-large', 'max_per_second': 50}
+    )
+    missing = await test_client.get('/embeddings/migrate')
+    test_service.migrate_embeddings.side_effect = LookupError('already running')
+    conflict = await test_client.post('/embeddings/migrate', json={'embedding_model': 'text-embedding-3-large'})
+
+    assert response.status == 202
+    assert (await response.json())['state'] == 'running'
+    test_service.migrate_embeddings.assert_any_await(
+        'text-embedding-3-large', None, user_id=None, max_per_second=50, cutover_coverage=1.0
+    )
+    assert missing.status == 404
+    assert conflict.status == 409
+
+
+async def test_read_only_app_has_no_write_endpoints(test_service):
+    client = TestClient(TestServer(create_app(service=test_service, read_only=True)))
+    await client.start_server()
+    try:
+        learn = await client.post('/style/learn', json={'reviews_path': 'r.csv', 'watched_path': 'w.csv'})
+        migrate = await client.post('/embeddings/migrate', json={'embedding_model': 'text-embedding-3-large'})
+        style = await client.get('/style')
+    finally:
+        await client.close()
+
+    assert learn.status == 404
+    assert migrate.status == 405
+    assert style.status == 200
+
+
+async def test_generate_review_passes_user_id(test_client, test_service):
+    movie = {'title': 'Inception', 'year': 2010, 'genres': ['Action'], 'runtime': 148, 'user_id': 'cinephile'}
+
+    response = await test_client.post('/reviews', json=movie)
+
+    assert response.status == 200
+    movie_context, _ = test_service.generate_review.call_args.args
+    assert movie_context.title == 'Inception'
+    assert test_service.generate_review.call_args.kwargs['user_id'] == 'cinephile'
+    assert test_service.generate_review.call_args.kwargs['best_of'] == 1
+
+
+async def test_generate_review_deadline(test_client, test_service):
+    movie = {'title': 'Inception', 'year': 2010, 'genres': ['Action'], 'runtime': 148, 'deadline_ms': 1500}
+
+    response = await test_client.post('/reviews', json=movie)
+
+    assert response.status == 200
+    assert test_service.generate_review.call_args.kwargs['deadline'] == 1.5
+
+    test_service.generate_review.side_effect = asyncio.TimeoutError()
+    response = await test_client.post('/reviews', json={**movie, 'deadline_ms': 10})
+
+    assert response.status == 504
+
+
+async def test_find_similar_movies_prefers_shared_index(tmp_path, test_movie_data):
+    service = ReviewService(persist_dir=str(tmp_path / 'db'), shared_index_dir=str(tmp_path / 'shared'))
+    store = service.stores.get(None)
+    await store.store_movie(test_movie_data['title'], test_movie_data['metadata'], test_movie_data['embedding'])
+    embeddings = AsyncMock()
+    embeddings.aembed_query.return_value = [0.1, 0.2, 0.3]
+    movie = MovieContext(title='Inception', year=2010, genres=['Action'], runtime=148)
+
+    with patch('src.review_analyzer.service.config.get_embeddings', return_value=embeddings):
+        assert service.shared_index() is None
+        assert len(await service.find_similar_movies(movie)) == 1
+
+        publish_index(store, str(tmp_path / 'shared'))
+        store.find_similar_movies = AsyncMock()
+        movies = await service.find_similar_movies(movie)
+
+    assert [m['id'] for m in movies] == [test_movie_data['metadata']['id']]
+    store.find_similar_movies.assert_not_awaited()
+
+
+async def test_worker_serves_shared_index_without_opening_chroma(tmp_path, test_movie_data):
+    writer = ReviewService(persist_dir=str(tmp_path / 'db'), shared_index_dir=str(tmp_path / 'shared'))
+    store = writer.stores.get(None)
+    await store.store_movie(test_movie_data['title'], test_movie_data['metadata'], test_movie_data['embedding'])
+    publish_index(store, str(tmp_path / 'shared'))
+    embeddings = AsyncMock()
+    embeddings.aembed_query.return_value = [0.1, 0.2, 0.3]
+    movie = MovieContext(title='Inception', year=2010, genres=['Action'], runtime=148)
+
+    worker = ReviewService(persist_dir=str(tmp_path / 'db'), shared_index_dir=str(tmp_path / 'shared'))
+    await worker.warm_up((None,), stores=False)
+    with patch('src.review_analyzer.service.config.get_embeddings', return_value=embeddings):
+        movies = await worker.find_similar_movies(movie)
+
+    assert [m['id'] for m in movies] == [test_movie_data['metadata']['id']]
+    assert len(worker.stores) == 0
+
+
+def test_service_bounds_loaded_index_memory_by_default(tmp_path):
+    service = ReviewService(persist_dir=str(tmp_path))
+    settings = service.stores.get(None).client.get_settings()
+
+    assert settings.chroma_segment_cache_policy == 'LRU'
+    assert settings.chroma_memory_limit_bytes > 0
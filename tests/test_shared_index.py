@@ -0,0 +1,80 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from src.review_analyzer.shared_index import SharedVectorIndex, publish_index
+from src.review_analyzer.vector_store import VectorStore
+
+
+@pytest.fixture
+async def populated_store(tmp_path):
+    store = VectorStore(persist_dir=str(tmp_path / 'db'))
+    rng = np.random.default_rng(0)
+    for i in range(30):
+        metadata = {'id': f'movie-{i}', 'title': f'Movie {i}', 'year': 2000 + i % 3}
+        await store.store_movie(f'Movie {i}', metadata, rng.normal(size=8).tolist())
+    return store
+
+
+async def test_shared_index_matches_vector_store(populated_store, tmp_path):
+    publish_index(populated_store, str(tmp_path / 'shared'))
+    index = SharedVectorIndex(str(tmp_path / 'shared'))
+    query = (await populated_store.get_movie_embeddings(['movie-3']))['movie-3'].tolist()
+
+    shared = await index.find_similar_movies(query, n_results=5)
+    chroma = await populated_store.find_similar_movies(query, n_results=5)
+
+    assert len(index) == 30
+    assert [movie['id'] for movie in shared] == [movie['id'] for movie in chroma]
+    assert [movie['distance'] for movie in shared] == pytest.approx([movie['distance'] for movie in chroma], abs=1e-4)
+    assert shared[0]['metadata']['title'] == 'Movie 3'
+
+
+async def test_shared_index_filters(populated_store, tmp_path):
+    publish_index(populated_store, str(tmp_path / 'shared'))
+    index = SharedVectorIndex(str(tmp_path / 'shared'))
+    query = (await populated_store.get_movie_embeddings(['movie-3']))['movie-3'].tolist()
+
+    results = await index.find_similar_movies(query, n_results=4, filter_metadata={'id': {'$ne': 'movie-3'}})
+    assert len(results) == 4 and 'movie-3' not in [movie['id'] for movie in results]
+
+    results = await index.find_similar_movies(query, n_results=20, filter_metadata={'year': 2001})
+    assert len(results) == 10 and {movie['metadata']['year'] for movie in results} == {2001}
+
+
+async def test_shared_index_swaps_to_new_snapshot(populated_store, tmp_path):
+    shared_dir = str(tmp_path / 'shared')
+    first = publish_index(populated_store, shared_dir)
+    index = SharedVectorIndex(shared_dir, refresh_interval=0)
+    assert not index.refresh()
+
+    await populated_store.store_movie('Late Addition', {'id': 'late', 'title': 'Late Addition'}, [1.0] * 8)
+    publish_index(populated_store, shared_dir)
+    publish_index(populated_store, shared_dir)
+
+    await index.find_similar_movies([1.0] * 8, n_results=1)
+    assert len(index) == 31
+    assert not first.exists()
+
+
+def _query_in_worker(shared_dir, query, results):
+    import asyncio
+
+    index = SharedVectorIndex(shared_dir)
+    results.put([movie['id'] for movie in asyncio.run(index.find_similar_movies(query, n_results=3))])
+
+
+async def test_shared_index_serves_other_processes(populated_store, tmp_path):
+    shared_dir = str(tmp_path / 'shared')
+    publish_index(populated_store, shared_dir)
+    query = (await populated_store.get_movie_embeddings(['movie-3']))['movie-3'].tolist()
+    expected = [movie['id'] for movie in await SharedVectorIndex(shared_dir).find_similar_movies(query, n_results=3)]
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    worker = context.Process(target=_query_in_worker, args=(shared_dir, query, results))
+    worker.start()
+    worker.join(timeout=60)
+
+    assert results.get(timeout=5) == expected
@@ -0,0 +1,65 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+
+from src.review_analyzer.transport import PooledTransport
+
+
+class EchoTransport(httpx.AsyncBaseTransport):
+    def __init__(self):
+        self.closed = False
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={'path': request.url.path})
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+async def test_pooled_transport_tracks_concurrency():
+    created = []
+
+    def create_inner(**kwargs):
+        created.append(EchoTransport())
+        return created[-1]
+
+    transport = PooledTransport(max_connections=10)
+    with patch('src.review_analyzer.transport.httpx.AsyncHTTPTransport', side_effect=create_inner):
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            responses = await asyncio.gather(*(client.get(f'/{i}') for i in range(5)))
+
+    assert [response.json()['path'] for response in responses] == [f'/{i}' for i in range(5)]
+    stats = transport.stats()
+    assert stats['requests_total'] == 5
+    assert stats['in_flight'] == 0
+    assert stats['peak_in_flight'] == 5
+    assert stats['max_connections'] == 10
+    assert len(created) == 1 and created[0].closed
+
+
+async def test_pooled_transport_counts_streamed_responses_until_closed():
+    transport = PooledTransport()
+    with patch('src.review_analyzer.transport.httpx.AsyncHTTPTransport', side_effect=lambda **kwargs: EchoTransport()):
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            async with client.stream('GET', '/stream') as response:
+                assert transport.stats()['in_flight'] == 1
+                await response.aread()
+            assert transport.stats()['in_flight'] == 0
+
+
+def test_pooled_transport_starts_new_pool_per_event_loop():
+    transport = PooledTransport()
+    created = []
+
+    def create_inner(**kwargs):
+        created.append(EchoTransport())
+        return created[-1]
+
+    with patch('src.review_analyzer.transport.httpx.AsyncHTTPTransport', side_effect=create_inner):
+        first = asyncio.run(transport._get_transport())
+        second = asyncio.run(transport._get_transport())
+
+    assert first is not second
+    assert first.closed and not second.closed
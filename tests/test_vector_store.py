@@ -2,8 +2,11 @@ import logging
 from unittest.mock import patch
 
 import numpy as np
+import pytest
 from numpy.testing import assert_array_almost_equal
 
+from src.review_analyzer.vector_store import HNSWConfig, ShardConfig, VectorStore, VectorStoreCache
+
 
 async def test_store_movie_sunny_day(test_vector_store, test_movie_data):
     result = await test_vector_store.store_movie(
@@ -50,3 +53,209 @@ async def test_store_movie_exception_handling_with_logging(test_vector_store, te
             )
             assert result is False
             assert 'Error storing movie Inception: Mocked exception' in caplog.text
+
+
+def test_vector_store_embedding_stamp_mismatch(tmp_path):
+    VectorStore(persist_dir=str(tmp_path), embedding_model='text-embedding-3-small', embedding_dimensions=256)
+
+    reopened = VectorStore(
+        persist_dir=str(tmp_path), embedding_model='text-embedding-3-small', embedding_dimensions=256
+    )
+    assert reopened.movies_collection.metadata['embedding_dimensions'] == 256
+
+    with pytest.raises(ValueError):
+        VectorStore(persist_dir=str(tmp_path), embedding_model='text-embedding-3-small', embedding_dimensions=512)
+
+
+async def test_store_and_find_similar_reviews(test_vector_store, test_movie_data):
+    movie_id = test_movie_data['metadata']['id']
+    metadata = {'movie_id': movie_id, 'title': 'Inception', 'year': 2010}
+    result = await test_vector_store.store_review(
+        f'{movie_id}-review', 'Dreams within dreams, loved it.', metadata, test_movie_data['embedding']
+    )
+    assert result
+
+    stored = await test_vector_store.get_review_by_id(f'{movie_id}-review')
+    assert stored['document'] == 'Dreams within dreams, loved it.'
+
+    similar = await test_vector_store.find_similar_reviews(test_movie_data['embedding'], n_results=1)
+    assert len(similar) == 1
+
+    excluded = await test_vector_store.find_similar_reviews(
+        test_movie_data['embedding'], n_results=1, filter_metadata={'movie_id': {'$ne': movie_id}}
+    )
+    assert all(review['metadata']['movie_id'] != movie_id for review in excluded)
+
+
+def test_vector_store_per_user_collections(tmp_path):
+    store = VectorStore(persist_dir=str(tmp_path), user_id='Cinephile 42')
+    other = VectorStore(persist_dir=str(tmp_path), user_id='cinephile-42')
+
+    assert store.client is other.client
+    assert store.movies_collection.name != other.movies_collection.name
+    assert store.movies_collection.name.startswith('watched_movies-cinephile-42-')
+
+
+def test_vector_store_cache_evicts_least_recently_used(tmp_path):
+    cache = VectorStoreCache(persist_dir=str(tmp_path), max_open=2)
+    first = cache.get('first')
+    cache.get('second')
+    assert cache.get('first') is first
+
+    cache.get('third')
+
+    assert len(cache) == 2
+    assert 'second' not in cache._stores
+    assert cache.get('first') is first
+
+
+def test_hnsw_config_metadata():
+    assert HNSWConfig().to_metadata() == {'hnsw:space': 'cosine'}
+    assert HNSWConfig(construction_ef=200, search_ef=50, M=32).to_metadata() == {
+        'hnsw:space': 'cosine',
+        'hnsw:construction_ef': 200,
+        'hnsw:search_ef': 50,
+        'hnsw:M': 32,
+    }
+
+
+async def test_vector_store_hnsw_config_and_warm_up(tmp_path, test_movie_data):
+    store = VectorStore(persist_dir=str(tmp_path), hnsw_config=HNSWConfig(search_ef=50, M=32))
+    assert store.movies_collection.metadata['hnsw:search_ef'] == 50
+    assert store.movies_collection.metadata['hnsw:M'] == 32
+
+    await store.store_movie(test_movie_data['title'], test_movie_data['metadata'], test_movie_data['embedding'])
+    timings = await store.warm_up()
+
+    assert set(timings) == {store.movies_collection.name, store.reviews_collection.name}
+
+
+async def test_vector_store_snapshot_round_trip(tmp_path, test_movie_data):
+    pytest.importorskip('pyarrow')
+    source = VectorStore(persist_dir=str(tmp_path / 'source'), embedding_model='text-embedding-3-small')
+    await source.store_movie(test_movie_data['title'], test_movie_data['metadata'], test_movie_data['embedding'])
+    await source.store_review('inception-review', 'Dreams within dreams.', {'movie_id': 'inception'}, [0.1, 0.2, 0.3])
+
+    counts = await source.export_snapshot(str(tmp_path / 'snapshot'))
+    assert counts == {'watched_movies': 1, 'user_reviews': 1}
+
+    replica = VectorStore(persist_dir=str(tmp_path / 'replica'), user_id='replica')
+    assert await replica.import_snapshot(str(tmp_path / 'snapshot')) == counts
+    assert replica.movies_collection.metadata['embedding_model'] == 'text-embedding-3-small'
+
+    movie = await replica.get_movie_by_id(test_movie_data['metadata']['id'])
+    # Each vector carries the model that produced it
+    assert movie['metadata'] == {**test_movie_data['metadata'], 'embedding_model': 'text-embedding-3-small'}
+    assert_array_almost_equal(movie['embedding'], test_movie_data['embedding'])
+    assert (await replica.get_review_by_id('inception-review'))['document'] == 'Dreams within dreams.'
+
+    # Importing twice upserts rather than duplicating
+    await replica.import_snapshot(str(tmp_path / 'snapshot'))
+    assert await replica.get_movie_count() == 1
+
+
+async def test_vector_store_snapshot_embedding_mismatch(tmp_path):
+    pytest.importorskip('pyarrow')
+    source = VectorStore(persist_dir=str(tmp_path / 'source'), embedding_model='text-embedding-3-small')
+    await source.export_snapshot(str(tmp_path / 'snapshot'))
+
+    replica = VectorStore(persist_dir=str(tmp_path / 'replica'), embedding_model='text-embedding-ada-002')
+    with pytest.raises(ValueError):
+        await replica.import_snapshot(str(tmp_path / 'snapshot'))
+
+
+async def test_lookup_movie_by_slug_and_title(tmp_path):
+    store = VectorStore(persist_dir=str(tmp_path))
+    metadata = {'id': 'the-matrix-1999', 'title': 'The Matrix', 'year': 1999, 'genres': 'Sci-Fi', 'runtime': 136}
+    await store.store_movie('The Matrix', metadata, [0.1, 0.2, 0.3])
+
+    exact = await store.lookup_movie('The Matrix', 1999)
+    assert exact['id'] == 'the-matrix-1999'
+    assert_array_almost_equal(exact['embedding'], [0.1, 0.2, 0.3])
+
+    # Punctuation, case, a missing article and an off-by-one year still match
+    assert (await store.lookup_movie('matrix!', 2000))['id'] == 'the-matrix-1999'
+    assert await store.lookup_movie('The Matrix', 2003) is None
+    assert await store.lookup_movie('The Matrix Reloaded', 2003) is None
+
+    # Movies stored after the index is built are found too
+    metadata = {'id': 'alien-1979', 'title': 'Alien', 'year': 1979, 'genres': 'Horror', 'runtime': 117}
+    await store.store_movie('Alien', metadata, [0.3, 0.2, 0.1])
+    assert (await store.lookup_movie('ALIEN', 1980))['id'] == 'alien-1979'
+
+
+SHARDED_MOVIES = [
+    ('The Matrix', 1999, '1990s film', [1.0, 0.0, 0.1]),
+    ('Heat', 1995, '1990s film', [0.9, 0.1, 0.0]),
+    ('Inception', 2010, '2010s modern film', [0.95, 0.05, 0.05]),
+    ('Arrival', 2016, '2010s modern film', [0.0, 1.0, 0.0]),
+]
+
+
+async def _store_sharded_movies(store: VectorStore) -> None:
+    for title, year, era, embedding in SHARDED_MOVIES:
+        metadata = {'id': f'{title.lower()}-{year}', 'title': title, 'year': year, 'era': era}
+        assert await store.store_movie(title, metadata, embedding)
+
+
+async def test_metadata_sharding_routes_writes_and_filtered_queries(tmp_path):
+    store = VectorStore(persist_dir=str(tmp_path), shard_config=ShardConfig(by='era'))
+    await _store_sharded_movies(store)
+
+    assert len(store.movie_collections()) == 2
+    assert store.movies_collection.count() == 0
+    assert await store.get_movie_count() == 4
+
+    # Unfiltered queries merge the top-k across shards
+    movies = await store.find_similar_movies([1.0, 0.0, 0.0], n_results=3)
+    assert [movie['id'] for movie in movies] == ['inception-2010', 'the matrix-1999', 'heat-1995']
+
+    # Filtered queries only touch the matching shard
+    nineties = store._shards[store._metadata_shard_name('1990s film')]
+    with patch.object(nineties, 'query') as nineties_query:
+        movies = await store.find_similar_movies(
+            [1.0, 0.0, 0.0], n_results=3, filter_metadata={'era': '2010s modern film'}
+        )
+    assert [movie['id'] for movie in movies] == ['inception-2010', 'arrival-2016']
+    nineties_query.assert_not_called()
+
+    # Shards created by an earlier run are found again on open, without listing every collection
+    with patch.object(store.client, 'list_collections', side_effect=AssertionError('listed collections')):
+        reopened = VectorStore(persist_dir=str(tmp_path), shard_config=ShardConfig(by='era'))
+    assert len(reopened.movie_collections()) == 2
+    assert await reopened.get_existing_movie_ids(['heat-1995', 'alien-1979']) == {'heat-1995'}
+
+
+async def test_hash_sharding_and_snapshot_into_shards(tmp_path):
+    pytest.importorskip('pyarrow')
+    source = VectorStore(persist_dir=str(tmp_path / 'source'))
+    await _store_sharded_movies(source)
+    await source.export_snapshot(str(tmp_path / 'snapshot'))
+
+    sharded = VectorStore(persist_dir=str(tmp_path / 'sharded'), shard_config=ShardConfig(by='hash', num_shards=3))
+    await sharded.import_snapshot(str(tmp_path / 'snapshot'))
+
+    assert len(sharded.movie_collections()) == 3
+    assert sum(shard.count() for shard in sharded.movie_collections()) == 4
+    assert (await sharded.get_movie_by_id('heat-1995'))['document'] == 'Heat'
+    assert set(await sharded.get_movie_embeddings(['heat-1995', 'arrival-2016'])) == {'heat-1995', 'arrival-2016'}
+    assert (await sharded.find_similar_movies([0.0, 1.0, 0.0], n_results=1))[0]['id'] == 'arrival-2016'
+
+    # Lookups know the unsharded collection is empty without counting it every time
+    with patch.object(sharded.movies_collection, 'count') as count:
+        await sharded.find_similar_movies([0.0, 1.0, 0.0], n_results=1)
+    count.assert_not_called()
+
+
+def test_vector_store_cache_follows_embedding_generation(tmp_path):
+    cache = VectorStoreCache(persist_dir=str(tmp_path))
+    store = cache.get('cinephile')
+    assert store.generation is None
+
+    record = cache.generations.set('cinephile', 'text-embedding-3-large')
+    migrated = cache.get('cinephile')
+
+    assert migrated is not store
+    assert migrated.generation == record['generation']
+    assert migrated.movies_collection.name != store.movies_collection.name
+    assert VectorStoreCache(persist_dir=str(tmp_path)).get('cinephile').generation == record['generation']